@@ -1,305 +1,140 @@
+import itertools
+import os
+import queue
 import time
 import threading
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import WebDriverException, NoSuchElementException, TimeoutException
+from selenium.common.exceptions import WebDriverException
 import tkinter as tk
 from tkinter import ttk, messagebox
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
+from driver_pool import DriverPool
+from waits import WaitEngine
+from locators import registry as locator_registry
+from product_catalog import ProductCatalog
+import tracing
+import resource_blocking
+import scenario_engine
+
+def criar_driver_headless():
+    chrome_options = Options()
+    chrome_options.add_argument("--incognito") # Adiciona o argumento para modo anônimo
+    chrome_options.add_argument("--headless") # Inicia o navegador em modo headless (sem interface gráfica)
+    chrome_options.add_argument("--disable-gpu") # Necessário para headless no Windows
+    chrome_options.add_argument("--window-size=1920,1080") # Define um tamanho de janela para headless
+    chrome_options.set_capability(*resource_blocking.CAPABILITY_LOG) # Tráfego de rede do ciclo (ver modo enxuto)
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(30)
+    return tracing.instrumentar_driver(driver)
+
+# Navegadores headless mantidos abertos entre as execuções do monitoramento; com vários monitores
+# ao mesmo tempo, os que passarem de QA_DESKTOP_BROWSERS esperam um navegador livre.
+# Com a verificação assistida ligada o navegador é visível e continua sendo aberto a cada teste.
+driver_pool = DriverPool(criar_driver_headless, max_size=int(os.environ.get('QA_DESKTOP_BROWSERS', 2)))
+ESPERA_NAVEGADOR = 600 # Segundos que um ciclo espera por um navegador do pool
+
+# Produtos da home de cada site, reaproveitados pelos ciclos seguintes do monitoramento até expirar
+product_catalog = ProductCatalog(ttl=1800)
 
 class SiteQATester:
-    def __init__(self, url, modo, intervalo, verificacao_assistida, progress_callback=None):
+    def __init__(self, url, modo, intervalo, verificacao_assistida, progress_callback=None, wait_timeouts=None, enxuto=False,
+                 linha_callback=None):
         self.url = url
         self.modo = modo
         self.intervalo = intervalo  # em horas
         self.verificacao_assistida = verificacao_assistida
         self.driver = None
+        self.driver_quebrado = False
         self.resultados = []
         self.parar = False
         self.progress_callback = progress_callback # Adiciona o callback de progresso
+        self.linha_callback = linha_callback # Recebe cada linha de resultado assim que ela é gerada
+        self.wait_timeouts = wait_timeouts # Tetos das esperas (ver waits.DEFAULT_TIMEOUTS)
+        self.waits = None
+        self.enxuto = enxuto # Bloqueia imagens, fontes, vídeos e rastreadores (ver resource_blocking)
+        self.economia = None # Requisições e bytes bloqueados no ciclo atual
+        self.locators = locator_registry.para_site(url) # Seletores CSS/XPath com a preferência aprendida para o site
+        self.trace = None # Spans do ciclo atual (ver rodar_teste)
 
     def iniciar_driver(self):
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--incognito") # Adiciona o argumento para modo anônimo
-            
-            if self.verificacao_assistida == "Off":
-                chrome_options.add_argument("--headless") # Inicia o navegador em modo headless (sem interface gráfica)
-                chrome_options.add_argument("--disable-gpu") # Necessário para headless no Windows
-                chrome_options.add_argument("--window-size=1920,1080") # Define um tamanho de janela para headless
-
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.driver.set_page_load_timeout(30)
+            self.driver_quebrado = False
+            with tracing.span('driver_start'):
+                if self.verificacao_assistida == "Off":
+                    self.driver = driver_pool.acquire(timeout=ESPERA_NAVEGADOR)
+                else:
+                    chrome_options = Options()
+                    chrome_options.add_argument("--incognito") # Adiciona o argumento para modo anônimo
+                    chrome_options.set_capability(*resource_blocking.CAPABILITY_LOG)
+                    self.driver = tracing.instrumentar_driver(webdriver.Chrome(options=chrome_options))
+                    self.driver.set_page_load_timeout(30)
+                resource_blocking.preparar(self.driver, resource_blocking.padroes_bloqueio() if self.enxuto else ())
         except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao iniciar o navegador: {e}")
+            # Roda na thread do monitor: o erro vai para a lista de resultados, não para um messagebox
+            self._adicionar(f"Erro ao iniciar o navegador: {e}")
             return False
+        self.waits = WaitEngine(self.driver, self.wait_timeouts)
         return True
 
     def fechar_driver(self):
         if self.driver:
-            self.driver.quit()
+            self.economia.coletar(self.driver)
+            if self.verificacao_assistida == "Off":
+                driver_pool.release(self.driver, broken=self.driver_quebrado)
+            else:
+                self.driver.quit()
             self.driver = None
 
-    def testar_botao(self, elemento):
-        try:
-            inicio = time.time()
-            elemento.click() # Tenta o clique nativo do Selenium
-            fim = time.time()
-            tempo = fim - inicio
-            return tempo, None
-        except Exception as e:
-            # Se o clique nativo falhar, tenta clicar via JavaScript
-            try:
-                inicio = time.time()
-                self.driver.execute_script("arguments[0].click();", elemento)
-                fim = time.time()
-                tempo = fim - inicio
-                self.resultados.append("Tentativa de clique via JavaScript bem-sucedida.") # Para depuração
-                return tempo, None
-            except Exception as js_e:
-                return None, str(e) + " | Erro ao tentar clique JS: " + str(js_e)
-
-    def modo_rapido(self):
-        try:
-            self.driver.get(self.url)
-            time.sleep(2) # Dar tempo para a página carregar e o banner de cookies aparecer
-
-            # Tenta aceitar o banner de cookies se ele aparecer
-            try:
-                # O XPath tenta encontrar um botão com 'aceitar' ou 'accept' (case insensitive)
-                aceitar_cookies_btn = self.driver.find_element(By.XPATH, "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'aceitar')] | //button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept')]")
-                self.driver.execute_script("arguments[0].click();", aceitar_cookies_btn)
-                self.resultados.append("Cookies aceitos com sucesso.")
-                time.sleep(2)
-            except NoSuchElementException:
-                self.resultados.append("Banner de cookies não encontrado ou já processado.")
-            except Exception as e:
-                self.resultados.append(f"Erro ao tentar aceitar cookies: {e}")
-                # Não retornamos aqui, pois o script pode continuar mesmo que os cookies não sejam aceitos
-
-            # Encontra e rola até a seção "Categoria Exemplo"
-            try:
-                # Em um cenário real, você buscaria por categorias específicas do seu site
-                napas_section_heading = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')] | //h2[contains(text(), 'Categoria Exemplo')]") # Adicionado <p> para maior compatibilidade
-                self.driver.execute_script("arguments[0].scrollIntoView();", napas_section_heading)
-                self.resultados.append("Rolado para a seção 'Categoria Exemplo'.")
-                if self.progress_callback: self.progress_callback(25) # Atualiza progresso
-                time.sleep(2) # Dar tempo para o scroll e elementos carregarem
-            except NoSuchElementException:
-                self.resultados.append("Erro: Seção 'Categoria Exemplo' não encontrada na página inicial.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro ao rolar para seção 'Categoria Exemplo': {e}")
-                return
-
-            # Clica em um item (produto) dentro da seção "Categoria Exemplo"
-            try:
-                # XPath corrigido para encontrar links de produtos baseados nas classes VTEX e no padrão de URL.
-                produto_napas_link = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')]/ancestor::section[1]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]")
-                if self.progress_callback: self.progress_callback(40) # Atualiza progresso
-                tempo, erro = self.testar_botao(produto_napas_link)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar no produto da seção Categoria Exemplo: {erro}")
-                    return
-                self.resultados.append(f"Tempo para acessar produto da seção Categoria Exemplo: {tempo:.2f}s")
-                time.sleep(2) # Espera a página do produto carregar
-            except NoSuchElementException:
-                self.resultados.append("Erro: Nenhum link de produto encontrado na seção 'Categoria Exemplo'.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar no produto da seção Categoria Exemplo: {e}")
-                return
-
-            # Clica no botão "Comprar" (para adicionar ao carrinho) na página do produto
-            try:
-                # Usando WebDriverWait para esperar que o botão "Comprar" esteja clicável
-                wait = WebDriverWait(self.driver, 10) # Espera até 10 segundos
-                botao_comprar = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'comprar')] or .//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to cart')]]")))
-                if self.progress_callback: self.progress_callback(60) # Atualiza progresso
-                tempo, erro = self.testar_botao(botao_comprar)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Comprar' (adicionar ao carrinho): {erro}")
-                    return
-                self.resultados.append(f"Tempo para adicionar produto ao carrinho (clicar em Comprar): {tempo:.2f}s")
-                time.sleep(3) # Tempo para o carrinho abrir automaticamente
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Comprar' não clicável na página do produto.")
-                return
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Comprar' (adicionar ao carrinho) não encontrado na página do produto.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Comprar': {e}")
-                return
+    def _adicionar(self, linha):
+        self.resultados.append(linha)
+        if self.linha_callback:
+            self.linha_callback(linha)
 
-            # No carrinho, clica em "Finalizar compra"
-            try:
-                # Usando WebDriverWait para esperar que o botão "Ir para o checkout" esteja clicável
-                wait = WebDriverWait(self.driver, 10) # Espera até 10 segundos
-                botao_finalizar_compra = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@id='proceed-to-checkout'] | //button[.//div[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'ir para o checkout')]]")))
-
-                tempo, erro = self.testar_botao(botao_finalizar_compra)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Finalizar compra' no carrinho: {erro}")
-                    return
-                self.resultados.append(f"Tempo para finalizar compra e ir para o checkout: {tempo:.2f}s")
-                time.sleep(2)
-                if self.progress_callback: self.progress_callback(100) # Finaliza progresso
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho.")
-                return
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Finalizar compra' não encontrado no carrinho.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Finalizar compra': {e}")
-                return
+    def _registrar_passo(self, step, status, response_time, message, metricas=None, wait_time=None):
+        # Só os resultados das etapas; início e fim do cenário não aparecem na lista
+        if status in ("sucesso", "aviso", "falha"):
+            self._adicionar(f"{message} (espera: {wait_time:.2f}s)" if wait_time else message)
 
-        except Exception as e:
-            self.resultados.append(f"Erro no modo rápido: {e}")
+    def _progresso(self, message, percentage):
+        if self.progress_callback:
+            self.progress_callback(percentage)
 
-    def modo_avancado(self):
-        try:
-            self.driver.get(self.url)
-            time.sleep(2) # Dar tempo para a página carregar e o banner de cookies aparecer
+    def executar_cenario(self):
+        # Mesmo fluxo da interface web, lido de scenarios/ (sem navegadores extras: os produtos são visitados em sequência)
+        contexto = scenario_engine.Contexto(self.url, self.driver, self.waits, self.locators, self._registrar_passo,
+                                            progresso=self._progresso, catalogo=product_catalog,
+                                            wait_timeouts=self.wait_timeouts)
+        scenario_engine.executar(scenario_engine.por_modo(self.modo), contexto)
 
-            # Tenta aceitar o banner de cookies se ele aparecer
-            try:
-                aceitar_cookies_btn = self.driver.find_element(By.XPATH, "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'aceitar')] | //button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept')]")
-                self.driver.execute_script("arguments[0].click();", aceitar_cookies_btn)
-                self.resultados.append("Cookies aceitos com sucesso.")
-                time.sleep(2)
-            except NoSuchElementException:
-                self.resultados.append("Banner de cookies não encontrado ou já processado.")
-            except Exception as e:
-                self.resultados.append(f"Erro ao tentar aceitar cookies: {e}")
-
-            # Encontra e rola até a seção "Categoria Exemplo"
-            try:
-                napas_section_heading = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')] | //h2[contains(text(), 'Categoria Exemplo')]") # Adicionado <p> para maior compatibilidade
-                self.driver.execute_script("arguments[0].scrollIntoView();", napas_section_heading)
-                self.resultados.append("Rolado para a seção 'Categoria Exemplo'.")
-                time.sleep(2)
-            except NoSuchElementException:
-                self.resultados.append("Erro: Seção 'Categoria Exemplo' não encontrada na página inicial. Tentando encontrar produtos em outras seções de slider.")
-                # Não retornamos aqui, para tentar encontrar produtos em outras seções
-            except Exception as e:
-                self.resultados.append(f"Erro ao rolar para seção 'Categoria Exemplo': {e}. Tentando encontrar produtos em outras seções de slider.")
-                # Não retornamos aqui, para tentar encontrar produtos em outras seções
-
-            if self.progress_callback: self.progress_callback(0) # Inicia o progresso
-
-            produtos_adicionados = 0
-            urls_produtos_visitados = set()
-
-            while produtos_adicionados < 10:
-                try:
-                    elementos_slider_links = self.driver.find_elements(By.XPATH, "//section[.//p[contains(@class, 'vtex-rich-text')] or .//h2]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]")
-                    elementos_nao_visitados = [el for el in elementos_slider_links if el.get_attribute('href') not in urls_produtos_visitados]
-
-                    if not elementos_nao_visitados:
-                        self.resultados.append("Não há mais produtos novos em nenhuma seção de slider na home para adicionar ao carrinho.")
-                        break
-                    
-                    produto_link = elementos_nao_visitados[0]
-                    produto_url = produto_link.get_attribute('href')
-                    urls_produtos_visitados.add(produto_url)
-
-                    self.driver.execute_script("arguments[0].scrollIntoView();", produto_link)
-                    tempo, erro = self.testar_botao(produto_link) # Clica no link do produto
-                    if erro:
-                        self.resultados.append(f"Erro ao clicar no produto: {erro}")
-                        self.driver.get(self.url)
-                        time.sleep(2)
-                        continue
-                    self.resultados.append(f"Tempo para acessar produto {produtos_adicionados+1}: {tempo:.2f}s")
-                    time.sleep(2)
-
-                    try:
-                        wait = WebDriverWait(self.driver, 10)
-                        botao_comprar = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[.//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'comprar')] or .//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to cart')]]")))
-                        
-                        tempo_comprar, erro_comprar = self.testar_botao(botao_comprar)
-                        if erro_comprar:
-                            self.resultados.append(f"Erro ao clicar em 'Comprar' para adicionar ao carrinho: {erro_comprar}")
-                        else:
-                            self.resultados.append(f"Tempo para adicionar produto {produtos_adicionados+1} ao carrinho: {tempo_comprar:.2f}s")
-                            produtos_adicionados += 1
-                            if self.progress_callback: self.progress_callback(produtos_adicionados * 9) # Atualiza progresso (90% para 10 itens)
-
-                        time.sleep(3)
-
-                    except TimeoutException:
-                        self.resultados.append(f"Erro de Timeout: Botão 'Comprar' não clicável na página do produto {produto_url}.")
-                    except NoSuchElementException:
-                        self.resultados.append(f"Erro: Botão 'Comprar' não encontrado na página do produto {produto_url}.")
-                    except Exception as e:
-                        self.resultados.append(f"Erro inesperado ao adicionar ao carrinho para {produto_url}: {e}")
-
-                    if produtos_adicionados < 10 and elementos_nao_visitados[1:]:
-                        self.driver.get(self.url)
-                        time.sleep(3)
-
-                        try:
-                            napas_section_heading = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')] | //h2[contains(text(), 'Categoria Exemplo')]")
-                            self.driver.execute_script("arguments[0].scrollIntoView();", napas_section_heading)
-                            time.sleep(1)
-                        except Exception as e_scroll:
-                            self.resultados.append(f"Aviso: Não foi possível rolar para a seção Categoria Exemplo após voltar para home: {e_scroll}")
-
-                except Exception as e:
-                    self.resultados.append(f"Erro ao processar produto no modo avançado: {e}")
-                    self.driver.get(self.url)
-                    time.sleep(3)
-                    
-            if produtos_adicionados == 0:
-                self.resultados.append("Nenhum produto foi adicionado ao carrinho no modo avançado.")
-                if self.progress_callback: self.progress_callback(100) # Finaliza progresso mesmo sem itens
+    def rodar_teste(self):
+        self.resultados.clear()
+        self.trace = tracing.Trace()
+        self.economia = resource_blocking.EconomiaRede()
+        with tracing.em_trace(self.trace):
+            if not self.iniciar_driver():
                 return
-
-            # Agora vamos para o checkout com os itens que foram adicionados
             try:
-                wait = WebDriverWait(self.driver, 10)
-                botao_finalizar_compra = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@id='proceed-to-checkout'] | //button[.//div[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'ir para o checkout')]]")))
-                if self.progress_callback: self.progress_callback(95) # Atualiza progresso
-                tempo, erro = self.testar_botao(botao_finalizar_compra)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Finalizar compra' no carrinho (modo avançado): {erro}")
-                    return
-                self.resultados.append(f"Tempo para finalizar compra e ir para o checkout com {produtos_adicionados} itens: {tempo:.2f}s")
-                time.sleep(2)
-                if self.progress_callback: self.progress_callback(100) # Finaliza progresso
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho (modo avançado).")
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Finalizar compra' não encontrado no carrinho (modo avançado).")
+                self.executar_cenario()
+            except WebDriverException as e:
+                self.driver_quebrado = True
+                self._adicionar(f"Erro de WebDriver: {e}")
             except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Finalizar compra' (modo avançado): {e}")
-
-        except Exception as e:
-            self.resultados.append(f"Erro no modo avançado: {e}")
-
-    def rodar_teste(self):
-        self.resultados.clear()
-        if not self.iniciar_driver():
-            return
-        try:
-            if self.modo == "Rápida":
-                self.modo_rapido()
-            else:
-                self.modo_avancado()
-        except WebDriverException as e:
-            self.resultados.append(f"Erro de WebDriver: {e}")
-        except Exception as e:
-            self.resultados.append(f"Erro inesperado: {e}")
-        finally:
-            self.fechar_driver()
+                self._adicionar(f"Erro inesperado: {e}")
+            finally:
+                self.fechar_driver()
+        # As operações que mais consumiram tempo no ciclo, para saber onde a execução foi gasta
+        principais = list(self.trace.resumo().items())[:5]
+        if principais:
+            self._adicionar("Tempo por operação: " + ", ".join(
+                f"{nome} {dados['total_s']:.2f}s ({dados['count']}x)" for nome, dados in principais))
+        if self.enxuto:
+            self._adicionar(f"Modo enxuto: {self.economia.descrever()}")
 
     def monitorar(self, callback_resultado):
         while not self.parar:
+            if self.linha_callback:
+                self.linha_callback(f"--- Ciclo iniciado às {time.strftime('%H:%M:%S')} ({self.modo}) ---")
             self.rodar_teste()
             callback_resultado(self.resultados)
             for _ in range(int(self.intervalo * 3600)):
@@ -307,13 +142,39 @@ class SiteQATester:
                     break
                 time.sleep(1)
 
+class FilaUI:
+    """Ponte entre as threads dos monitores e o Tk: os workers só enfileiram eventos
+    (monitor, tipo, dados) e o mainloop os consome em lotes com `after()`."""
+
+    def __init__(self):
+        self._fila = queue.SimpleQueue()
+
+    def publicar(self, monitor_id, tipo, dados=None):
+        self._fila.put((monitor_id, tipo, dados))
+
+    def drenar(self, limite):
+        eventos = []
+        while len(eventos) < limite:
+            try:
+                eventos.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return eventos
+
 class AppQA(tk.Tk):
+    INTERVALO_UI_MS = 100 # Frequência com que o mainloop aplica os eventos dos monitores
+    EVENTOS_POR_LOTE = 500 # Eventos aplicados por rodada; o restante fica para a próxima
+    MAX_LINHAS = 2000 # Linhas mantidas na caixa de resultados (as mais antigas saem)
+
     def __init__(self):
         super().__init__()
         self.title("QA Automático de E-commerce")
-        self.geometry("500x400")
-        self.tester = None
-        self.thread = None
+        self.geometry("560x640")
+        self.monitores = {} # id -> (tester, thread)
+        self.parando = set() # Monitores com "Parando..." na tela até o evento 'encerrado'
+        self._ids = itertools.count(1)
+        self.fila_ui = FilaUI()
+        self._alerta_aberto = False
 
         # Configurações
         tk.Label(self, text="URL do site:").pack(pady=5)
@@ -324,7 +185,7 @@ class AppQA(tk.Tk):
 
         tk.Label(self, text="Modo de leitura:").pack(pady=5)
         self.modo_var = tk.StringVar(value="Rápida")
-        modos = ["Rápida", "Avançada"]
+        modos = list(scenario_engine.cenarios()) # Um modo por cenário de scenarios/
         self.modo_combo = ttk.Combobox(self, textvariable=self.modo_var, values=modos, state="readonly")
         self.modo_combo.pack(pady=5)
 
@@ -341,56 +202,132 @@ class AppQA(tk.Tk):
         self.verificacao_assistida_combo = ttk.Combobox(self, textvariable=self.verificacao_assistida_var, values=verificacao_options, state="readonly")
         self.verificacao_assistida_combo.pack(pady=5)
 
+        # Modo enxuto: checagem funcional rápida, sem imagens, fontes, vídeos e rastreadores
+        tk.Label(self, text="Modo enxuto:").pack(pady=5)
+        self.enxuto_var = tk.StringVar(value="Off")
+        self.enxuto_combo = ttk.Combobox(self, textvariable=self.enxuto_var, values=["On", "Off"], state="readonly")
+        self.enxuto_combo.pack(pady=5)
+
+        # Um monitor por linha: cada "Iniciar Monitoramento" cria um novo com as opções acima
+        self.monitores_view = ttk.Treeview(self, columns=("modo", "intervalo", "status", "progresso"), show="headings", height=4)
+        for coluna, titulo, largura in (("modo", "Modo", 140), ("intervalo", "Intervalo (h)", 90),
+                                        ("status", "Status", 160), ("progresso", "Progresso", 80)):
+            self.monitores_view.heading(coluna, text=titulo)
+            self.monitores_view.column(coluna, width=largura)
+        self.monitores_view.pack(pady=5)
+
         self.resultado_text = tk.Text(self, height=10, width=60)
         self.resultado_text.pack(pady=10)
 
-        # Barra de progresso (inicialmente oculta)
+        # Barra de progresso do monitor selecionado (ou do mais recente que informou progresso)
         self.progressbar = ttk.Progressbar(self, orient="horizontal", length=400, mode="determinate")
         self.progressbar.pack(pady=5)
-        self.progressbar.pack_forget() # Esconde inicialmente
 
         self.iniciar_btn = tk.Button(self, text="Iniciar Monitoramento", command=self.iniciar_monitoramento)
         self.iniciar_btn.pack(pady=5)
         self.parar_btn = tk.Button(self, text="Parar Monitoramento", command=self.parar_monitoramento, state="disabled")
         self.parar_btn.pack(pady=5)
 
-    def mostrar_resultados(self, resultados):
-        self.resultado_text.delete(1.0, tk.END)
-        for r in resultados:
-            self.resultado_text.insert(tk.END, r + "\n")
-        if any("Erro" in r for r in resultados):
+        self.after(self.INTERVALO_UI_MS, self._processar_eventos)
+
+    def _processar_eventos(self):
+        # Único ponto que mexe nos widgets com dados dos monitores. Um lote vira uma inserção de
+        # texto e uma atualização por monitor; do progresso só interessa o último valor.
+        try:
+            linhas, progresso, status, alertar = [], {}, {}, False
+            for monitor_id, tipo, dados in self.fila_ui.drenar(self.EVENTOS_POR_LOTE):
+                if tipo == 'linha':
+                    linhas.append(f"[#{monitor_id}] {dados}\n")
+                elif tipo == 'progresso':
+                    progresso[monitor_id] = dados
+                    if monitor_id not in self.parando:
+                        status[monitor_id] = "Executando"
+                elif tipo == 'ciclo':
+                    erro = any("Erro" in r for r in dados)
+                    alertar = alertar or erro
+                    progresso[monitor_id] = 100
+                    if monitor_id not in self.parando:
+                        status[monitor_id] = f"{'Com erros' if erro else 'OK'} às {time.strftime('%H:%M')}"
+                elif tipo == 'encerrado':
+                    self.monitores.pop(monitor_id, None)
+                    self.parando.discard(monitor_id)
+                    status[monitor_id] = None
+            self._aplicar(linhas, progresso, status)
+            if alertar:
+                self.after_idle(self._alertar) # Fora desta rodada, para o próximo lote não esperar o aviso ser fechado
+        finally:
+            self.after(self.INTERVALO_UI_MS, self._processar_eventos)
+
+    def _aplicar(self, linhas, progresso, status):
+        if linhas:
+            self.resultado_text.insert(tk.END, "".join(linhas))
+            excedente = int(self.resultado_text.index("end-1c").split(".")[0]) - self.MAX_LINHAS
+            if excedente > 0:
+                self.resultado_text.delete("1.0", f"{excedente + 1}.0")
+            self.resultado_text.see(tk.END)
+        for monitor_id in set(progresso) | set(status):
+            item = str(monitor_id)
+            if not self.monitores_view.exists(item):
+                continue
+            if status.get(monitor_id, "") is None:
+                self.monitores_view.delete(item)
+                continue
+            if monitor_id in status:
+                self.monitores_view.set(item, "status", status[monitor_id])
+            if monitor_id in progresso:
+                self.monitores_view.set(item, "progresso", f"{progresso[monitor_id]}%")
+        if progresso:
+            selecionados = [int(item) for item in self.monitores_view.selection()]
+            atual = next((m for m in selecionados if m in progresso), None) or max(progresso)
+            self.progressbar['value'] = progresso[atual]
+        self.parar_btn.config(state="normal" if self.monitores else "disabled")
+
+    def _alertar(self):
+        # Um aviso por vez: o messagebox é modal e o mainloop continua aplicando eventos enquanto ele está aberto
+        if self._alerta_aberto:
+            return
+        self._alerta_aberto = True
+        try:
             messagebox.showwarning("Alerta", "Algum link ou função do site está fora do ar!")
+        finally:
+            self._alerta_aberto = False
 
     def iniciar_monitoramento(self):
         url = self.url_entry.get()
         modo = self.modo_var.get()
         intervalo = float(self.intervalo_var.get())
         verificacao_assistida = self.verificacao_assistida_var.get()
-        
-        if verificacao_assistida == "Off":
-            self.progressbar.pack(pady=5)
-            self.progressbar['value'] = 0
-            progress_callback = self.atualizar_progresso
-        else:
-            self.progressbar.pack_forget()
-            progress_callback = None
-
-        self.tester = SiteQATester(url, modo, intervalo, verificacao_assistida, progress_callback)
-        self.iniciar_btn.config(state="disabled")
+        monitor_id = next(self._ids)
+
+        # Os callbacks rodam na thread do monitor: só publicam na fila, quem desenha é o mainloop
+        publicar = self.fila_ui.publicar
+        tester = SiteQATester(url, modo, intervalo, verificacao_assistida,
+                              progress_callback=lambda valor: publicar(monitor_id, 'progresso', valor),
+                              enxuto=self.enxuto_var.get() == "On",
+                              linha_callback=lambda linha: publicar(monitor_id, 'linha', linha))
+
+        def executar():
+            try:
+                tester.monitorar(lambda resultados: publicar(monitor_id, 'ciclo', list(resultados)))
+            finally:
+                publicar(monitor_id, 'encerrado')
+
+        thread = threading.Thread(target=executar, name=f"monitor-{monitor_id}", daemon=True)
+        self.monitores[monitor_id] = (tester, thread)
+        self.monitores_view.insert("", tk.END, iid=str(monitor_id), values=(modo, intervalo, "Iniciando", "0%"))
         self.parar_btn.config(state="normal")
-        self.thread = threading.Thread(target=self.tester.monitorar, args=(self.mostrar_resultados,), daemon=True)
-        self.thread.start()
+        thread.start()
 
     def parar_monitoramento(self):
-        if self.tester:
-            self.tester.parar = True
-        self.iniciar_btn.config(state="normal")
-        self.parar_btn.config(state="disabled")
-        self.resultado_text.insert(tk.END, "Monitoramento parado pelo usuário.\n")
-
-    def atualizar_progresso(self, valor):
-        self.progressbar['value'] = valor
-        self.update_idletasks() # Força a atualização da GUI
+        # Para os monitores selecionados (ou todos); cada um termina o ciclo em andamento antes de sair
+        selecionados = [int(item) for item in self.monitores_view.selection()] or list(self.monitores)
+        for monitor_id in selecionados:
+            if monitor_id in self.monitores:
+                self.monitores[monitor_id][0].parar = True
+                self.parando.add(monitor_id)
+                self.monitores_view.set(str(monitor_id), "status", "Parando...")
+                self.resultado_text.insert(tk.END, f"[#{monitor_id}] Monitoramento parado pelo usuário.\n")
+        self.resultado_text.see(tk.END)
 
 if __name__ == "__main__":
     app = AppQA()
@@ -0,0 +1,207 @@
+import math
+import re
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+# Rollups por hora e por etapa, atualizados a cada lote gravado pelo log_writer. As consultas
+# somam as horas do período pedido em vez de reler logs_testeSite.
+
+# Limites superiores (ms) dos buckets do histograma de latência: progressão geométrica de 10 ms
+# a ~2 min; o último bucket acumula tudo o que passar disso. Erro relativo dos percentis <= 25%.
+_BASE_MS = 10.0
+_FATOR = 1.25
+_NUM_BUCKETS = 44
+LIMITES_MS = [round(_BASE_MS * _FATOR ** i, 1) for i in range(_NUM_BUCKETS)]
+
+PERCENTIS = (50, 90, 95, 99)
+
+# Período de agregação aceito pelo /analytics -> formato do início do período
+BUCKETS = {
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+}
+
+CREATE_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS step_rollups (
+        bucket_start DATETIME NOT NULL,
+        step VARCHAR(255) NOT NULL,
+        runs INT NOT NULL DEFAULT 0,
+        errors INT NOT NULL DEFAULT 0,
+        warnings INT NOT NULL DEFAULT 0,
+        timed INT NOT NULL DEFAULT 0,
+        sum_ms DOUBLE NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket_start, step),
+        KEY idx_step_rollups_step (step, bucket_start)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS step_latency_hist (
+        bucket_start DATETIME NOT NULL,
+        step VARCHAR(255) NOT NULL,
+        bin SMALLINT NOT NULL,
+        count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket_start, step, bin)
+    )
+    ''',
+)
+
+# Etapas numeradas viram um nome só, para que "Adicionar Produto 3 de 10" e "Adicionar Produto 7 de 10"
+# sejam a mesma série
+_NORMALIZACOES = (
+    (re.compile(r'^Adicionar Produto \d+ de (\d+)$'), r'Adicionar Produto N de \1'),
+    (re.compile(r'^Adicionar Produto \d+ ao Carrinho$'), 'Adicionar Produto N ao Carrinho'),
+)
+
+
+def normalizar_etapa(step):
+    for padrao, substituto in _NORMALIZACOES:
+        if padrao.match(step):
+            return padrao.sub(substituto, step)
+    return step[:255]
+
+
+def bin_latencia(ms):
+    # Primeiro limite >= ms, comparando com os mesmos valores que os percentis reportam
+    # (o log() em ponto flutuante jogava valores exatos como 12.5 ms no bucket seguinte)
+    return bisect_left(LIMITES_MS, ms)
+
+
+def _limite_do_bin(indice):
+    # O bin de overflow não tem limite superior; usa o último limite como estimativa
+    return LIMITES_MS[min(indice, _NUM_BUCKETS - 1)]
+
+
+class RollupUpdater:
+    """Hook `on_batch` do BufferedLogWriter: acumula as linhas do lote por hora e etapa e
+    aplica os incrementos com INSERT ... ON DUPLICATE KEY UPDATE na mesma transação."""
+
+    def __init__(self, columns):
+        self._i_timestamp = columns.index('timestamp')
+        self._i_step = columns.index('step')
+        self._i_status = columns.index('status')
+        self._i_response = columns.index('response_time')
+
+    def __call__(self, cursor, lote):
+        aplicar_linhas(cursor, ((linha[self._i_timestamp], linha[self._i_step], linha[self._i_status], linha[self._i_response])
+                                for linha in lote))
+
+
+def aplicar_linhas(cursor, linhas):
+    """Soma nos rollups as linhas (timestamp, step, status, response_time em segundos)."""
+    totais = {}
+    histograma = {}
+    for timestamp, step, status, response_time in linhas:
+        if status == 'em_progresso': # Mensagens de progresso, não etapas
+            continue
+        hora = str(timestamp)[:13] + ':00:00'
+        chave = (hora, normalizar_etapa(step))
+        total = totais.setdefault(chave, [0, 0, 0, 0, 0.0])
+        total[0] += 1
+        total[1] += status == 'falha'
+        total[2] += status == 'aviso'
+        if response_time is not None:
+            ms = response_time * 1000
+            total[3] += 1
+            total[4] += ms
+            chave_hist = chave + (bin_latencia(ms),)
+            histograma[chave_hist] = histograma.get(chave_hist, 0) + 1
+    if not totais:
+        return
+    cursor.execute(
+        "INSERT INTO step_rollups (bucket_start, step, runs, errors, warnings, timed, sum_ms) VALUES "
+        + ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(totais))
+        + " ON DUPLICATE KEY UPDATE runs = runs + VALUES(runs), errors = errors + VALUES(errors),"
+          " warnings = warnings + VALUES(warnings), timed = timed + VALUES(timed), sum_ms = sum_ms + VALUES(sum_ms)",
+        [valor for chave, total in totais.items() for valor in chave + tuple(total)])
+    if histograma:
+        cursor.execute(
+            "INSERT INTO step_latency_hist (bucket_start, step, bin, count) VALUES "
+            + ', '.join(['(%s, %s, %s, %s)'] * len(histograma))
+            + " ON DUPLICATE KEY UPDATE count = count + VALUES(count)",
+            [valor for chave, contagem in histograma.items() for valor in chave + (contagem,)])
+
+
+def reconstruir_rollups(cursor, lote=5000):
+    """Preenche os rollups a partir de logs_testeSite (usado uma vez, pela migração)."""
+    ultimo_id = 0
+    while True:
+        cursor.execute("SELECT id, timestamp, step, status, response_time FROM logs_testeSite WHERE id > %s ORDER BY id LIMIT %s",
+                       (ultimo_id, lote))
+        linhas = cursor.fetchall()
+        if not linhas:
+            return
+        aplicar_linhas(cursor, ((l['timestamp'], l['step'], l['status'], l['response_time']) for l in linhas))
+        ultimo_id = linhas[-1]['id']
+
+
+def percentis(contagens):
+    """Percentis (ms) a partir de {bin: contagem}, pelo limite superior do bin que os contém."""
+    total = sum(contagens.values())
+    if not total:
+        return {f'p{p}_ms': None for p in PERCENTIS}
+    resultado = {}
+    bins = sorted(contagens)
+    for p in PERCENTIS:
+        alvo = math.ceil(total * p / 100)
+        acumulado = 0
+        for indice in bins:
+            acumulado += contagens[indice]
+            if acumulado >= alvo:
+                resultado[f'p{p}_ms'] = _limite_do_bin(indice)
+                break
+    return resultado
+
+
+def consultar(cursor, inicio, fim, bucket='day', step=None):
+    """Séries por período e etapa entre `inicio` e `fim` (datetime), somando os rollups horários."""
+    formato = BUCKETS[bucket]
+    # DATE_FORMAT usa %i/%s para minutos/segundos; o % é dobrado porque a consulta tem parâmetros
+    formato_sql = formato.replace('%M', '%i').replace('%S', '%s').replace('%', '%%')
+    filtros = "bucket_start >= %s AND bucket_start < %s"
+    parametros = [inicio.strftime('%Y-%m-%d %H:00:00'), fim.strftime('%Y-%m-%d %H:%M:%S')]
+    if step:
+        filtros += " AND step = %s"
+        parametros.append(step)
+    cursor.execute(
+        f"SELECT DATE_FORMAT(bucket_start, '{formato_sql}') AS periodo, step, SUM(runs) AS runs, SUM(errors) AS errors,"
+        f" SUM(warnings) AS warnings, SUM(timed) AS timed, SUM(sum_ms) AS sum_ms"
+        f" FROM step_rollups WHERE {filtros} GROUP BY periodo, step ORDER BY periodo, step", parametros)
+    totais = cursor.fetchall()
+    cursor.execute(
+        f"SELECT DATE_FORMAT(bucket_start, '{formato_sql}') AS periodo, step, bin, SUM(count) AS count"
+        f" FROM step_latency_hist WHERE {filtros} GROUP BY periodo, step, bin", parametros)
+    histogramas = {}
+    for linha in cursor.fetchall():
+        histogramas.setdefault((linha['periodo'], linha['step']), {})[int(linha['bin'])] = int(linha['count'])
+
+    series = []
+    for linha in totais:
+        runs, timed = int(linha['runs']), int(linha['timed'])
+        item = {
+            'bucket_start': linha['periodo'],
+            'step': linha['step'],
+            'runs': runs,
+            'errors': int(linha['errors']),
+            'warnings': int(linha['warnings']),
+            'error_rate': round(int(linha['errors']) / runs, 4) if runs else None,
+            'avg_ms': round(float(linha['sum_ms']) / timed, 1) if timed else None,
+        }
+        item.update(percentis(histogramas.get((linha['periodo'], linha['step']), {})))
+        series.append(item)
+    return series
+
+
+def periodo_padrao(dias=7):
+    fim = datetime.now()
+    return fim - timedelta(days=dias), fim
+
+
+def parse_data(valor):
+    # Aceita 'YYYY-MM-DD' ou 'YYYY-MM-DD HH:MM[:SS]' (também com 'T'); retorna None se inválida
+    for formato in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(valor.replace('T', ' '), formato)
+        except (ValueError, AttributeError):
+            continue
+    return None
@@ -0,0 +1,189 @@
+"""Loja VTEX de mentira, servida localmente, para exercitar os fluxos do bot sem depender do site real.
+
+Serve a home com o slider 'Categoria Exemplo' (links `vtex-product-summary-2-x-clearLink`),
+páginas de produto com botão "Comprar", minicart com `proceed-to-checkout`, o checkout e os
+endpoints de catálogo/orderForm usados pelo modo HTTP.
+
+    python benchmarks/fake_storefront.py --port 8000 --latency 0.05
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+PAGINA_HOME = """<!DOCTYPE html>
+<html><head><title>Loja Exemplo</title></head>
+<body>
+<div id="cookie-banner"><span>Usamos cookies.</span> <button onclick="document.getElementById('cookie-banner').remove()">Aceitar</button></div>
+<section>
+  <p class="vtex-rich-text">Categoria Exemplo</p>
+  {produtos}
+</section>
+</body></html>
+"""
+
+PRODUTO_HOME = """<div class="vtex-product-summary-2-x-container"><a class="vtex-product-summary-2-x-clearLink" href="/{slug}/p" title="{nome}">{nome}</a></div>"""
+
+PAGINA_PRODUTO = """<!DOCTYPE html>
+<html><head><title>{nome}</title></head>
+<body>
+<h1>{nome}</h1>
+<button class="vtex-add-to-cart-button-0-x-button" id="comprar"><span class="vtex-add-to-cart-button-0-x-buttonText">Comprar</span></button>
+<div class="vtex-minicart-2-x-minicartSideBarContentWrapper" id="minicart" style="display:none">
+  <span id="itens-carrinho"></span>
+  <button id="proceed-to-checkout" onclick="location.href='/checkout/'"><div>Ir para o checkout</div></button>
+</div>
+<script>
+document.getElementById('comprar').addEventListener('click', async () => {{
+  let orderForm = await (await fetch('/api/checkout/pub/orderForm', {{method: 'POST'}})).json();
+  orderForm = await (await fetch(`/api/checkout/pub/orderForm/${{orderForm.orderFormId}}/items`, {{
+    method: 'POST', headers: {{'Content-Type': 'application/json'}},
+    body: JSON.stringify({{orderItems: [{{id: '{sku}', quantity: 1, seller: '1'}}]}})
+  }})).json();
+  document.getElementById('itens-carrinho').textContent = `${{orderForm.items.length}} itens`;
+  document.getElementById('minicart').style.display = 'block';
+}});
+</script>
+</body></html>
+"""
+
+PAGINA_CHECKOUT = """<!DOCTYPE html>
+<html><head><title>Checkout</title></head>
+<body><h1>Checkout</h1><p id="itens">{itens} itens</p></body></html>
+"""
+
+
+class LojaFake:
+    def __init__(self, produtos=12, latencia=0.0):
+        self.produtos = [{'slug': f'produto-{i}', 'nome': f'Produto {i}', 'sku': str(1000 + i)} for i in range(1, produtos + 1)]
+        self.latencia = latencia
+        self.order_forms = {} # orderFormId -> lista de itens
+        self.requisicoes = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def produto(self, slug):
+        return next((p for p in self.produtos if p['slug'] == slug), None)
+
+    def novo_order_form(self):
+        with self._lock:
+            order_form_id = f"of{next(self._ids):06d}"
+            self.order_forms[order_form_id] = []
+        return order_form_id
+
+    def order_form_json(self, order_form_id):
+        return {'orderFormId': order_form_id, 'items': list(self.order_forms.get(order_form_id, []))}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Mantém a conexão aberta (keep-alive)
+    loja = None
+
+    def log_message(self, *args):
+        pass
+
+    def _order_form_do_cookie(self):
+        cookie = self.headers.get('Cookie', '')
+        achado = re.search(r'checkout\.vtex\.com=__ofid=(\w+)', cookie)
+        if achado and achado.group(1) in self.loja.order_forms:
+            return achado.group(1)
+        return None
+
+    def _responder(self, status, corpo, tipo='text/html; charset=utf-8', headers=None):
+        dados = corpo.encode('utf-8') if isinstance(corpo, str) else corpo
+        self.send_response(status)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _json(self, status, dados, headers=None):
+        self._responder(status, json.dumps(dados), 'application/json', headers)
+
+    def _preparar(self):
+        with self.loja._lock:
+            self.loja.requisicoes += 1
+        if self.loja.latencia:
+            time.sleep(self.loja.latencia)
+        partes = urlsplit(self.path)
+        return partes.path, parse_qs(partes.query)
+
+    def do_GET(self):
+        caminho, query = self._preparar()
+        loja = self.loja
+        if caminho == '/':
+            links = '\n  '.join(PRODUTO_HOME.format(**p) for p in loja.produtos)
+            return self._responder(200, PAGINA_HOME.format(produtos=links))
+        if caminho == '/robots.txt':
+            return self._responder(200, 'User-agent: *\n', 'text/plain')
+        achado = re.fullmatch(r'/([\w-]+)/p', caminho)
+        if achado and loja.produto(achado.group(1)):
+            return self._responder(200, PAGINA_PRODUTO.format(**loja.produto(achado.group(1))))
+        achado = re.fullmatch(r'/api/catalog_system/pub/products/search/([\w-]+)/p', caminho)
+        if achado:
+            produto = loja.produto(achado.group(1))
+            if not produto:
+                return self._json(200, [])
+            return self._json(200, [{
+                'productName': produto['nome'],
+                'linkText': produto['slug'],
+                'items': [{'itemId': produto['sku'], 'sellers': [{'sellerId': '1', 'commertialOffer': {'AvailableQuantity': 10}}]}],
+            }])
+        if caminho == '/api/checkout/pub/orderForm':
+            return self._order_form_atual()
+        if caminho.startswith('/checkout'):
+            order_form_id = (query.get('orderFormId') or [None])[0] or self._order_form_do_cookie()
+            return self._responder(200, PAGINA_CHECKOUT.format(itens=len(loja.order_forms.get(order_form_id, []))))
+        return self._responder(404, 'Not found', 'text/plain')
+
+    def do_POST(self):
+        caminho, _ = self._preparar()
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        corpo = json.loads(self.rfile.read(tamanho) or b'{}') if tamanho else {}
+        if caminho == '/api/checkout/pub/orderForm':
+            return self._order_form_atual()
+        achado = re.fullmatch(r'/api/checkout/pub/orderForm/(\w+)/items', caminho)
+        if achado and achado.group(1) in self.loja.order_forms:
+            with self.loja._lock:
+                self.loja.order_forms[achado.group(1)].extend(corpo.get('orderItems', []))
+            return self._json(200, self.loja.order_form_json(achado.group(1)))
+        return self._json(404, {'error': 'not found'})
+
+    def _order_form_atual(self):
+        order_form_id = self._order_form_do_cookie()
+        headers = {}
+        if not order_form_id:
+            order_form_id = self.loja.novo_order_form()
+            headers['Set-Cookie'] = f"checkout.vtex.com=__ofid={order_form_id}; Path=/"
+        return self._json(200, self.loja.order_form_json(order_form_id), headers)
+
+
+def iniciar_loja(porta=0, latencia=0.0, produtos=12):
+    """Sobe a loja numa thread e retorna (servidor, loja, url_base). Encerre com servidor.shutdown()."""
+    loja = LojaFake(produtos=produtos, latencia=latencia)
+    handler = type('LojaHandler', (Handler,), {'loja': loja})
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='FakeStorefront', daemon=True).start()
+    return servidor, loja, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='atraso (s) aplicado a cada requisição')
+    parser.add_argument('--products', type=int, default=12)
+    args = parser.parse_args()
+    servidor, _, url = iniciar_loja(args.port, args.latency, args.products)
+    print(f"Loja fake em {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
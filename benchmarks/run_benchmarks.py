@@ -0,0 +1,332 @@
+"""Benchmark de ponta a ponta do bot contra a loja fake local (fake_storefront.py).
+
+Para cada modo, executa o teste completo pelo mesmo caminho do /start_test
+(criar_sessao + executar_sessao -> SiteQATester.rodar_teste) e mede:
+
+- tempo total e por etapa (entre um evento final e o anterior);
+- comandos WebDriver enviados ao Chrome;
+- escritas no banco (linhas e INSERTs em lote do log_writer);
+- latência do /status, consultado durante a execução pelo cliente de teste do Flask;
+- partida a frio: em processos novos, o tempo até importar web_analise_site, até a
+  primeira resposta do /healthz e até o banco ficar pronto (--cold-starts).
+
+Com --lean os modos rodam no modo enxuto (sem imagens, fontes, vídeos e rastreadores) e
+aparecem como "<modo> (enxuto)", comparados só com execuções enxutas anteriores.
+
+O resultado vai para benchmarks/results/<data>_<commit>.json e é comparado com o
+arquivo anterior (ou --baseline), apontando as métricas que pioraram mais que --threshold.
+Usa o banco configurado em get_db_connection, como a aplicação.
+
+    python benchmarks/run_benchmarks.py --runs 3 --latency 0.02
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from fake_storefront import iniciar_loja
+
+web = None # web_analise_site, importado em main() depois de ajustar o ambiente
+DIR_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'results')
+
+# Métricas comparadas entre versões (todas: quanto menor, melhor)
+METRICAS_COMPARADAS = ('wall_time_mean', 'webdriver_commands_mean', 'db_rows_mean', 'db_batches_mean', 'status_p95_ms')
+METRICAS_PARTIDA = ('process_to_import_s_mean', 'first_response_s_mean', 'ready_s_mean')
+
+# Roda num processo novo: importa a aplicação, faz o primeiro /healthz e espera o banco ficar pronto
+_SONDA_PARTIDA = """
+import json, sys, time
+import web_analise_site as web
+importado = time.time()
+selenium = 'selenium.webdriver' in sys.modules
+status = web.app.test_client().get('/healthz').status_code
+respondido = time.time()
+pronto = time.time() if web.db_pronto.wait({espera}) else None
+print(json.dumps({{'imported_at': importado, 'responded_at': respondido, 'ready_at': pronto, 'healthz_status': status,
+                  'import_s': web.inicializacao['import_s'], 'selenium_at_import': selenium}}))
+"""
+
+
+class ContadorComandos:
+    """Conta os comandos WebDriver de todos os navegadores criados pela factory embrulhada."""
+
+    def __init__(self):
+        self.comandos = Counter()
+        self._lock = threading.Lock()
+
+    def embrulhar(self, factory):
+        def criar():
+            driver = factory()
+            original = driver.execute
+
+            def execute(comando, params=None):
+                with self._lock:
+                    self.comandos[comando] += 1
+                return original(comando, params)
+            driver.execute = execute
+            return driver
+        return criar
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.comandos)
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def duracoes_por_etapa(eventos, instantes, inicio):
+    # Duração de cada etapa final = instante do evento - instante do evento final anterior
+    duracoes = {}
+    anterior = inicio
+    momentos = dict(instantes)
+    for evento in eventos:
+        if evento.get('status') == 'em_progresso':
+            continue
+        instante = momentos[evento['seq']]
+        etapa = web.analytics.normalizar_etapa(evento['step'])
+        duracoes[etapa] = duracoes.get(etapa, 0.0) + (instante - anterior)
+        anterior = instante
+    return duracoes
+
+
+def executar_uma(url, modo, paralelo, contador, intervalo_status, enxuto=False):
+    session_id = web.criar_sessao(url, modo, paralelo, enxuto)
+    event_log = web.test_sessions.get(session_id)['events']
+    cliente = web.app.test_client()
+    comandos_antes = contador.snapshot()
+    log_antes = web.log_writer.stats()
+    latencias_status = []
+
+    inicio = time.perf_counter()
+    execucao = threading.Thread(target=web.executar_sessao, args=(session_id, 0.0))
+    execucao.start()
+    while execucao.is_alive():
+        t0 = time.perf_counter()
+        cliente.get(f'/status/{session_id}?since={event_log.last_seq}')
+        latencias_status.append((time.perf_counter() - t0) * 1000)
+        execucao.join(intervalo_status)
+    fim = time.perf_counter()
+
+    web.log_writer.flush()
+    log_depois = web.log_writer.stats()
+    comandos = contador.snapshot() - comandos_antes
+    resumo = web.test_sessions.get(session_id)
+    return {
+        'session_id': session_id,
+        'result': resumo.get('result'),
+        'wall_time': fim - inicio,
+        'steps': duracoes_por_etapa(event_log.since(0), event_log.instantes(), inicio),
+        'webdriver_commands': sum(comandos.values()),
+        'webdriver_by_command': dict(comandos.most_common(10)),
+        'db_rows': log_depois['rows_written'] - log_antes['rows_written'],
+        'db_batches': log_depois['batches_written'] - log_antes['batches_written'],
+        'status_latencies_ms': latencias_status,
+        'blocked_requests': (resumo.get('network') or {}).get('blocked_requests', 0),
+        'saved_bytes': (resumo.get('network') or {}).get('saved_bytes', 0),
+    }
+
+
+def agregar(execucoes):
+    latencias = [ms for e in execucoes for ms in e['status_latencies_ms']]
+    etapas = {}
+    for execucao in execucoes:
+        for etapa, duracao in execucao['steps'].items():
+            etapas.setdefault(etapa, []).append(duracao)
+    return {
+        'runs': len(execucoes),
+        'results': dict(Counter(e['result'] for e in execucoes)),
+        'wall_time_mean': statistics.mean(e['wall_time'] for e in execucoes),
+        'wall_time_max': max(e['wall_time'] for e in execucoes),
+        'webdriver_commands_mean': statistics.mean(e['webdriver_commands'] for e in execucoes),
+        'webdriver_top_commands': dict(sum((Counter(e['webdriver_by_command']) for e in execucoes), Counter()).most_common(10)),
+        'db_rows_mean': statistics.mean(e['db_rows'] for e in execucoes),
+        'db_batches_mean': statistics.mean(e['db_batches'] for e in execucoes),
+        'blocked_requests_mean': statistics.mean(e['blocked_requests'] for e in execucoes),
+        'saved_bytes_mean': statistics.mean(e['saved_bytes'] for e in execucoes),
+        'status_requests': len(latencias),
+        'status_p50_ms': percentil(latencias, 50),
+        'status_p95_ms': percentil(latencias, 95),
+        'status_max_ms': max(latencias) if latencias else None,
+        'steps': {etapa: {'mean': statistics.mean(d), 'max': max(d)} for etapa, d in sorted(etapas.items())},
+    }
+
+
+def medir_partida_fria(repeticoes, espera):
+    """Tempos de partida de `repeticoes` processos novos, contados a partir do lançamento."""
+    ambiente = dict(os.environ, QA_DRIVER_POOL_WARM='0') # Sem Chrome: só o custo de subir a aplicação
+    execucoes = []
+    for _ in range(repeticoes):
+        lancado = time.time()
+        saida = subprocess.run([sys.executable, '-c', _SONDA_PARTIDA.format(espera=espera)], cwd=RAIZ, env=ambiente,
+                               capture_output=True, text=True, timeout=espera + 120)
+        if saida.returncode != 0:
+            print(f"[partida a frio] processo falhou:\n{saida.stderr[-2000:]}")
+            continue
+        dados = json.loads(saida.stdout.strip().splitlines()[-1])
+        execucoes.append({
+            'process_to_import_s': dados['imported_at'] - lancado,
+            'import_s': dados['import_s'],
+            'first_response_s': dados['responded_at'] - lancado,
+            'ready_s': dados['ready_at'] - lancado if dados['ready_at'] else None,
+            'healthz_status': dados['healthz_status'],
+            'selenium_at_import': dados['selenium_at_import'],
+        })
+    if not execucoes:
+        return None
+    prontos = [e['ready_s'] for e in execucoes if e['ready_s'] is not None]
+    return {
+        'runs': len(execucoes),
+        'process_to_import_s_mean': statistics.mean(e['process_to_import_s'] for e in execucoes),
+        'import_s_mean': statistics.mean(e['import_s'] for e in execucoes),
+        'first_response_s_mean': statistics.mean(e['first_response_s'] for e in execucoes),
+        'first_response_s_max': max(e['first_response_s'] for e in execucoes),
+        'ready_s_mean': statistics.mean(prontos) if prontos else None,
+        'not_ready': len(execucoes) - len(prontos), # Banco não ficou pronto dentro da espera
+        'healthz_statuses': dict(Counter(str(e['healthz_status']) for e in execucoes)),
+        'selenium_at_import': any(e['selenium_at_import'] for e in execucoes),
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def comparar(atual, anterior, limite):
+    """Imprime a variação de cada métrica em relação ao resultado anterior; retorna as regressões."""
+    regressoes = []
+    print(f"\nComparação com {anterior['meta']['commit']} ({anterior['meta']['date']}):")
+    for modo, metricas in atual['modes'].items():
+        base = anterior['modes'].get(modo)
+        if not base:
+            continue
+        for nome in METRICAS_COMPARADAS:
+            novo, velho = metricas.get(nome), base.get(nome)
+            if not novo or not velho:
+                continue
+            variacao = (novo - velho) / velho
+            marca = ''
+            if variacao > limite:
+                marca = '  <-- REGRESSÃO'
+                regressoes.append((modo, nome, variacao))
+            print(f"  {modo:10} {nome:26} {velho:10.2f} -> {novo:10.2f} ({variacao:+.1%}){marca}")
+    partida, base = atual.get('cold_start'), anterior.get('cold_start')
+    for nome in METRICAS_PARTIDA if partida and base else ():
+        novo, velho = partida.get(nome), base.get(nome)
+        if not novo or not velho:
+            continue
+        variacao = (novo - velho) / velho
+        marca = ''
+        if variacao > limite:
+            marca = '  <-- REGRESSÃO'
+            regressoes.append(('partida', nome, variacao))
+        print(f"  {'partida':10} {nome:26} {velho:10.2f} -> {novo:10.2f} ({variacao:+.1%}){marca}")
+    return regressoes
+
+
+def main():
+    global web
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='execuções por modo')
+    parser.add_argument('--modes', default='Rápida,Avançada', help='modos separados por vírgula (Rápida, Avançada, HTTP)')
+    parser.add_argument('--parallel', type=int, default=1, help='navegadores em paralelo no modo Avançada')
+    parser.add_argument('--lean', action='store_true', help='roda no modo enxuto (bloqueio de recursos pesados)')
+    parser.add_argument('--latency', type=float, default=0.0, help='atraso (s) de cada requisição da loja fake')
+    parser.add_argument('--products', type=int, default=12)
+    parser.add_argument('--status-interval', type=float, default=0.2, help='intervalo (s) entre consultas ao /status')
+    parser.add_argument('--baseline', help='resultado a comparar (padrão: o mais recente em benchmarks/results)')
+    parser.add_argument('--threshold', type=float, default=0.10, help='piora relativa considerada regressão')
+    parser.add_argument('--fail-on-regression', action='store_true', help='sai com código 1 se houver regressão')
+    parser.add_argument('--cold-starts', type=int, default=3, help='processos novos medidos na partida a frio (0 desliga)')
+    parser.add_argument('--db-wait', type=float, default=60, help='espera máxima (s) pelo banco em cada partida')
+    args = parser.parse_args()
+
+    if os.environ.get('QA_SHARED_STATE'):
+        parser.error("Rode sem QA_SHARED_STATE: o benchmark executa os testes neste processo.")
+    # Medida antes de importar a aplicação aqui, em processos que não compartilham nada com este
+    partida = medir_partida_fria(args.cold_starts, args.db_wait) if args.cold_starts > 0 else None
+    # O pool é aquecido depois de instrumentado, para que os navegadores contem os comandos
+    os.environ['QA_DRIVER_POOL_WARM'] = '0'
+    import web_analise_site as web
+    contador = ContadorComandos()
+    web.driver_pool.factory = contador.embrulhar(web.driver_pool.factory)
+    web.probe_pool.factory = contador.embrulhar(web.probe_pool.factory)
+    web.driver_pool.prewarm(1)
+    if not web.db_pronto.wait(args.db_wait): # Sessões criadas antes disso não seriam registradas no banco
+        print(f"Aviso: banco não ficou pronto em {args.db_wait:.0f}s ({web.inicializacao['db_error']}).")
+
+    servidor, loja, url = iniciar_loja(latencia=args.latency, produtos=args.products)
+    print(f"Loja fake em {url} (latência {args.latency}s)")
+    resultado = {
+        'meta': {
+            'commit': commit_atual(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'runs': args.runs,
+            'latency': args.latency,
+            'products': args.products,
+            'parallel': args.parallel,
+            'lean': args.lean,
+        },
+        'modes': {},
+        'cold_start': partida,
+    }
+    try:
+        for modo in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            chave = f"{modo} (enxuto)" if args.lean else modo
+            requisicoes_antes = loja.requisicoes
+            execucoes = []
+            for i in range(args.runs):
+                execucao = executar_uma(url, modo, args.parallel, contador, args.status_interval, args.lean)
+                execucoes.append(execucao)
+                print(f"[{chave}] execução {i + 1}/{args.runs}: {execucao['wall_time']:.2f}s, {execucao['result']}, "
+                      f"{execucao['webdriver_commands']} comandos WebDriver, {execucao['db_rows']} linhas no banco")
+            resultado['modes'][chave] = agregar(execucoes)
+            resultado['modes'][chave]['store_requests_mean'] = (loja.requisicoes - requisicoes_antes) / args.runs
+    finally:
+        servidor.shutdown()
+    resultado['driver_pool'] = web.driver_pool.stats()
+
+    anteriores = sorted(glob.glob(os.path.join(DIR_RESULTADOS, '*.json')))
+    baseline = args.baseline or (anteriores[-1] if anteriores else None)
+    os.makedirs(DIR_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(DIR_RESULTADOS, f"{time.strftime('%Y%m%d-%H%M%S')}_{resultado['meta']['commit']}.json")
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"\nResultado salvo em {caminho}")
+    for modo, metricas in resultado['modes'].items():
+        print(f"  {modo:10} {metricas['wall_time_mean']:.2f}s/execução, {metricas['webdriver_commands_mean']:.0f} comandos WebDriver, "
+              f"{metricas['db_rows_mean']:.0f} linhas / {metricas['db_batches_mean']:.1f} lotes no banco, "
+              f"/status p95 {metricas['status_p95_ms'] or 0:.1f} ms")
+    if partida:
+        pronto = f"{partida['ready_s_mean']:.2f}s" if partida['ready_s_mean'] is not None else "não ficou pronto"
+        print(f"  {'partida':10} import {partida['process_to_import_s_mean']:.2f}s, primeiro /healthz "
+              f"{partida['first_response_s_mean']:.2f}s, banco pronto {pronto} "
+              f"(média de {partida['runs']} processos; Selenium no import: {'sim' if partida['selenium_at_import'] else 'não'})")
+
+    if baseline:
+        with open(baseline, encoding='utf-8') as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.threshold)
+        if regressoes and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
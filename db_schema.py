@@ -0,0 +1,165 @@
+from analytics import CREATE_TABLES as ANALYTICS_TABLES, reconstruir_rollups
+from monitor_scheduler import CREATE_TABLE as MONITORS_TABLE
+
+# Migrações do schema do banco, aplicadas em ordem por init_db. A versão aplicada fica em
+# `schema_version`, então a inicialização só verifica um número em vez de varrer o histórico.
+
+# Só números que cabem no INT do id e sem zeros à esquerda (TestandoSite_07 e _7 seriam o mesmo id)
+_REGEX_SESSAO_NUMERADA = "'^TestandoSite_[1-9][0-9]{0,8}$'"
+
+
+def _garantir_colunas(cursor, tabela, colunas):
+    # Acrescenta colunas novas em tabelas criadas por versões anteriores do schema
+    cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (tabela,))
+    existentes = {row['COLUMN_NAME'].lower() for row in cursor.fetchall()}
+    for coluna, tipo in colunas.items():
+        if coluna.lower() not in existentes:
+            cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+
+def _garantir_indices(cursor, tabela, indices):
+    # Cria índices/constraints ausentes; permite reexecutar uma migração interrompida
+    cursor.execute("SELECT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (tabela,))
+    existentes = {row['INDEX_NAME'].lower() for row in cursor.fetchall()}
+    cursor.execute("SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (tabela,))
+    existentes |= {row['CONSTRAINT_NAME'].lower() for row in cursor.fetchall()}
+    for nome, definicao in indices.items():
+        if nome.lower() not in existentes:
+            cursor.execute(f"ALTER TABLE {tabela} ADD {definicao}")
+
+
+def _migracao_1_logs(cursor, metric_columns):
+    # Tabela original de logs (e as colunas acrescentadas depois: espera e métricas do navegador)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS logs_testeSite (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id VARCHAR(255) NOT NULL, # Ajustado para suportar TestandoSite_X
+            timestamp DATETIME NOT NULL,
+            step VARCHAR(255) NOT NULL,
+            status VARCHAR(255) NOT NULL,
+            response_time REAL,
+            wait_time REAL,
+            message TEXT,
+            error_message TEXT
+        )
+    ''')
+    _garantir_colunas(cursor, 'logs_testeSite', dict({'wait_time': 'REAL'}, **{coluna: 'REAL' for coluna in metric_columns}))
+
+
+def _migracao_2_sessions(cursor, metric_columns):
+    # Uma linha por sessão; os logs passam a apontar para ela por chave estrangeira indexada
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_key VARCHAR(255) NOT NULL,
+            mode VARCHAR(50),
+            url TEXT,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            ended_at DATETIME,
+            status VARCHAR(50) NOT NULL DEFAULT 'queued',
+            UNIQUE KEY uq_sessions_session_key (session_key),
+            KEY idx_sessions_started_at (started_at)
+        )
+    ''')
+    _garantir_colunas(cursor, 'logs_testeSite', {'session_ref': 'INT NULL'})
+    _garantir_indices(cursor, 'logs_testeSite', {
+        'idx_logs_session_timestamp': 'INDEX idx_logs_session_timestamp (session_id, timestamp)',
+        'idx_logs_session_ref': 'INDEX idx_logs_session_ref (session_ref)',
+    })
+    # Sessões antigas: TestandoSite_N mantém N como id, para que os próximos ids auto-incremento
+    # (que numeram as sessões novas) não repitam uma chave já usada. As demais, inclusive números
+    # fora do padrão, recebem um id novo.
+    cursor.execute(f'''
+        SELECT COUNT(DISTINCT session_id) AS n FROM logs_testeSite
+        WHERE session_id REGEXP '^TestandoSite_[0-9]+$' AND session_id NOT REGEXP {_REGEX_SESSAO_NUMERADA}
+    ''')
+    fora_do_padrao = cursor.fetchone()['n']
+    if fora_do_padrao:
+        print(f"[init_db] {fora_do_padrao} sessão(ões) antiga(s) com número inválido (zero, zeros à esquerda "
+              f"ou mais de 9 dígitos) recebem um id novo em vez do número da chave.")
+    cursor.execute(f'''
+        INSERT IGNORE INTO sessions (id, session_key, created_at, started_at, ended_at, status)
+        SELECT CAST(SUBSTRING_INDEX(session_id, '_', -1) AS UNSIGNED), session_id, MIN(timestamp), MIN(timestamp), MAX(timestamp), 'completed'
+        FROM logs_testeSite WHERE session_id REGEXP {_REGEX_SESSAO_NUMERADA} GROUP BY session_id
+    ''')
+    cursor.execute(f'''
+        INSERT IGNORE INTO sessions (session_key, created_at, started_at, ended_at, status)
+        SELECT session_id, MIN(timestamp), MIN(timestamp), MAX(timestamp), 'completed'
+        FROM logs_testeSite WHERE session_id NOT REGEXP {_REGEX_SESSAO_NUMERADA} GROUP BY session_id
+    ''')
+    cursor.execute('''
+        UPDATE logs_testeSite l JOIN sessions s ON s.session_key = l.session_id
+        SET l.session_ref = s.id WHERE l.session_ref IS NULL
+    ''')
+    _garantir_indices(cursor, 'logs_testeSite', {
+        'fk_logs_session': 'CONSTRAINT fk_logs_session FOREIGN KEY (session_ref) REFERENCES sessions (id) ON DELETE CASCADE',
+    })
+
+
+def _migracao_3_rollups(cursor, metric_columns):
+    # Agregados por hora/etapa do /analytics, preenchidos uma vez com o histórico existente
+    for ddl in ANALYTICS_TABLES:
+        cursor.execute(ddl)
+    cursor.execute("SELECT 1 FROM step_rollups LIMIT 1")
+    if not cursor.fetchone():
+        reconstruir_rollups(cursor)
+
+
+def _migracao_4_monitors(cursor, metric_columns):
+    # Sites monitorados periodicamente pelo MonitorScheduler, com o próximo horário de cada um
+    cursor.execute(MONITORS_TABLE)
+
+
+def _migracao_5_artefatos(cursor, metric_columns):
+    # Links (JSON) do screenshot, HTML e console capturados nas etapas que falharam
+    _garantir_colunas(cursor, 'logs_testeSite', {'artifacts': 'TEXT NULL'})
+
+
+def _migracao_6_resumo_carga(cursor, metric_columns):
+    # Resumo final (JSON) do modo Carga, devolvido pelo /status depois que a sessão sai da memória
+    _garantir_colunas(cursor, 'sessions', {'load_summary': 'MEDIUMTEXT NULL'})
+
+
+# (versão, função) em ordem crescente; migrações novas entram no fim da lista
+MIGRACOES = [
+    (1, _migracao_1_logs),
+    (2, _migracao_2_sessions),
+    (3, _migracao_3_rollups),
+    (4, _migracao_4_monitors),
+    (5, _migracao_5_artefatos),
+    (6, _migracao_6_resumo_carga),
+]
+
+SCHEMA_VERSION = MIGRACOES[-1][0]
+
+LOCK_TIMEOUT = 120 # Segundos que um processo espera outro terminar as migrações
+
+
+def aplicar_migracoes(conn, metric_columns):
+    """Aplica as migrações ainda não registradas em `schema_version` e retorna a versão final.
+
+    Vários processos (workers do gunicorn, qa_worker.py) chamam isto ao iniciar;
+    um lock nomeado do MySQL garante que só um aplique as migrações por vez e
+    os outros apenas leiam a versão já aplicada.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK('qa_init_db', %s) AS ok", (LOCK_TIMEOUT,))
+    if cursor.fetchone()['ok'] != 1:
+        raise RuntimeError("Tempo esgotado aguardando outro processo aplicar as migrações.")
+    try:
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT NOT NULL PRIMARY KEY, applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)")
+        cursor.execute("SELECT MAX(version) AS version FROM schema_version")
+        linha = cursor.fetchone()
+        versao = (linha and linha['version']) or 0
+        for numero, migracao in MIGRACOES:
+            if numero <= versao:
+                continue
+            print(f"[init_db] Aplicando migração {numero} ({migracao.__name__})...")
+            migracao(cursor, metric_columns)
+            cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (numero,))
+            conn.commit()
+            versao = numero
+        return versao
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('qa_init_db')")
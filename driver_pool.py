@@ -0,0 +1,210 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+from session_watchdog import encerrar_processos
+
+
+class DriverPoolTimeout(Exception):
+    pass
+
+
+class DriverPool:
+    """Pool limitado de navegadores já iniciados, reaproveitados entre execuções.
+
+    `factory` cria um WebDriver novo. Entre um empréstimo e outro o navegador
+    tem cookies, storage e cache apagados, preservando a semântica de aba
+    anônima. Um navegador é reciclado após `max_uses` empréstimos ou quando
+    falha no health-check / é devolvido como quebrado.
+    """
+
+    def __init__(self, factory, max_size=2, max_uses=20):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self._ociosos = [] # (driver, usos, origens visitadas no último empréstimo)
+        self._usos = {} # id(driver) -> usos dos drivers emprestados
+        self._total = 0 # Drivers vivos (ociosos + emprestados + sendo iniciados)
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'launches': 0,
+            'launch_failures': 0,
+            'launch_time_total': 0.0,
+            'launch_time_max': 0.0,
+            'launch_time_last': 0.0,
+            'recycled_max_uses': 0,
+            'recycled_unhealthy': 0,
+            'recycled_broken': 0,
+        }
+
+    def acquire(self, timeout=60):
+        limite = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._ociosos and self._total >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise DriverPoolTimeout("Nenhum navegador livre no pool.")
+                    self._cond.wait(restante)
+                if self._ociosos:
+                    driver, usos, origens = self._ociosos.pop()
+                else:
+                    driver, usos, origens = None, 0, ()
+                    self._total += 1 # Reserva a vaga antes de iniciar o navegador fora do lock
+
+            if driver is None:
+                driver = self._lancar()
+                with self._cond:
+                    self._stats['misses'] += 1
+                    self._usos[id(driver)] = 1
+                return driver
+
+            if self._saudavel(driver) and self._reapagar(driver, origens):
+                with self._cond:
+                    self._stats['hits'] += 1
+                    self._usos[id(driver)] = usos + 1
+                return driver
+
+            with self._cond:
+                self._stats['recycled_unhealthy'] += 1
+            self._encerrar(driver)
+
+    def release(self, driver, broken=False):
+        with self._cond:
+            usos = self._usos.pop(id(driver), 0)
+        if broken or usos >= self.max_uses:
+            with self._cond:
+                self._stats['recycled_broken' if broken else 'recycled_max_uses'] += 1
+            self._encerrar(driver)
+            return
+        try:
+            origens = self._limpar(driver)
+        except Exception:
+            with self._cond:
+                self._stats['recycled_broken'] += 1
+            self._encerrar(driver)
+            return
+        with self._cond:
+            self._ociosos.append((driver, usos, origens))
+            self._cond.notify()
+
+    def prewarm(self, quantidade=1):
+        """Inicia navegadores ociosos em segundo plano até `quantidade` (limitado a max_size)."""
+        def aquecer():
+            for _ in range(min(quantidade, self.max_size)):
+                with self._cond:
+                    if len(self._ociosos) >= quantidade or self._total >= self.max_size:
+                        return
+                    self._total += 1
+                try:
+                    driver = self._lancar()
+                except Exception as e:
+                    print(f"[driver_pool] Falha ao pré-iniciar navegador: {e}")
+                    return
+                with self._cond:
+                    self._ociosos.append((driver, 0, ()))
+                    self._cond.notify()
+        threading.Thread(target=aquecer, name="DriverPoolPrewarm", daemon=True).start()
+
+    def close(self):
+        with self._cond:
+            ociosos, self._ociosos = self._ociosos, []
+        for driver, _, _ in ociosos:
+            self._encerrar(driver)
+
+    def stats(self):
+        with self._cond:
+            dados = dict(self._stats)
+            dados['idle'] = len(self._ociosos)
+            dados['in_use'] = len(self._usos)
+            dados['size'] = self._total
+            dados['max_size'] = self.max_size
+        dados['launch_time_avg'] = (round(dados['launch_time_total'] / dados['launches'], 3)
+                                    if dados['launches'] else 0)
+        pedidos = dados['hits'] + dados['misses']
+        dados['hit_rate'] = round(dados['hits'] / pedidos, 3) if pedidos else 0
+        return dados
+
+    def _lancar(self):
+        inicio = time.time()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._stats['launch_failures'] += 1
+                self._cond.notify()
+            raise
+        tempo = time.time() - inicio
+        with self._cond:
+            self._stats['launches'] += 1
+            self._stats['launch_time_total'] += tempo
+            self._stats['launch_time_last'] = tempo
+            self._stats['launch_time_max'] = max(self._stats['launch_time_max'], tempo)
+        return driver
+
+    def _encerrar(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            # Um quit() que falha (navegador travado) deixaria o chromedriver e o Chrome órfãos
+            encerrar_processos(driver)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _saudavel(self, driver):
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def _reapagar(self, driver, origens):
+        # Um service worker ou timer da página ainda pode gravar storage depois do release
+        try:
+            self._apagar_dados(driver, origens)
+            return True
+        except Exception:
+            return False
+
+    def _origens(self, driver):
+        # Origens http(s) no histórico da aba atual, inclusive as anteriores a um about:blank
+        urls = [driver.current_url]
+        try:
+            urls += [entrada.get('url', '') for entrada in driver.execute_cdp_cmd('Page.getNavigationHistory', {}).get('entries', [])]
+        except Exception:
+            pass
+        origens = set()
+        for url in urls:
+            partes = urlsplit(url)
+            if partes.scheme in ('http', 'https'):
+                origens.add(f"{partes.scheme}://{partes.netloc}")
+        return origens
+
+    def _apagar_dados(self, driver, origens):
+        for origem in sorted(origens):
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origem, 'storageTypes': 'all'})
+        driver.delete_all_cookies()
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+
+    def _limpar(self, driver):
+        """Devolve o navegador ao estado de aba anônima; retorna as origens que o empréstimo visitou."""
+        # Fecha abas extras abertas durante o teste, guardando as origens visitadas em cada uma
+        janelas = driver.window_handles
+        origens = set()
+        for janela in janelas[1:]:
+            driver.switch_to.window(janela)
+            origens |= self._origens(driver)
+            driver.close()
+        driver.switch_to.window(janelas[0])
+        origens |= self._origens(driver)
+
+        # Apaga storage (localStorage, IndexedDB, service workers...) de todas as origens, cookies e cache
+        self._apagar_dados(driver, origens)
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []}) # Desfaz o bloqueio do modo enxuto
+        driver.get('about:blank')
+        driver.execute_cdp_cmd('Page.resetNavigationHistory', {}) # O próximo empréstimo só vê as próprias origens
+        return origens
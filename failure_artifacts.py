@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+import tracing
+
+# Artefatos das etapas que falham: screenshot, HTML da página e console do navegador no momento
+# da falha. O nome de cada arquivo é o sha256 do conteúdo, então a mesma página de erro vista em
+# várias execuções ocupa o disco uma vez só. A captura (comandos WebDriver) acontece na thread
+# do teste, depois de medido o tempo da etapa; compressão, gravação e limpeza ficam numa thread
+# de fundo.
+
+DIR_ARTEFATOS = os.environ.get('QA_ARTIFACTS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts'))
+MAX_BYTES = int(os.environ.get('QA_ARTIFACTS_MAX_BYTES', 500 * 1024 * 1024))
+
+# tipo -> (extensão, mimetype, comprimido em disco). O PNG já é comprimido; o gzip fica para os textos
+TIPOS = {
+    'screenshot': ('png', 'image/png', False),
+    'dom': ('html', 'text/html; charset=utf-8', True),
+    'console': ('json', 'application/json', True),
+}
+_POR_EXTENSAO = {extensao: (mimetype, comprimido) for extensao, mimetype, comprimido in TIPOS.values()}
+_NOME_RE = re.compile(r'^[0-9a-f]{64}\.(' + '|'.join(_POR_EXTENSAO) + r')$')
+
+
+def capturar(driver):
+    """Estado atual do navegador: {tipo: bytes} com o que foi possível obter."""
+    leitores = {
+        'screenshot': driver.get_screenshot_as_png,
+        'dom': lambda: driver.page_source.encode('utf-8'),
+        # Mensagens do console desde a última leitura (capability goog:loggingPrefs 'browser')
+        'console': lambda: json.dumps(driver.get_log('browser'), ensure_ascii=False, indent=1).encode('utf-8'),
+    }
+    conteudos = {}
+    for tipo, ler in leitores.items():
+        try:
+            with tracing.span('artifact_capture', tipo):
+                conteudos[tipo] = ler()
+        except Exception as e:
+            print(f"Aviso: não foi possível capturar {tipo} da falha: {e}")
+    return conteudos
+
+
+class ArtifactStore:
+    """Arquivos endereçados pelo conteúdo em `diretorio`, gravados numa thread de fundo.
+
+    Acima de `max_bytes` em disco os artefatos usados há mais tempo são removidos; um
+    conteúdo repetido conta como uso e volta para o fim da fila. Com a fila cheia o
+    artefato é descartado, para nunca segurar a thread do teste.
+    """
+
+    def __init__(self, diretorio=DIR_ARTEFATOS, max_bytes=MAX_BYTES, max_fila=50):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._indice = OrderedDict() # nome -> bytes em disco, do usado há mais tempo ao mais recente
+        self._total = 0
+        self._lock = threading.Lock()
+        self._stats = {'stored': 0, 'deduplicated': 0, 'dropped': 0, 'evicted': 0, 'write_errors': 0}
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ArtifactStore", daemon=True)
+                self._thread.start()
+
+    def caminho(self, nome):
+        """(arquivo, mimetype, comprimido) de um artefato existente, ou None."""
+        if not _NOME_RE.match(nome or ''):
+            return None
+        mimetype, comprimido = _POR_EXTENSAO[nome.rsplit('.', 1)[1]]
+        arquivo = self._arquivo(nome, comprimido)
+        return (arquivo, mimetype, comprimido) if os.path.exists(arquivo) else None
+
+    def _arquivo(self, nome, comprimido):
+        return os.path.join(self.diretorio, nome[:2], nome + ('.gz' if comprimido else ''))
+
+    def salvar(self, conteudos):
+        """Enfileira {tipo: bytes} para gravação e retorna {tipo: nome} dos que foram aceitos."""
+        self.start()
+        nomes = {}
+        for tipo, dados in conteudos.items():
+            extensao, _, comprimido = TIPOS[tipo]
+            nome = f"{hashlib.sha256(dados).hexdigest()}.{extensao}"
+            try:
+                self._fila.put_nowait((nome, dados, comprimido))
+            except queue.Full:
+                with self._lock:
+                    self._stats['dropped'] += 1
+                continue
+            nomes[tipo] = nome
+        return nomes
+
+    def stats(self):
+        with self._lock:
+            dados = dict(self._stats)
+            dados.update({'files': len(self._indice), 'bytes': self._total, 'max_bytes': self.max_bytes})
+        dados['queue_depth'] = self._fila.qsize()
+        return dados
+
+    def _carregar_indice(self):
+        # Arquivos de execuções anteriores (ou de outros processos), do mais antigo ao mais recente
+        encontrados = []
+        for raiz, _, arquivos in os.walk(self.diretorio):
+            for arquivo in arquivos:
+                nome = arquivo[:-3] if arquivo.endswith('.gz') else arquivo
+                if not _NOME_RE.match(nome):
+                    continue
+                try:
+                    info = os.stat(os.path.join(raiz, arquivo))
+                except OSError:
+                    continue
+                encontrados.append((info.st_mtime, nome, info.st_size))
+        with self._lock:
+            for _, nome, tamanho in sorted(encontrados):
+                self._indice[nome] = tamanho
+                self._total += tamanho
+
+    def _run(self):
+        self._carregar_indice()
+        while True:
+            nome, dados, comprimido = self._fila.get()
+            try:
+                with tracing.span('artifact_write'):
+                    self._gravar(nome, dados, comprimido)
+            except OSError as e:
+                print(f"Erro ao gravar o artefato {nome}: {e}")
+                with self._lock:
+                    self._stats['write_errors'] += 1
+
+    def _gravar(self, nome, dados, comprimido):
+        arquivo = self._arquivo(nome, comprimido)
+        if os.path.exists(arquivo):
+            os.utime(arquivo) # A ordem de remoção entre reinícios vem do mtime
+            tamanho = os.path.getsize(arquivo)
+            with self._lock:
+                self._stats['deduplicated'] += 1
+                if nome not in self._indice: # Gravado por outro processo depois de carregado o índice
+                    self._total += tamanho
+                self._indice[nome] = tamanho
+                self._indice.move_to_end(nome)
+            return
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        conteudo = gzip.compress(dados, compresslevel=6) if comprimido else dados
+        temporario = f"{arquivo}.{threading.get_ident()}.tmp"
+        with open(temporario, 'wb') as f:
+            f.write(conteudo)
+        os.replace(temporario, arquivo) # Quem lê nunca vê um arquivo pela metade
+        with self._lock:
+            self._indice[nome] = len(conteudo)
+            self._total += len(conteudo)
+            self._stats['stored'] += 1
+            excedentes = []
+            while self._total > self.max_bytes and len(self._indice) > 1:
+                antigo, tamanho = self._indice.popitem(last=False)
+                self._total -= tamanho
+                self._stats['evicted'] += 1
+                excedentes.append(antigo)
+        for antigo in excedentes:
+            for comprimido_antigo in (True, False):
+                try:
+                    os.remove(self._arquivo(antigo, comprimido_antigo))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,241 @@
+import http.client
+import json
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urljoin, urlsplit
+
+import tracing
+
+# Links de produto do slider VTEX (mesmo critério dos XPaths do modo navegador)
+_LINK_PRODUTO_RE = re.compile(r'<a\b[^>]*\bclass="[^"]*vtex-product-summary-2-x-clearLink[^"]*"[^>]*>', re.IGNORECASE)
+_HREF_RE = re.compile(r'\bhref="([^"]+)"', re.IGNORECASE)
+
+
+class Resposta:
+    def __init__(self, url, status, headers, corpo, ttfb, tempo):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.corpo = corpo
+        self.ttfb = ttfb # Segundos até receber os cabeçalhos
+        self.tempo = tempo # Segundos até o fim do corpo
+
+    @property
+    def texto(self):
+        return self.corpo.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.corpo or b'null')
+
+
+class HTTPConnectionPool:
+    """Conexões keep-alive reaproveitadas entre sondagens, por (esquema, host)."""
+
+    def __init__(self, max_por_host=4, timeout=30):
+        self.max_por_host = max_por_host
+        self.timeout = timeout
+        self._ociosas = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0}
+
+    def _obter(self, esquema, host):
+        with self._lock:
+            self._stats['requests'] += 1
+            livres = self._ociosas.get((esquema, host))
+            if livres:
+                self._stats['connections_reused'] += 1
+                return livres.pop(), True
+            self._stats['connections_opened'] += 1
+        classe = http.client.HTTPSConnection if esquema == 'https' else http.client.HTTPConnection
+        return classe(host, timeout=self.timeout), False
+
+    def _devolver(self, esquema, host, conn):
+        with self._lock:
+            livres = self._ociosas.setdefault((esquema, host), [])
+            if len(livres) < self.max_por_host:
+                livres.append(conn)
+                return
+        conn.close()
+
+    def request(self, metodo, url, corpo=None, headers=None):
+        partes = urlsplit(url)
+        caminho = partes.path or '/'
+        if partes.query:
+            caminho += '?' + partes.query
+        for tentativa in range(2):
+            conn, reaproveitada = self._obter(partes.scheme, partes.netloc)
+            inicio = time.perf_counter()
+            try:
+                conn.request(metodo, caminho, body=corpo, headers=headers or {})
+                resposta = conn.getresponse()
+                ttfb = time.perf_counter() - inicio
+                dados = resposta.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if reaproveitada and tentativa == 0:
+                    continue # O servidor fechou a conexão ociosa; tenta uma nova
+                raise
+            except Exception:
+                conn.close()
+                raise
+            tempo = time.perf_counter() - inicio
+            tracing.registrar('http', tempo, metodo)
+            if resposta.will_close:
+                conn.close()
+            else:
+                self._devolver(partes.scheme, partes.netloc, conn)
+            return Resposta(url, resposta.status, resposta.headers, dados, ttfb, tempo)
+
+    def stats(self):
+        with self._lock:
+            dados = dict(self._stats)
+            dados['idle'] = sum(len(v) for v in self._ociosas.values())
+        return dados
+
+
+class SessaoHTTP:
+    """Cliente de uma sondagem: cookies próprios (carrinho isolado) sobre o pool compartilhado."""
+
+    def __init__(self, pool, user_agent="Mozilla/5.0 (QA Automatico; sonda HTTP)"):
+        self.pool = pool
+        self.cookies = {}
+        self.user_agent = user_agent
+
+    def request(self, metodo, url, dados_json=None, max_redirects=5):
+        ttfb = tempo = 0.0
+        for _ in range(max_redirects + 1):
+            headers = {'User-Agent': self.user_agent, 'Accept': '*/*'}
+            if self.cookies:
+                headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+            corpo = None
+            if dados_json is not None:
+                corpo = json.dumps(dados_json).encode('utf-8')
+                headers['Content-Type'] = 'application/json'
+            resposta = self.pool.request(metodo, url, corpo, headers)
+            ttfb = ttfb or resposta.ttfb
+            tempo += resposta.tempo
+            for cabecalho in resposta.headers.get_all('Set-Cookie') or []:
+                for nome, morsel in SimpleCookie(cabecalho).items():
+                    self.cookies[nome] = morsel.value
+            if resposta.status in (301, 302, 303, 307, 308) and resposta.headers.get('Location'):
+                url = urljoin(url, resposta.headers['Location'])
+                if resposta.status == 303:
+                    metodo, dados_json = 'GET', None
+                continue
+            resposta.ttfb, resposta.tempo = ttfb, tempo
+            return resposta
+        raise RuntimeError(f"Redirecionamentos demais ao acessar {url}")
+
+    def get(self, url):
+        return self.request('GET', url)
+
+    def post_json(self, url, dados=None):
+        return self.request('POST', url, dados if dados is not None else {})
+
+
+# Pool compartilhado por todas as sondagens do processo
+pool_compartilhado = HTTPConnectionPool()
+
+
+class SondaHTTP:
+    """Fluxo home → produto → adicionar ao carrinho → checkout sem navegador.
+
+    Usa as páginas da loja e os endpoints públicos de catálogo e orderForm da
+    VTEX. Cada etapa é reportada por `registrar(step, status, response_time,
+    message, metricas)` com os mesmos nomes de etapa do modo rápido.
+    """
+
+    def __init__(self, url, registrar, categoria='Categoria Exemplo', pool=None):
+        self.url = url.rstrip('/') + '/'
+        self.registrar = registrar
+        self.categoria = categoria
+        self.sessao = SessaoHTTP(pool or pool_compartilhado)
+
+    def _verificar(self, resposta):
+        if resposta.status >= 400:
+            raise RuntimeError(f"HTTP {resposta.status} em {resposta.url}")
+        return resposta
+
+    def _links_produtos(self, html):
+        links = []
+        for tag in _LINK_PRODUTO_RE.findall(html):
+            href = _HREF_RE.search(tag)
+            if href and '/p' in href.group(1):
+                url = urljoin(self.url, href.group(1))
+                if url not in links:
+                    links.append(url)
+        return links
+
+    def executar(self):
+        """Executa o fluxo; retorna True se chegou ao checkout."""
+        step_name = "Acessar Home"
+        try:
+            home = self._verificar(self.sessao.get(self.url))
+        except Exception as e:
+            self.registrar(step_name, "falha", None, f"Erro ao acessar a home: {e}", None)
+            return False
+        self.registrar(step_name, "sucesso", home.tempo, f"Home carregada em {home.tempo:.2f}s (TTFB {home.ttfb * 1000:.0f} ms).",
+                       {'ttfb_ms': round(home.ttfb * 1000, 1), 'load_ms': round(home.tempo * 1000, 1)})
+
+        step_name = "Rolar para Seção 'Categoria Exemplo'"
+        html = home.texto
+        produtos = self._links_produtos(html)
+        if self.categoria not in html:
+            self.registrar(step_name, "falha", None, f"Erro: Seção '{self.categoria}' não encontrada na página inicial.", None)
+            return False
+        self.registrar(step_name, "sucesso", None, f"Seção '{self.categoria}' encontrada no HTML da home.", None)
+
+        step_name = "Clicar Produto Categoria Exemplo"
+        if not produtos:
+            self.registrar(step_name, "falha", None, "Erro: Nenhum link de produto encontrado na seção 'Categoria Exemplo'.", None)
+            return False
+        produto_url = produtos[0]
+        try:
+            pagina = self._verificar(self.sessao.get(produto_url))
+            sku, seller = self._sku_do_produto(produto_url)
+        except Exception as e:
+            self.registrar(step_name, "falha", None, f"Erro ao acessar o produto {produto_url}: {e}", None)
+            return False
+        self.registrar(step_name, "sucesso", pagina.tempo, f"Produto acessado em {pagina.tempo:.2f}s.",
+                       {'ttfb_ms': round(pagina.ttfb * 1000, 1), 'load_ms': round(pagina.tempo * 1000, 1)})
+
+        step_name = "Adicionar ao Carrinho"
+        try:
+            # Como no navegador, o orderForm é obtido ao carregar a loja; só a inclusão do item é medida
+            order_form = self._verificar(self.sessao.post_json(urljoin(self.url, 'api/checkout/pub/orderForm'))).json()
+            order_form_id = order_form['orderFormId']
+            inclusao = self._verificar(self.sessao.post_json(
+                urljoin(self.url, f'api/checkout/pub/orderForm/{order_form_id}/items'),
+                {'orderItems': [{'id': sku, 'quantity': 1, 'seller': seller}]}))
+            itens = len(inclusao.json().get('items', []))
+        except Exception as e:
+            self.registrar(step_name, "falha", None, f"Erro ao adicionar o produto ao carrinho: {e}", None)
+            return False
+        if not itens:
+            self.registrar(step_name, "falha", inclusao.tempo, "Erro: o carrinho continua vazio após incluir o produto.", None)
+            return False
+        self.registrar(step_name, "sucesso", inclusao.tempo, f"Produto adicionado ao carrinho em {inclusao.tempo:.2f}s.", None)
+
+        step_name = "Finalizar Compra"
+        try:
+            checkout = self._verificar(self.sessao.get(urljoin(self.url, f'checkout/?orderFormId={order_form_id}')))
+        except Exception as e:
+            self.registrar(step_name, "falha", None, f"Erro ao abrir o checkout: {e}", None)
+            return False
+        self.registrar(step_name, "sucesso", checkout.tempo, f"Checkout aberto em {checkout.tempo:.2f}s com {itens} itens.",
+                       {'ttfb_ms': round(checkout.ttfb * 1000, 1), 'load_ms': round(checkout.tempo * 1000, 1)})
+        return True
+
+    def _sku_do_produto(self, produto_url):
+        # /<slug>/p -> API de catálogo, que devolve o SKU e o seller do primeiro item disponível
+        slug = urlsplit(produto_url).path.strip('/').rsplit('/p', 1)[0].strip('/')
+        dados = self._verificar(self.sessao.get(urljoin(self.url, f'api/catalog_system/pub/products/search/{slug}/p'))).json()
+        if not dados:
+            raise RuntimeError(f"Produto '{slug}' não encontrado na API de catálogo.")
+        for item in dados[0].get('items', []):
+            for seller in item.get('sellers', []):
+                if seller.get('commertialOffer', {}).get('AvailableQuantity', 0) > 0:
+                    return item['itemId'], seller['sellerId']
+        raise RuntimeError(f"Produto '{slug}' sem estoque disponível.")
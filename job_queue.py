@@ -0,0 +1,115 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Fila de testes cheia.")
+        self.retry_after = retry_after
+
+
+def prever_inicios(agora, inicios_rodando, max_workers, duracao_media, quantidade):
+    """Horários previstos de início dos próximos `quantidade` jobs da fila.
+
+    Simula os workers: cada um fica livre quando termina o job atual; os jobs
+    da fila ocupam, em ordem, o worker que liberar primeiro.
+    """
+    livres = [max(agora, inicio + duracao_media) for inicio in inicios_rodando]
+    livres += [agora] * (max_workers - len(livres))
+    heapq.heapify(livres)
+    inicios = []
+    for _ in range(quantidade):
+        inicio = heapq.heappop(livres)
+        inicios.append(inicio)
+        heapq.heappush(livres, inicio + duracao_media)
+    return inicios
+
+
+class JobQueue:
+    """Fila limitada de testes com um número fixo de workers de navegador.
+
+    `submit` recusa (QueueFull) quando já há `max_queue` jobs aguardando, em
+    vez de abrir mais um Chrome. Cada job recebe, ao começar, quantos segundos
+    ficou na fila, para que a espera seja registrada separada da execução.
+    """
+
+    def __init__(self, max_workers=2, max_queue=20, estimated_run_time=60.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._fila = deque() # (job_id, func, enfileirado_em)
+        self._rodando = {} # job_id -> início
+        self._cond = threading.Condition()
+        self._workers = []
+        self._duracao_media = estimated_run_time # Média móvel da duração das execuções
+        self._stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'queue_wait_total': 0.0}
+
+    def submit(self, job_id, func):
+        """Enfileira `func(espera_fila)` e retorna a posição na fila (0 = começa já)."""
+        with self._cond:
+            if len(self._fila) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise QueueFull(retry_after=max(1, int(self._previsoes(len(self._fila) + 1)[-1] - time.time())))
+            self._fila.append((job_id, func, time.time()))
+            self._stats['submitted'] += 1
+            self._iniciar_workers()
+            self._cond.notify()
+            ocupados = len(self._rodando) + len(self._fila)
+            return max(0, ocupados - self.max_workers)
+
+    def position(self, job_id):
+        """Posição (1 = próximo) de um job que ainda aguarda, ou None."""
+        with self._cond:
+            for i, (jid, _, _) in enumerate(self._fila):
+                if jid == job_id:
+                    return i + 1
+        return None
+
+    def estimated_start(self, job_id):
+        """Horário (epoch) previsto para o job começar, usando a duração média das execuções."""
+        with self._cond:
+            for i, (jid, _, _) in enumerate(self._fila):
+                if jid == job_id:
+                    return self._previsoes(i + 1)[i]
+        return None
+
+    def stats(self):
+        with self._cond:
+            dados = dict(self._stats)
+            dados['queued'] = len(self._fila)
+            dados['running'] = len(self._rodando)
+            dados['max_workers'] = self.max_workers
+            dados['max_queue'] = self.max_queue
+            dados['avg_run_time'] = round(self._duracao_media, 2)
+        return dados
+
+    def _previsoes(self, quantidade):
+        return prever_inicios(time.time(), self._rodando.values(), self.max_workers, self._duracao_media, quantidade)
+
+    def _iniciar_workers(self):
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._executar, name=f"JobQueueWorker-{len(self._workers) + 1}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while not self._fila:
+                    self._cond.wait()
+                job_id, func, enfileirado_em = self._fila.popleft()
+                inicio = time.time()
+                self._rodando[job_id] = inicio
+                espera = inicio - enfileirado_em
+                self._stats['queue_wait_total'] += espera
+            try:
+                func(espera)
+            except Exception as e:
+                print(f"[job_queue] Erro no job {job_id}: {e}")
+            finally:
+                with self._cond:
+                    del self._rodando[job_id]
+                    self._stats['completed'] += 1
+                    self._duracao_media = 0.8 * self._duracao_media + 0.2 * (time.time() - inicio)
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+
+import analytics
+from http_probe import HTTPConnectionPool, SondaHTTP
+
+# Modo Carga: N clientes virtuais percorrem o fluxo de compra ao mesmo tempo, em três fases.
+# Na subida os clientes entram um a um ao longo de `ramp_up` segundos. No patamar ficam todos
+# ativos por `hold` segundos. Na descida saem na ordem inversa ao longo de `ramp_down` segundos.
+# Alguns clientes usam um navegador real (cenário QA_LOAD_BROWSER_SCENARIO); os demais fazem o
+# fluxo por HTTP da SondaHTTP, bem mais leve. Cada etapa de cada cliente vira uma linha em
+# logs_testeSite e entra nas estatísticas por janela de tempo, publicadas enquanto o teste roda.
+
+# Prefixo das etapas gravadas, para que os rollups do /analytics separem a latência sob carga
+PREFIXO_ETAPA = "Carga: "
+ETAPA_FLUXO = "Fluxo Completo" # Uma compra inteira de um cliente (throughput em compras/s)
+
+CENARIO_NAVEGADOR = os.environ.get('QA_LOAD_BROWSER_SCENARIO', 'Rápida')
+MAX_CLIENTES = int(os.environ.get('QA_LOAD_MAX_SHOPPERS', 200))
+MAX_DURACAO = int(os.environ.get('QA_LOAD_MAX_DURATION', 1800))
+JANELA = float(os.environ.get('QA_LOAD_WINDOW', 5))
+# Taxa de erro das compras acima da qual o teste termina como falha (abaixo, erros viram aviso)
+MAX_TAXA_ERRO = float(os.environ.get('QA_LOAD_MAX_ERROR_RATE', 0.05))
+
+FASES = {'ramp_up': 'subida', 'hold': 'patamar', 'ramp_down': 'descida', 'done': 'encerrado'}
+
+PADROES = {'shoppers': 10, 'browsers': 1, 'ramp_up': 30, 'hold': 60, 'ramp_down': 30, 'think_time': 1.0}
+
+# Status que são resultado de uma etapa (os demais marcam início e fim do cenário)
+STATUS_RESULTADO = ('sucesso', 'falha', 'aviso')
+
+
+def validar_config(dados, max_navegadores):
+    """Configuração do teste a partir do /start_test; ValueError com o motivo se inválida."""
+    config = {}
+    for campo, padrao in PADROES.items():
+        valor = (dados or {}).get(campo, padrao)
+        try:
+            config[campo] = type(padrao)(valor)
+        except (TypeError, ValueError):
+            raise ValueError(f"{campo} deve ser um número")
+        if config[campo] < 0:
+            raise ValueError(f"{campo} não pode ser negativo")
+    if not 1 <= config['shoppers'] <= MAX_CLIENTES:
+        raise ValueError(f"shoppers deve estar entre 1 e {MAX_CLIENTES}")
+    if config['browsers'] > min(config['shoppers'], max_navegadores):
+        raise ValueError(f"browsers deve ser no máximo {min(config['shoppers'], max_navegadores)}")
+    if config['ramp_up'] + config['hold'] + config['ramp_down'] > MAX_DURACAO:
+        raise ValueError(f"ramp_up + hold + ramp_down deve ser no máximo {MAX_DURACAO}s")
+    return config
+
+
+def _novo_acumulado():
+    return {'runs': 0, 'errors': 0, 'timed': 0, 'sum_ms': 0.0, 'hist': {}}
+
+
+def _somar(acumulado, falhou, ms):
+    acumulado['runs'] += 1
+    acumulado['errors'] += falhou
+    if ms is not None:
+        acumulado['timed'] += 1
+        acumulado['sum_ms'] += ms
+        indice = analytics.bin_latencia(ms)
+        acumulado['hist'][indice] = acumulado['hist'].get(indice, 0) + 1
+
+
+def _descrever(acumulado, duracao):
+    runs = acumulado['runs']
+    item = {
+        'runs': runs,
+        'errors': acumulado['errors'],
+        'error_rate': round(acumulado['errors'] / runs, 4) if runs else None,
+        'throughput_per_s': round(runs / duracao, 3) if duracao > 0 else None,
+        'avg_ms': round(acumulado['sum_ms'] / acumulado['timed'], 1) if acumulado['timed'] else None,
+    }
+    item.update(analytics.percentis(acumulado['hist']))
+    return item
+
+
+class EstatisticasCarga:
+    """Execuções, erros e histograma de latência por etapa, no total e em janelas de `janela` s.
+
+    Os percentis usam os mesmos buckets do analytics.py (erro relativo de até 25%).
+    """
+
+    def __init__(self, janela=JANELA):
+        self.janela = janela
+        self.inicio = time.time()
+        self._total = {} # etapa -> acumulado
+        self._janelas = {} # índice da janela -> {etapa: acumulado}
+        self._ativos = {} # índice da janela -> [máximo, último valor] de clientes ativos
+        self._lock = threading.Lock()
+
+    def _indice(self, instante):
+        return max(0, int((instante - self.inicio) // self.janela))
+
+    def registrar(self, etapa, falhou, tempo=None):
+        ms = tempo * 1000 if tempo is not None else None
+        with self._lock:
+            _somar(self._total.setdefault(etapa, _novo_acumulado()), falhou, ms)
+            janela = self._janelas.setdefault(self._indice(time.time()), {})
+            _somar(janela.setdefault(etapa, _novo_acumulado()), falhou, ms)
+
+    def ativos(self, quantidade):
+        with self._lock:
+            ativos = self._ativos.setdefault(self._indice(time.time()), [0, 0])
+            ativos[0] = max(ativos[0], quantidade)
+            ativos[1] = quantidade
+
+    def resumo(self):
+        agora = time.time()
+        decorrido = agora - self.inicio
+        with self._lock:
+            total = {etapa: _descrever(acumulado, decorrido) for etapa, acumulado in self._total.items()}
+            janelas = []
+            ultimo = 0
+            for indice in range(self._indice(agora) + 1):
+                # A janela atual ainda não terminou: o throughput é sobre o tempo já decorrido nela
+                duracao = min(self.janela, decorrido - indice * self.janela)
+                etapas = self._janelas.get(indice, {})
+                # Janela sem entradas nem saídas: continua com os clientes ativos no fim da anterior
+                maximo, ultimo = self._ativos.get(indice, (ultimo, ultimo))
+                janelas.append({'start_s': round(indice * self.janela, 1), 'active': maximo,
+                                'steps': {etapa: _descrever(acumulado, duracao) for etapa, acumulado in etapas.items()}})
+        return {'window_s': self.janela, 'elapsed_s': round(decorrido, 1), 'steps': total, 'windows': janelas}
+
+
+class TesteCarga:
+    """Executa os clientes virtuais e publica as estatísticas a cada janela.
+
+    `registrar(step, status, tempo, mensagem, metricas)` recebe cada etapa de cada cliente (para
+    gravar no banco), `publicar(resumo)` o resumo a cada janela e `progresso(mensagem, percentual)`
+    o andamento. `fluxo_navegador(registrar)` executa uma compra num navegador real; sem ele
+    todos os clientes usam HTTP.
+    """
+
+    def __init__(self, url, config, registrar, publicar=None, progresso=None, fluxo_navegador=None, janela=JANELA):
+        self.url = url
+        self.config = config
+        self.registrar = registrar
+        self.publicar = publicar or (lambda resumo: None)
+        self.progresso = progresso or (lambda mensagem, percentual: None)
+        self.fluxo_navegador = fluxo_navegador
+        self.estatisticas = EstatisticasCarga(janela)
+        # Pool próprio: cada cliente mantém sua conexão keep-alive entre uma compra e outra
+        self.pool = HTTPConnectionPool(max_por_host=config['shoppers'])
+        self.duracao = config['ramp_up'] + config['hold'] + config['ramp_down']
+        self._ativos = 0
+        self._terminados = 0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._fim = threading.Event()
+
+    def parar(self):
+        self._parar.set()
+
+    def fase(self, decorrido):
+        if decorrido < self.config['ramp_up']:
+            return 'ramp_up'
+        if decorrido < self.config['ramp_up'] + self.config['hold']:
+            return 'hold'
+        return 'ramp_down' if decorrido < self.duracao else 'done'
+
+    def _janela_do_cliente(self, indice):
+        # Entram na ordem dos índices e saem na inversa: a quantidade ativa sobe e desce linearmente
+        n = self.config['shoppers']
+        entrada = self.config['ramp_up'] * indice / n
+        saida = self.config['ramp_up'] + self.config['hold'] + self.config['ramp_down'] * (n - indice) / n
+        return entrada, saida
+
+    def _mudar_ativos(self, delta):
+        with self._lock:
+            self._ativos += delta
+            ativos = self._ativos
+        self.estatisticas.ativos(ativos)
+
+    def _cliente(self, indice, tipo):
+        entrada, saida = self._janela_do_cliente(indice)
+        inicio = self.estatisticas.inicio
+        try:
+            if self._parar.wait(max(0, inicio + entrada - time.time())):
+                return
+            self._mudar_ativos(1)
+            try:
+                while time.time() < inicio + saida and not self._parar.is_set():
+                    self._compra(indice + 1, tipo)
+                    self._parar.wait(self.config['think_time'])
+            finally:
+                self._mudar_ativos(-1)
+        finally:
+            with self._lock:
+                self._terminados += 1
+                if self._terminados == self.config['shoppers']:
+                    self._fim.set()
+
+    def _compra(self, numero, tipo):
+        falhas = []
+
+        def registrar(step, status, response_time, message, metricas=None, wait_time=None):
+            if status not in STATUS_RESULTADO:
+                return
+            if status == 'falha':
+                falhas.append(step)
+            self.estatisticas.registrar(step, status == 'falha', response_time)
+            self.registrar(PREFIXO_ETAPA + step, status, response_time, f"Cliente {numero} ({tipo}): {message}", metricas)
+
+        inicio = time.perf_counter()
+        try:
+            if tipo == 'navegador':
+                self.fluxo_navegador(registrar)
+            else:
+                SondaHTTP(self.url, registrar, pool=self.pool).executar()
+        except Exception as e:
+            if not self._parar.is_set(): # Compra interrompida pelo parar() não conta como erro
+                registrar(ETAPA_FLUXO, 'falha', None, f"Erro inesperado: {e}")
+            return
+        tempo = time.perf_counter() - inicio
+        if falhas:
+            self.estatisticas.registrar(ETAPA_FLUXO, True)
+        else:
+            registrar(ETAPA_FLUXO, 'sucesso', tempo, f"Compra concluída em {tempo:.2f}s.")
+
+    def _publicar(self):
+        resumo = self.resumo()
+        fluxo = resumo['steps'].get(ETAPA_FLUXO) or {}
+        self.publicar(resumo)
+        percentual = min(99, int(100 * resumo['elapsed_s'] / self.duracao)) if self.duracao else 99
+        self.progresso(f"Carga ({FASES[resumo['phase']]}): {resumo['active']} clientes ativos, "
+                       f"{fluxo.get('runs', 0)} compras, {100 * (fluxo.get('error_rate') or 0):.1f}% com erro.", percentual)
+
+    def resumo(self):
+        resumo = self.estatisticas.resumo()
+        resumo.update({'phase': self.fase(resumo['elapsed_s']), 'active': self._ativos, 'config': dict(self.config)})
+        return resumo
+
+    def executar(self):
+        """Roda as três fases até o último cliente sair (ou `parar`) e retorna o resumo final."""
+        # Os clientes com navegador entram primeiro e saem por último, cobrindo as três fases
+        navegadores = self.config['browsers'] if self.fluxo_navegador else 0
+        threads = [threading.Thread(target=self._cliente, args=(indice, 'navegador' if indice < navegadores else 'HTTP'),
+                                    name=f"carga-{indice + 1}", daemon=True)
+                   for indice in range(self.config['shoppers'])]
+        for thread in threads:
+            thread.start()
+        while not self._fim.wait(self.estatisticas.janela):
+            self._publicar()
+        for thread in threads:
+            thread.join()
+        resumo = self.resumo()
+        self.publicar(resumo)
+        return resumo
+
+    def resultado(self, resumo):
+        """(status, mensagem) da etapa final, pela taxa de erro das compras."""
+        fluxo = resumo['steps'].get(ETAPA_FLUXO)
+        if not fluxo or not fluxo['runs']:
+            return 'falha', "Nenhuma compra foi concluída durante o teste de carga."
+        config = resumo['config']
+        mensagem = (f"{config['shoppers']} clientes ({config['browsers']} com navegador): {fluxo['runs']} compras em "
+                    f"{resumo['elapsed_s']:.0f}s ({fluxo['throughput_per_s']:.2f}/s), {100 * fluxo['error_rate']:.1f}% com erro")
+        if fluxo['p95_ms'] is not None:
+            mensagem += f", p95 {fluxo['p95_ms'] / 1000:.2f}s"
+        mensagem += "."
+        if fluxo['error_rate'] > MAX_TAXA_ERRO:
+            return 'falha', mensagem
+        return ('aviso' if fluxo['errors'] else 'sucesso'), mensagem
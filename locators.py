@@ -0,0 +1,183 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import tracing
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, WebDriverException
+
+# Estratégias de busca do WebDriver (os mesmos valores de By.CSS_SELECTOR etc.), sem importar
+# selenium.webdriver, que carrega todos os drivers só para ler três strings
+CSS = "css selector"
+XPATH = "xpath"
+TAG_NAME = "tag name"
+
+# XPath 1.0 não tem lower-case(); o translate() só aparece nos fallbacks
+_MINUSCULAS = "translate({}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+
+# Candidatos de cada elemento lógico, na ordem em que são tentados: seletores CSS
+# (resolvidos pelo motor nativo do navegador) antes dos XPaths de texto, mais lentos em DOMs grandes.
+LOCATORS = {
+    'aceitar_cookies': [
+        (CSS, "#onetrust-accept-btn-handler"),
+        # Pelo texto, como antes; um "accept" solto no id/classe também pega newsletter e termos de uso
+        (XPATH, f"//button[contains({_MINUSCULAS.format('.')}, 'aceitar')] | //button[contains({_MINUSCULAS.format('.')}, 'accept')]"),
+        (CSS, "[id*='cookie' i] button[id*='accept' i], [class*='cookie' i] button[class*='accept' i], "
+              "[class*='cookie' i] button[class*='aceitar' i], [id*='consent' i] button[id*='accept' i], "
+              "[class*='consent' i] button[class*='accept' i]"),
+    ],
+    'secao_categoria': [
+        (XPATH, "//p[contains(@class, 'vtex-rich-text')][contains(text(), 'Categoria Exemplo')]"),
+        (XPATH, "//p[contains(text(), 'Categoria Exemplo')] | //h2[contains(text(), 'Categoria Exemplo')]"),
+    ],
+    'produto_categoria': [
+        # Sem CSS: o seletor não consegue se limitar à seção pelo título e cairia nos produtos dos sliders
+        (XPATH, "//*[self::p or self::h2][contains(text(), 'Categoria Exemplo')]/ancestor::section[1]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]"),
+    ],
+    'links_slider': [
+        (CSS, "section a.vtex-product-summary-2-x-clearLink[href*='/p']"),
+        (XPATH, "//section[.//p[contains(@class, 'vtex-rich-text')] or .//h2]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]"),
+    ],
+    'botao_comprar': [
+        (CSS, "button.vtex-add-to-cart-button-0-x-button"),
+        (CSS, "button[class*='add-to-cart' i], button[class*='buy-button' i]"),
+        (XPATH, f"//button[.//span[contains({_MINUSCULAS.format('text()')}, 'comprar')] or .//span[contains({_MINUSCULAS.format('text()')}, 'add to cart')]]"),
+    ],
+    'finalizar_compra': [
+        (CSS, "#proceed-to-checkout"),
+        (XPATH, f"//button[.//div[contains({_MINUSCULAS.format('text()')}, 'ir para o checkout')]]"),
+    ],
+    'gaveta_carrinho': [
+        (CSS, ".vtex-minicart-2-x-minicartSideBarContentWrapper, #proceed-to-checkout"),
+        (XPATH, "//div[contains(@class, 'vtex-minicart-2-x-minicartSideBarContentWrapper')] | //button[@id='proceed-to-checkout']"),
+    ],
+}
+
+
+class LocatorRegistry:
+    """Resolve elementos lógicos pelos candidatos de LOCATORS, aprendendo por site.
+
+    O candidato que encontrou o elemento por último em um site passa a ser
+    tentado primeiro nas próximas buscas nesse site. O tempo de cada busca é
+    acumulado por candidato para que seletores lentos apareçam no /stats.
+    """
+
+    def __init__(self, locators=None):
+        self.locators = {nome: tuple(candidatos) for nome, candidatos in (locators or LOCATORS).items()}
+        self._preferidos = {} # (site, nome) -> índice do candidato que funcionou por último
+        self._tempos = {} # (nome, índice) -> {'lookups', 'hits', 'total', 'max'}
+        self._lock = threading.Lock()
+
+    def adicionar(self, nome, candidatos):
+        # Locators declarados fora de LOCATORS (ex.: nos cenários); se mudarem, a preferência aprendida recomeça
+        candidatos = tuple(candidatos)
+        with self._lock:
+            if self.locators.get(nome) == candidatos:
+                return
+            self.locators[nome] = candidatos
+            for chave in [chave for chave in self._preferidos if chave[1] == nome]:
+                del self._preferidos[chave]
+
+    def para_site(self, url):
+        return LocatorsDoSite(self, urlsplit(url).netloc or url)
+
+    def ordem(self, site, nome):
+        candidatos = self.locators[nome]
+        with self._lock:
+            preferido = self._preferidos.get((site, nome))
+        indices = list(range(len(candidatos)))
+        if preferido is not None:
+            indices.remove(preferido)
+            indices.insert(0, preferido)
+        return [(i, candidatos[i]) for i in indices]
+
+    def registrar(self, site, nome, indice, tempo, achou):
+        with self._lock:
+            dados = self._tempos.setdefault((nome, indice), {'lookups': 0, 'hits': 0, 'total': 0.0, 'max': 0.0})
+            dados['lookups'] += 1
+            dados['total'] += tempo
+            dados['max'] = max(dados['max'], tempo)
+            if achou:
+                dados['hits'] += 1
+                self._preferidos[(site, nome)] = indice
+
+    def buscar(self, site, driver, nome, multiplos=False, condicao=None):
+        """Tenta os candidatos em ordem; retorna o elemento (ou a lista não vazia) ou None.
+
+        `condicao(elemento)` filtra o resultado (ex.: visível e habilitado) e é
+        usada pelas esperas, que chamam esta função a cada tentativa.
+        """
+        for indice, (by, valor) in self.ordem(site, nome):
+            inicio = time.perf_counter()
+            try:
+                with tracing.span('lookup', nome):
+                    elementos = driver.find_elements(by, valor)
+                    if condicao:
+                        elementos = [e for e in elementos if condicao(e)]
+            except StaleElementReferenceException:
+                elementos = []
+            except WebDriverException as e:
+                # Seletor não suportado pelo navegador: conta como falha e segue para o próximo
+                if 'invalid selector' not in str(e).lower():
+                    raise
+                elementos = []
+            self.registrar(site, nome, indice, time.perf_counter() - inicio, bool(elementos))
+            if elementos:
+                return elementos if multiplos else elementos[0]
+        return None
+
+    def stats(self):
+        with self._lock:
+            tempos = {chave: dict(dados) for chave, dados in self._tempos.items()}
+            preferidos = dict(self._preferidos)
+        resultado = {}
+        for nome, candidatos in self.locators.items():
+            itens = []
+            for indice, (by, valor) in enumerate(candidatos):
+                dados = tempos.get((nome, indice))
+                if not dados:
+                    continue
+                itens.append({'by': by, 'value': valor, 'lookups': dados['lookups'], 'hits': dados['hits'],
+                              'avg_ms': round(dados['total'] / dados['lookups'] * 1000, 2),
+                              'max_ms': round(dados['max'] * 1000, 2)})
+            if itens:
+                resultado[nome] = {'candidates': itens,
+                                   'preferred': {site: i for (site, n), i in preferidos.items() if n == nome}}
+        return resultado
+
+
+class LocatorsDoSite:
+    """Visão do registro presa a um site, usada por um tester durante a execução."""
+
+    def __init__(self, registro, site):
+        self.registro = registro
+        self.site = site
+
+    def candidatos(self, nome):
+        return self.registro.ordem(self.site, nome)
+
+    def registrar(self, nome, indice, tempo, achou):
+        # Para buscas feitas fora de `buscar` (ex.: num único execute_script)
+        self.registro.registrar(self.site, nome, indice, tempo, achou)
+
+    def find(self, driver, nome):
+        elemento = self.registro.buscar(self.site, driver, nome)
+        if elemento is None:
+            raise NoSuchElementException(f"Nenhum candidato de '{nome}' encontrou o elemento.")
+        return elemento
+
+    def find_all(self, driver, nome):
+        return self.registro.buscar(self.site, driver, nome, multiplos=True) or []
+
+    def presente(self, nome):
+        # Condição para WaitEngine.until: False mantém a espera, o elemento a encerra
+        return lambda driver: self.registro.buscar(self.site, driver, nome) or False
+
+    def visivel(self, nome):
+        return lambda driver: self.registro.buscar(self.site, driver, nome, condicao=lambda e: e.is_displayed()) or False
+
+    def clicavel(self, nome):
+        return lambda driver: self.registro.buscar(self.site, driver, nome,
+                                                  condicao=lambda e: e.is_displayed() and e.is_enabled()) or False
+
+
+# Registro compartilhado pelo processo: o aprendizado de um teste vale para os seguintes
+registry = LocatorRegistry()
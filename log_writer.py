@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+
+import tracing
+
+
+class ConnectionPool:
+    """Pool pequeno de conexões reaproveitáveis, criadas sob demanda pela fábrica."""
+
+    def __init__(self, connection_factory, max_size=2):
+        self.connection_factory = connection_factory
+        self.max_size = max_size
+        self._livres = queue.LifoQueue(maxsize=max_size)
+
+    def acquire(self):
+        try:
+            conn = self._livres.get_nowait()
+        except queue.Empty:
+            return self.connection_factory()
+        try:
+            conn.ping(reconnect=True) # Conexões ociosas podem ter sido derrubadas pelo servidor
+        except Exception:
+            self._descartar(conn)
+            return self.connection_factory()
+        return conn
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._descartar(conn)
+            return
+        try:
+            self._livres.put_nowait(conn)
+        except queue.Full:
+            self._descartar(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._descartar(self._livres.get_nowait())
+            except queue.Empty:
+                return
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class BufferedLogWriter:
+    """Grava linhas de log em lote numa thread de fundo.
+
+    As linhas entram numa fila limitada; a thread escritora junta até
+    `batch_size` linhas ou espera no máximo `flush_interval` segundos antes de
+    emitir um INSERT com várias linhas. Se a fila estiver cheia a linha é
+    descartada (e contada) para nunca bloquear a thread que controla o Chrome.
+    `on_batch(cursor, lote)`, se informado, roda na mesma transação de cada
+    lote (ex.: atualizar tabelas de agregados).
+    """
+
+    def __init__(self, connection_factory, table, columns, batch_size=50,
+                 flush_interval=1.0, max_queue=10000, pool_size=2, on_batch=None):
+        self.pool = ConnectionPool(connection_factory, max_size=pool_size)
+        self.table = table
+        self.columns = tuple(columns)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_batch = on_batch
+        self._fila = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._pendentes = 0 # Linhas enfileiradas e ainda não gravadas (ou descartadas)
+        self._drenado = threading.Condition(self._stats_lock)
+        self._stats = {
+            'rows_enqueued': 0,
+            'rows_written': 0,
+            'rows_dropped': 0,
+            'batches_written': 0,
+            'batch_errors': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'hook_errors': 0,
+        }
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _insert_sql(self, n):
+        colunas = ', '.join(self.columns)
+        valores = '(' + ', '.join(['%s'] * len(self.columns)) + ')'
+        return f"INSERT INTO {self.table} ({colunas}) VALUES " + ', '.join([valores] * n)
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="BufferedLogWriter", daemon=True)
+                self._thread.start()
+
+    def write(self, row):
+        """Enfileira uma linha (tupla na ordem de `columns`) sem bloquear."""
+        self.start()
+        with self._stats_lock:
+            self._pendentes += 1
+        try:
+            self._fila.put_nowait(tuple(row))
+        except queue.Full:
+            with self._stats_lock:
+                self._pendentes -= 1
+                self._stats['rows_dropped'] += 1
+                self._drenado.notify_all()
+            return False
+        with self._stats_lock:
+            self._stats['rows_enqueued'] += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """Espera até que todas as linhas enfileiradas até agora tenham sido processadas."""
+        if self._thread is None:
+            return True
+        limite = time.monotonic() + timeout
+        with self._drenado:
+            while self._pendentes > 0:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self._drenado.wait(restante)
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            dados = dict(self._stats)
+        dados['queue_depth'] = self._fila.qsize()
+        dados['avg_batch_size'] = (round(dados['rows_written'] / dados['batches_written'], 2)
+                                   if dados['batches_written'] else 0)
+        return dados
+
+    def _run(self):
+        while True:
+            lote = [self._fila.get()]
+            limite = time.monotonic() + self.flush_interval
+            while len(lote) < self.batch_size:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._gravar_lote(lote)
+
+    def _gravar_lote(self, lote):
+        conn = None
+        broken = False
+        try:
+            conn = self.pool.acquire()
+            with tracing.span('db_write', self.table):
+                with conn.cursor() as cursor:
+                    cursor.execute(self._insert_sql(len(lote)), [valor for linha in lote for valor in linha])
+                    if self.on_batch:
+                        try:
+                            self.on_batch(cursor, lote)
+                        except Exception as e:
+                            # Uma falha nos agregados não pode custar as linhas de log do lote
+                            print(f"Erro no processamento do lote de logs: {e}")
+                            with self._stats_lock:
+                                self._stats['hook_errors'] += 1
+                conn.commit()
+            with self._stats_lock:
+                self._stats['rows_written'] += len(lote)
+                self._stats['batches_written'] += 1
+                self._stats['last_batch_size'] = len(lote)
+                self._stats['max_batch_size'] = max(self._stats['max_batch_size'], len(lote))
+        except Exception as e:
+            broken = True
+            print(f"Erro ao logar no banco de dados: {e}")
+            with self._stats_lock:
+                self._stats['batch_errors'] += 1
+                self._stats['rows_dropped'] += len(lote)
+        finally:
+            if conn is not None:
+                self.pool.release(conn, broken=broken)
+            with self._stats_lock:
+                self._pendentes -= len(lote)
+                self._drenado.notify_all()
@@ -0,0 +1,361 @@
+import heapq
+import random
+import threading
+import time
+
+MISSED_POLICIES = ('skip', 'catch_up')
+
+# Campos de um monitor que podem ser definidos pela API, com o tipo de cada um
+CAMPOS_EDITAVEIS = {
+    'url': str,
+    'mode': str,
+    'parallel': int,
+    'interval_seconds': int,
+    'jitter_seconds': int,
+    'missed_policy': str,
+    'enabled': bool,
+}
+
+CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS monitors (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        url TEXT NOT NULL,
+        mode VARCHAR(50) NOT NULL,
+        parallel INT NOT NULL DEFAULT 1,
+        interval_seconds INT NOT NULL,
+        jitter_seconds INT NOT NULL DEFAULT 0,
+        missed_policy VARCHAR(20) NOT NULL DEFAULT 'skip',
+        enabled TINYINT(1) NOT NULL DEFAULT 1,
+        next_run_at DOUBLE NULL,
+        last_run_at DOUBLE NULL,
+        last_session_id VARCHAR(255) NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+class MonitorStore:
+    """Persistência dos monitores na tabela `monitors`, para que os agendamentos sobrevivam a reinícios."""
+
+    def __init__(self, connection_factory):
+        self.connection_factory = connection_factory
+
+    def _executar(self, sql, parametros=(), buscar=False):
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, parametros)
+            resultado = cursor.fetchall() if buscar else cursor.lastrowid
+            conn.commit()
+            return resultado
+
+    def listar(self):
+        monitores = self._executar("SELECT * FROM monitors ORDER BY id", buscar=True)
+        for monitor in monitores:
+            monitor['enabled'] = bool(monitor['enabled'])
+            monitor.pop('created_at', None)
+        return monitores
+
+    def criar(self, dados):
+        colunas = list(dados)
+        return self._executar(f"INSERT INTO monitors ({', '.join(colunas)}) VALUES ({', '.join(['%s'] * len(colunas))})",
+                              [dados[c] for c in colunas])
+
+    def atualizar(self, monitor_id, campos):
+        if campos:
+            self._executar(f"UPDATE monitors SET {', '.join(f'{c} = %s' for c in campos)} WHERE id = %s",
+                           list(campos.values()) + [monitor_id])
+
+    def remover(self, monitor_id):
+        self._executar("DELETE FROM monitors WHERE id = %s", (monitor_id,))
+
+
+class LeaderLock:
+    """Lock nomeado do MySQL (GET_LOCK) que elege um único processo para disparar os monitores.
+
+    O lock pertence à conexão: se o processo líder cair, a conexão fecha e
+    outro processo assume na próxima tentativa.
+    """
+
+    def __init__(self, connection_factory, nome='qa_monitor_scheduler'):
+        self.connection_factory = connection_factory
+        self.nome = nome
+        self._conn = None
+
+    def acquire(self):
+        # True se este processo é (ou continua) o líder; a consulta também mantém a conexão viva
+        try:
+            if self._conn is None:
+                self._conn = self.connection_factory()
+            cursor = self._conn.cursor()
+            cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS meu", (self.nome,))
+            if cursor.fetchone()['meu'] == 1:
+                return True
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS ok", (self.nome,))
+            if cursor.fetchone()['ok'] == 1:
+                return True
+        except Exception as e:
+            print(f"Aviso: não foi possível verificar o lock {self.nome}: {e}")
+        self.release()
+        return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+class MonitorScheduler:
+    """Uma única thread dispara as execuções periódicas de todos os sites monitorados.
+
+    Os próximos disparos ficam num heap (instante, monitor, versão); a thread
+    dorme até o primeiro vencer ou até um monitor ser criado/alterado. Cada
+    monitor tem uma grade de horários (`next_run_at` + k * intervalo); o
+    disparo real acontece até `jitter_seconds` depois do horário, para não
+    bater todos os sites no mesmo segundo.
+
+    Horários perdidos (servidor parado, fila cheia, execução anterior ainda
+    rodando) seguem `missed_policy`: 'skip' pula para o próximo horário
+    futuro; 'catch_up' executa os atrasados em sequência, até `max_catch_up`.
+    Duas execuções do mesmo monitor nunca rodam ao mesmo tempo.
+
+    `dispatch(monitor)` enfileira a execução e retorna o session_id;
+    `is_active(session_id)` diz se ela ainda está na fila ou rodando.
+
+    Com vários processos, `start_when_leader` faz só o dono do LeaderLock
+    disparar. Os demais apenas gravam na tabela `monitors`; o líder relê a
+    tabela a cada `sync_interval` segundos.
+    """
+
+    def __init__(self, store, dispatch, is_active, max_catch_up=3, overlap_retry=30, sync_interval=10):
+        self.store = store
+        self.dispatch = dispatch
+        self.is_active = is_active
+        self.max_catch_up = max_catch_up
+        self.overlap_retry = overlap_retry # Segundos até tentar de novo um horário 'catch_up' bloqueado
+        self.sync_interval = sync_interval
+        self._lider = False
+        self._monitores = {}
+        self._versoes = {} # monitor_id -> versão do agendamento válido no heap
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stats = {'dispatched': 0, 'skipped_overlap': 0, 'skipped_missed': 0, 'caught_up': 0, 'dispatch_errors': 0}
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._assumir()
+            self._thread = threading.Thread(target=self._executar, name="MonitorScheduler", daemon=True)
+            self._thread.start()
+
+    def start_when_leader(self, lock, retry=30):
+        # Tenta o lock a cada `retry` segundos; quem o obtém passa a disparar, quem o perde para
+        def vigiar():
+            while True:
+                lider = lock.acquire()
+                if lider and self._thread is None:
+                    print("[monitor] Este processo assumiu o agendamento dos monitores.")
+                    self.start()
+                elif lider != self._lider:
+                    with self._cond:
+                        if lider:
+                            self._assumir()
+                        else:
+                            print("[monitor] Este processo deixou de agendar os monitores.")
+                            self._lider = False
+                        self._cond.notify()
+                time.sleep(retry)
+        threading.Thread(target=vigiar, name="MonitorSchedulerLeader", daemon=True).start()
+
+    def add(self, dados):
+        dados = dict(dados)
+        dados.setdefault('next_run_at', time.time())
+        monitor_id = self.store.criar(dados)
+        with self._cond:
+            monitor = dict(dados, id=monitor_id, enabled=bool(dados.get('enabled', True)),
+                           last_run_at=None, last_session_id=None)
+            monitor.setdefault('parallel', 1)
+            monitor.setdefault('jitter_seconds', 0)
+            monitor.setdefault('missed_policy', 'skip')
+            self._monitores[monitor_id] = monitor
+            if self._lider and monitor['enabled']:
+                self._agendar(monitor, monitor['next_run_at'], time.time())
+            return self._publico(monitor)
+
+    def update(self, monitor_id, campos):
+        with self._cond:
+            monitor = self._monitores.get(monitor_id)
+            if monitor is None:
+                return None
+            self.store.atualizar(monitor_id, campos)
+            monitor.update(campos)
+            self._versoes[monitor_id] = self._versoes.get(monitor_id, 0) + 1 # Invalida o agendamento anterior
+            if self._lider and monitor['enabled']:
+                agora = time.time()
+                self._agendar(monitor, monitor['next_run_at'] or agora, agora)
+            return self._publico(monitor)
+
+    def remove(self, monitor_id):
+        with self._cond:
+            if self._monitores.pop(monitor_id, None) is None:
+                return False
+            self._versoes.pop(monitor_id, None)
+            self.store.remover(monitor_id)
+            return True
+
+    def get(self, monitor_id):
+        with self._cond:
+            if not self._lider:
+                self._sincronizar()
+            monitor = self._monitores.get(monitor_id)
+            return self._publico(monitor) if monitor else None
+
+    def list(self):
+        with self._cond:
+            if not self._lider:
+                self._sincronizar()
+            return [self._publico(m) for m in self._monitores.values()]
+
+    def stats(self):
+        with self._cond:
+            dados = dict(self._stats)
+            dados['monitors'] = len(self._monitores)
+            dados['scheduled'] = sum(1 for m in self._monitores.values() if m['enabled'])
+            dados['leader'] = self._lider
+        return dados
+
+    def _publico(self, monitor):
+        dados = {k: v for k, v in monitor.items() if not k.startswith('_')}
+        dados['running'] = bool(monitor.get('last_session_id')) and self.is_active(monitor['last_session_id'])
+        dados['next_fire_at'] = monitor.get('_disparo')
+        return dados
+
+    def _assumir(self):
+        # Chamado com o lock ao virar líder: recarrega a tabela e reagenda todos os monitores
+        self._lider = True
+        self._heap = []
+        self._monitores = {}
+        agora = time.time()
+        for monitor in self.store.listar():
+            self._monitores[monitor['id']] = monitor
+            if monitor['enabled']:
+                self._agendar(monitor, monitor['next_run_at'] or agora, agora)
+
+    def _sincronizar(self):
+        # Chamado com o lock: alinha a memória com a tabela, que outros processos também alteram
+        try:
+            linhas = {monitor['id']: monitor for monitor in self.store.listar()}
+        except Exception as e:
+            print(f"Aviso: não foi possível recarregar os monitores: {e}")
+            return
+        agora = time.time()
+        for monitor_id in [i for i in self._monitores if i not in linhas]:
+            del self._monitores[monitor_id]
+            self._versoes.pop(monitor_id, None)
+        for monitor_id, linha in linhas.items():
+            monitor = self._monitores.get(monitor_id)
+            if monitor is None:
+                self._monitores[monitor_id] = linha
+                if self._lider and linha['enabled']:
+                    self._agendar(linha, linha['next_run_at'] or agora, agora)
+            elif not self._lider:
+                monitor.update(linha) # Horários e última sessão vêm do líder
+            else:
+                alterados = {campo: linha[campo] for campo in CAMPOS_EDITAVEIS if linha[campo] != monitor.get(campo)}
+                if alterados:
+                    monitor.update(alterados)
+                    self._versoes[monitor_id] = self._versoes.get(monitor_id, 0) + 1
+                    if monitor['enabled']:
+                        self._agendar(monitor, monitor['next_run_at'] or agora, agora)
+
+    def _agendar(self, monitor, horario, agora):
+        # Chamado com o lock. `horario` é o ponto da grade; o disparo recebe o jitter por cima
+        versao = self._versoes.get(monitor['id'], 0) + 1
+        self._versoes[monitor['id']] = versao
+        disparo = max(horario, agora) + random.uniform(0, monitor.get('jitter_seconds') or 0)
+        monitor['next_run_at'] = horario
+        monitor['_disparo'] = disparo
+        heapq.heappush(self._heap, (disparo, monitor['id'], versao))
+        self._cond.notify()
+
+    def _proximo_horario(self, monitor, horario, agora):
+        # Próximo ponto da grade depois de `horario`, aplicando a política para os que já passaram
+        intervalo = max(1, monitor['interval_seconds'])
+        proximo = horario + intervalo
+        atrasados = int((agora - proximo) // intervalo) + 1 if proximo <= agora else 0
+        if not atrasados:
+            return proximo
+        if monitor['missed_policy'] == 'catch_up' and atrasados <= self.max_catch_up:
+            self._stats['caught_up'] += 1
+            return proximo
+        # Descarta os horários perdidos (todos em 'skip'; os além do limite em 'catch_up')
+        manter = self.max_catch_up if monitor['missed_policy'] == 'catch_up' else 0
+        self._stats['skipped_missed'] += atrasados - manter
+        return proximo + (atrasados - manter) * intervalo
+
+    def _executar(self):
+        proxima_sync = time.monotonic() + self.sync_interval
+        while True:
+            with self._cond:
+                while True:
+                    if time.monotonic() >= proxima_sync:
+                        if self._lider:
+                            self._sincronizar()
+                        proxima_sync = time.monotonic() + self.sync_interval
+                    # Descarta entradas de monitores removidos ou reagendados
+                    while self._heap and self._versoes.get(self._heap[0][1]) != self._heap[0][2]:
+                        heapq.heappop(self._heap)
+                    if self._lider and self._heap and self._heap[0][0] <= time.time():
+                        break
+                    espera = proxima_sync - time.monotonic()
+                    if self._lider and self._heap:
+                        espera = min(espera, self._heap[0][0] - time.time())
+                    self._cond.wait(max(0, espera))
+                _, monitor_id, _ = heapq.heappop(self._heap)
+                monitor = self._monitores[monitor_id]
+                horario = monitor['next_run_at']
+            self._disparar(monitor, horario)
+
+    def _disparar(self, monitor, horario):
+        agora = time.time()
+        anterior = monitor.get('last_session_id')
+        if anterior and self.is_active(anterior):
+            with self._cond:
+                self._stats['skipped_overlap'] += 1
+                if self._versoes.get(monitor['id']) is None:
+                    return
+                if monitor['missed_policy'] == 'catch_up':
+                    # Mantém o horário e tenta de novo quando a execução anterior tiver terminado
+                    self._agendar(monitor, horario, agora + self.overlap_retry)
+                else:
+                    self._agendar(monitor, self._proximo_horario(monitor, horario, agora), agora)
+            self._persistir(monitor, ('next_run_at',))
+            return
+        try:
+            session_id = self.dispatch(monitor)
+        except Exception as e:
+            # Ex.: fila cheia. O horário conta como perdido e segue a política do monitor
+            print(f"[monitor] Não foi possível disparar o monitor {monitor['id']} ({monitor['url']}): {e}")
+            with self._cond:
+                self._stats['dispatch_errors'] += 1
+                if self._versoes.get(monitor['id']) is not None:
+                    self._agendar(monitor, self._proximo_horario(monitor, horario, agora), agora)
+            self._persistir(monitor, ('next_run_at',))
+            return
+        with self._cond:
+            self._stats['dispatched'] += 1
+            monitor['last_session_id'] = session_id
+            monitor['last_run_at'] = agora
+            if self._versoes.get(monitor['id']) is not None: # Não foi removido enquanto disparava
+                self._agendar(monitor, self._proximo_horario(monitor, horario, agora), agora)
+        self._persistir(monitor, ('next_run_at', 'last_run_at', 'last_session_id'))
+
+    def _persistir(self, monitor, campos):
+        try:
+            self.store.atualizar(monitor['id'], {campo: monitor[campo] for campo in campos})
+        except Exception as e:
+            print(f"Aviso: não foi possível salvar o agendamento do monitor {monitor['id']}: {e}")
@@ -0,0 +1,50 @@
+# Métricas de carregamento medidas pelo próprio navegador (Navigation Timing, Paint Timing,
+# LCP e CLS), no lugar do tempo de parede do clique via WebDriver.
+
+# Colunas de logs_testeSite preenchidas por coletar_metricas (na mesma ordem)
+METRIC_COLUMNS = ('ttfb_ms', 'dom_content_loaded_ms', 'load_ms', 'first_paint_ms', 'fcp_ms', 'lcp_ms', 'cls')
+
+# Script assíncrono: os observers com buffered=true entregam as entradas já registradas
+# (LCP, layout-shift) numa tarefa seguinte, por isso a resposta sai num setTimeout.
+_COLETAR_METRICAS_JS = """
+const done = arguments[arguments.length - 1];
+const resultado = {time_origin: performance.timeOrigin};
+const nav = performance.getEntriesByType('navigation')[0];
+if (nav) {
+    resultado.ttfb_ms = nav.responseStart - nav.startTime;
+    resultado.dom_content_loaded_ms = nav.domContentLoadedEventEnd > 0 ? nav.domContentLoadedEventEnd - nav.startTime : null;
+    resultado.load_ms = nav.loadEventEnd > 0 ? nav.loadEventEnd - nav.startTime : null;
+}
+for (const p of performance.getEntriesByType('paint')) {
+    if (p.name === 'first-paint') resultado.first_paint_ms = p.startTime;
+    if (p.name === 'first-contentful-paint') resultado.fcp_ms = p.startTime;
+}
+const observadores = [];
+try {
+    const obs = new PerformanceObserver(lista => {
+        for (const e of lista.getEntries()) resultado.lcp_ms = e.renderTime || e.loadTime || e.startTime;
+    });
+    obs.observe({type: 'largest-contentful-paint', buffered: true});
+    observadores.push(obs);
+} catch (e) {}
+try {
+    resultado.cls = 0;
+    const obs = new PerformanceObserver(lista => {
+        for (const e of lista.getEntries()) if (!e.hadRecentInput) resultado.cls += e.value;
+    });
+    obs.observe({type: 'layout-shift', buffered: true});
+    observadores.push(obs);
+} catch (e) { resultado.cls = null; }
+setTimeout(() => { observadores.forEach(o => o.disconnect()); done(resultado); }, 50);
+"""
+
+
+def coletar_metricas(driver):
+    """Retorna um dict com METRIC_COLUMNS (ms, exceto `cls`) e `time_origin` do documento atual."""
+    bruto = driver.execute_async_script(_COLETAR_METRICAS_JS) or {}
+    metricas = {}
+    for coluna in METRIC_COLUMNS:
+        valor = bruto.get(coluna)
+        metricas[coluna] = round(valor, 4 if coluna == 'cls' else 1) if isinstance(valor, (int, float)) else None
+    metricas['time_origin'] = bruto.get('time_origin')
+    return metricas
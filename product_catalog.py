@@ -0,0 +1,131 @@
+import threading
+import time
+
+# Tenta os candidatos do locator na ordem recebida e devolve, numa única chamada,
+# href, título e disponibilidade de cada link de produto (sem um get_attribute por link).
+_DESCOBRIR_PRODUTOS_JS = """
+const candidatos = arguments[0];
+for (const [indice, by, valor] of candidatos) {
+    let links = [];
+    try {
+        if (by === 'css selector') {
+            links = Array.from(document.querySelectorAll(valor));
+        } else {
+            const r = document.evaluate(valor, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            for (let i = 0; i < r.snapshotLength; i++) links.push(r.snapshotItem(i));
+        }
+    } catch (e) { continue; }
+    if (!links.length) continue;
+    const vistos = new Set();
+    const produtos = [];
+    for (const a of links) {
+        if (!a.href || vistos.has(a.href)) continue;
+        vistos.add(a.href);
+        const card = a.closest('[class*="product-summary-2-x-container"], article, li') || a;
+        const texto = (card.innerText || '').toLowerCase();
+        const indisponivel = !!card.querySelector('[class*="unavailable" i], [class*="outofstock" i], [class*="sold-out" i]')
+            || /indispon[ií]vel|esgotado|sold out|out of stock/.test(texto);
+        produtos.push({url: a.href, titulo: (a.getAttribute('title') || a.innerText || '').trim(), disponivel: !indisponivel});
+    }
+    return {indice: indice, produtos: produtos};
+}
+return {indice: null, produtos: []};
+"""
+
+
+def descobrir_produtos(driver, locators, nome='links_slider'):
+    """Lista os produtos da página atual com um único execute_script.
+
+    `locators` é um locators.LocatorsDoSite: os candidatos são tentados na
+    ordem aprendida para o site e o tempo da busca é registrado no candidato
+    que encontrou os links.
+    """
+    ordem = locators.candidatos(nome)
+    inicio = time.perf_counter()
+    resultado = driver.execute_script(_DESCOBRIR_PRODUTOS_JS, [[i, by, valor] for i, (by, valor) in ordem]) or {}
+    tempo = time.perf_counter() - inicio
+    indice = resultado.get('indice')
+    locators.registrar(nome, indice if indice is not None else ordem[-1][0], tempo, indice is not None)
+    return resultado.get('produtos') or []
+
+
+class ProductCatalog:
+    """Catálogo de produtos por site, reaproveitado entre execuções até expirar.
+
+    Guarda os produtos descobertos na home e, para cada um, quando foi
+    visitado por último e se ficou indisponível (botão "Comprar" ausente).
+    `escolher` devolve os disponíveis, começando pelos visitados há mais tempo,
+    para que execuções seguidas percorram produtos diferentes.
+    """
+
+    def __init__(self, ttl=1800):
+        self.ttl = ttl
+        self._sites = {} # site -> {'atualizado_em', 'produtos', 'visitas', 'indisponiveis', 'indisponiveis_desde'}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'marked_unavailable': 0}
+
+    def _entrada(self, site):
+        entrada = self._sites.get(site)
+        if entrada and time.time() - entrada['atualizado_em'] > self.ttl:
+            del self._sites[site]
+            entrada = None
+        return entrada
+
+    def atualizar(self, site, produtos):
+        with self._lock:
+            agora = time.time()
+            anterior = self._entrada(site) or {}
+            # Indisponibilidade vista na página do produto vale por `ttl` a partir da primeira marcação,
+            # mesmo que o catálogo seja relido antes disso; depois os produtos são tentados de novo
+            desde = anterior.get('indisponiveis_desde', agora)
+            manter = agora - desde <= self.ttl
+            self._sites[site] = {
+                'atualizado_em': agora,
+                'produtos': [p for p in produtos if p.get('url')],
+                'visitas': anterior.get('visitas', {}),
+                'indisponiveis': anterior.get('indisponiveis', set()) if manter else set(),
+                'indisponiveis_desde': desde if manter else agora,
+            }
+            self._stats['refreshes'] += 1
+
+    def escolher(self, site):
+        """URLs disponíveis em ordem de preferência, ou None se o catálogo expirou ou não tem nenhuma.
+
+        A lista pode ter menos produtos do que o cenário pede (slider pequeno, produtos
+        indisponíveis): quem chama usa o que houver em vez de reler a home a cada execução.
+        """
+        with self._lock:
+            entrada = self._entrada(site)
+            if entrada:
+                candidatos = [p['url'] for p in entrada['produtos']
+                              if p.get('disponivel', True) and p['url'] not in entrada['indisponiveis']]
+                if candidatos:
+                    self._stats['hits'] += 1
+                    candidatos.sort(key=lambda url: entrada['visitas'].get(url, 0)) # Estável: mantém a ordem da home no empate
+                    return candidatos
+            self._stats['misses'] += 1
+            return None
+
+    def marcar_visitado(self, site, url):
+        with self._lock:
+            entrada = self._entrada(site)
+            if entrada:
+                entrada['visitas'][url] = time.time()
+
+    def marcar_indisponivel(self, site, url):
+        with self._lock:
+            entrada = self._entrada(site)
+            if entrada and url not in entrada['indisponiveis']:
+                if not entrada['indisponiveis']:
+                    entrada['indisponiveis_desde'] = time.time()
+                entrada['indisponiveis'].add(url)
+                self._stats['marked_unavailable'] += 1
+
+    def stats(self):
+        with self._lock:
+            dados = dict(self._stats)
+            dados['sites'] = {site: {'products': len(e['produtos']), 'unavailable': len(e['indisponiveis']),
+                                     'age': round(time.time() - e['atualizado_em'], 1)}
+                              for site, e in self._sites.items()}
+            dados['ttl'] = self.ttl
+        return dados
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# Processo que executa os testes enfileirados por qualquer worker do gunicorn no modo compartilhado
+# (QA_SHARED_STATE). Rode quantos forem necessários, cada um com QA_MAX_WORKERS navegadores:
+#
+#     QA_SHARED_STATE=/var/lib/qa/estado.sqlite3 python qa_worker.py
+
+import web_analise_site as app
+
+
+def main():
+    if app.shared_state is None:
+        print("Defina QA_SHARED_STATE com o mesmo arquivo usado pela interface web.")
+        sys.exit(1)
+    app.driver_pool.prewarm(int(os.environ.get('QA_DRIVER_POOL_WARM', 1)))
+    print(f"[qa_worker] Processo {os.getpid()} executando testes com {app.MAX_WORKERS} navegador(es).")
+    app.job_queue.run_worker(app.executar_sessao, threads=app.MAX_WORKERS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import tracing
+
+# Modo enxuto: o DevTools (Network.setBlockedURLs) bloqueia imagens, fontes, vídeos e
+# rastreadores de terceiros, que não interferem no fluxo de compra. Serve para checagens
+# funcionais rápidas; as medições de tempo valem só nas execuções completas.
+#
+# O tráfego de cada navegador vem do log de performance do ChromeDriver (capability
+# goog:loggingPrefs, ver CAPABILITY_LOG, que também liga o log do console lido pelos artefatos
+# de falha em failure_artifacts.py): requisições bloqueadas aparecem como
+# Network.loadingFailed com blockedReason, e os bytes economizados são estimados pelo
+# tamanho que a mesma URL teve numa execução completa anterior.
+
+CAPABILITY_LOG = ('goog:loggingPrefs', {'performance': 'ALL', 'browser': 'ALL'})
+
+# O setBlockedURLs só filtra por URL (curinga `*`), então o tipo é aproximado pela extensão
+EXTENSOES_POR_TIPO = {
+    'image': ('png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'),
+    'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+    'media': ('mp4', 'webm', 'ogg', 'ogv', 'mp3', 'm4a', 'm3u8', 'mov'),
+}
+
+DOMINIOS_PADRAO = ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+                   'facebook.net', 'hotjar.com', 'clarity.ms', 'criteo.com', 'criteo.net', 'tiktok.com',
+                   'youtube.com', 'ytimg.com')
+
+
+def _lista_env(nome, padrao):
+    valor = os.environ.get(nome)
+    if valor is None:
+        return tuple(padrao)
+    return tuple(item.strip() for item in valor.split(',') if item.strip())
+
+
+TIPOS_BLOQUEADOS = _lista_env('QA_LEAN_BLOCK_TYPES', EXTENSOES_POR_TIPO)
+DOMINIOS_BLOQUEADOS = _lista_env('QA_LEAN_BLOCK_DOMAINS', DOMINIOS_PADRAO)
+
+
+def padroes_bloqueio(tipos=TIPOS_BLOQUEADOS, dominios=DOMINIOS_BLOQUEADOS):
+    """Padrões de URL do setBlockedURLs para os tipos de recurso e domínios informados.
+
+    Um domínio bloqueia também os subdomínios; entradas com `*` são usadas como estão.
+    """
+    padroes = []
+    for tipo in tipos:
+        if tipo not in EXTENSOES_POR_TIPO:
+            raise ValueError(f"Tipo de recurso desconhecido: {tipo} (use {', '.join(EXTENSOES_POR_TIPO)})")
+        for extensao in EXTENSOES_POR_TIPO[tipo]:
+            padroes += [f'*.{extensao}', f'*.{extensao}?*']
+    for dominio in dominios:
+        padroes += [dominio] if '*' in dominio else [f'*://{dominio}/*', f'*://*.{dominio}/*']
+    return padroes
+
+
+def _ler_log(driver):
+    # Sem a capability CAPABILITY_LOG o ChromeDriver não tem o log "performance"
+    try:
+        return driver.get_log('performance')
+    except Exception:
+        return []
+
+
+def preparar(driver, padroes=()):
+    """Descarta o tráfego do empréstimo anterior e bloqueia `padroes` (vazio: navegação completa)."""
+    _ler_log(driver)
+    if padroes:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(padroes)})
+
+
+class TamanhosConhecidos:
+    """Bytes transferidos por URL (sem query) nas execuções completas, limitado a `max_itens` (LRU)."""
+
+    def __init__(self, max_itens=5000):
+        self.max_itens = max_itens
+        self._tamanhos = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(url):
+        partes = urlsplit(url)
+        return f"{partes.scheme}://{partes.netloc}{partes.path}"
+
+    def registrar(self, url, tamanho):
+        chave = self._chave(url)
+        with self._lock:
+            self._tamanhos[chave] = tamanho
+            self._tamanhos.move_to_end(chave)
+            while len(self._tamanhos) > self.max_itens:
+                self._tamanhos.popitem(last=False)
+
+    def obter(self, url):
+        with self._lock:
+            return self._tamanhos.get(self._chave(url))
+
+
+tamanhos_conhecidos = TamanhosConhecidos()
+
+
+class EconomiaRede:
+    """Tráfego de uma execução, somando todos os navegadores usados: requisições carregadas,
+    bloqueadas e bytes economizados (estimados por TamanhosConhecidos)."""
+
+    def __init__(self, tamanhos=None):
+        self.tamanhos = tamanhos or tamanhos_conhecidos
+        self.carregadas = 0
+        self.bytes_carregados = 0
+        self.bloqueadas = {} # tipo -> quantidade
+        self.bytes_economizados = 0
+        self.sem_tamanho = 0 # Bloqueadas que nunca foram vistas numa execução completa
+        self._lock = threading.Lock()
+
+    def coletar(self, driver):
+        """Lê (e esvazia) o log de performance do navegador; chame antes de devolvê-lo ao pool."""
+        requisicoes = {} # requestId -> (url, tipo)
+        carregadas, bytes_carregados, bloqueadas, economizados, sem_tamanho = 0, 0, {}, 0, 0
+        for entrada in _ler_log(driver):
+            try:
+                mensagem = json.loads(entrada['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            metodo, params = mensagem.get('method'), mensagem.get('params', {})
+            if metodo == 'Network.requestWillBeSent':
+                requisicoes[params.get('requestId')] = (params['request']['url'], (params.get('type') or 'other').lower())
+            elif metodo == 'Network.loadingFinished':
+                url, _ = requisicoes.get(params.get('requestId'), (None, None))
+                tamanho = int(params.get('encodedDataLength') or 0)
+                carregadas += 1
+                bytes_carregados += tamanho
+                if url and url.startswith('http') and tamanho:
+                    self.tamanhos.registrar(url, tamanho)
+            elif metodo == 'Network.loadingFailed' and params.get('blockedReason'):
+                url, tipo = requisicoes.get(params.get('requestId'), (None, None))
+                tipo = (params.get('type') or tipo or 'other').lower()
+                bloqueadas[tipo] = bloqueadas.get(tipo, 0) + 1
+                tamanho = self.tamanhos.obter(url) if url else None
+                if tamanho is None:
+                    sem_tamanho += 1
+                else:
+                    economizados += tamanho
+
+        for tipo, quantidade in bloqueadas.items():
+            tracing.registry.incrementar('qa_lean_blocked_requests_total', quantidade,
+                                         "Requisições bloqueadas pelo modo enxuto", type=tipo)
+        if economizados:
+            tracing.registry.incrementar('qa_lean_saved_bytes_total', economizados,
+                                         "Bytes economizados pelo modo enxuto (estimativa)")
+        with self._lock:
+            self.carregadas += carregadas
+            self.bytes_carregados += bytes_carregados
+            for tipo, quantidade in bloqueadas.items():
+                self.bloqueadas[tipo] = self.bloqueadas.get(tipo, 0) + quantidade
+            self.bytes_economizados += economizados
+            self.sem_tamanho += sem_tamanho
+
+    def resumo(self):
+        with self._lock:
+            return {
+                'loaded_requests': self.carregadas,
+                'loaded_bytes': self.bytes_carregados,
+                'blocked_requests': sum(self.bloqueadas.values()),
+                'blocked_by_type': dict(sorted(self.bloqueadas.items(), key=lambda item: -item[1])),
+                'saved_bytes': self.bytes_economizados,
+                'saved_bytes_unknown': self.sem_tamanho,
+            }
+
+    def descrever(self):
+        resumo = self.resumo()
+        tipos = ", ".join(f"{tipo} {quantidade}" for tipo, quantidade in resumo['blocked_by_type'].items())
+        texto = (f"{resumo['blocked_requests']} requisições bloqueadas" + (f" ({tipos})" if tipos else "")
+                 + f", ~{resumo['saved_bytes'] / 1024:.0f} KB economizados")
+        if resumo['saved_bytes_unknown']:
+            texto += f" ({resumo['saved_bytes_unknown']} sem tamanho conhecido)"
+        return texto + f"; {resumo['loaded_requests']} carregadas ({resumo['loaded_bytes'] / 1024:.0f} KB)."
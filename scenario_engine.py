@@ -0,0 +1,625 @@
+import json
+import os
+import string
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+import tracing
+from http_probe import pool_compartilhado as http_pool
+from locators import CSS, TAG_NAME, XPATH, registry as locator_registry
+from product_catalog import descobrir_produtos
+from session_watchdog import SessaoCancelada
+from waits import WaitEngine
+
+# Fluxos de teste declarados em arquivos JSON/YAML (diretório scenarios/), executados pelas duas
+# interfaces. Cada arquivo é compilado uma vez (campos validados, locators registrados, ações e
+# esperas resolvidas) e a forma compilada fica em cache até o arquivo ser alterado.
+
+DIR_CENARIOS = os.environ.get('QA_SCENARIOS_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios'))
+EXTENSOES = ('.json', '.yaml', '.yml')
+
+CAMPOS_CENARIO = {'mode', 'name', 'description', 'start_message', 'locators', 'steps'}
+CAMPOS_PASSO = {'name', 'action', 'locator', 'url', 'wait_for', 'wait_after', 'timeout', 'retries', 'retry_delay',
+                'optional', 'metrics', 'progress', 'progress_message', 'message', 'missing_message',
+                'failure_message', 'assert', 'parallel', 'browser', 'quantity', 'require', 'empty_message'}
+# Campos que podem aparecer nas mensagens, ex.: "Produto acessado em {time:.2f}s."
+VARIAVEIS_MENSAGEM = {'step', 'time', 'error', 'locator', 'url', 'ttfb_detail', 'products'}
+
+BY_LOCATOR = {'css': CSS, CSS: CSS, 'xpath': XPATH}
+
+# Esperas antes da ação (até o elemento do `locator` ficar assim) e depois dela
+ESPERAS_ANTES = ('present', 'visible', 'clickable')
+ESPERAS_DEPOIS = {
+    'document_ready': lambda waits, alvo: waits.document_ready(),
+    'network_idle': lambda waits, alvo: waits.network_idle(),
+    'page_loaded': lambda waits, alvo: waits.page_loaded(),
+    'cart_drawer': lambda waits, alvo: waits.cart_drawer_visible(),
+    'element_gone': lambda waits, alvo: waits.element_gone(alvo),
+}
+
+
+class CenarioInvalido(ValueError):
+    pass
+
+
+class FalhaPasso(Exception):
+    """O passo executou, mas não teve o efeito esperado (clique recusado, verificação não satisfeita)."""
+
+
+class PararCenario(Exception):
+    """Encerra o cenário; quem a lança já registrou o motivo."""
+
+
+# func(execucao, passo, driver, waits, elemento) -> (tempo ou None, alvo das esperas/verificações)
+Acao = namedtuple('Acao', 'func navegador localizador autorregistro')
+ACOES = {}
+
+
+def acao(nome, navegador=True, localizador=False, autorregistro=False):
+    def registrar(func):
+        ACOES[nome] = Acao(func, navegador, localizador, autorregistro)
+        return func
+    return registrar
+
+
+def clicar(driver, elemento):
+    """Clique nativo com fallback para clique via JavaScript; retorna o tempo do clique que funcionou."""
+    inicio = time.time()
+    try:
+        elemento.click()
+    except Exception as erro:
+        inicio = time.time()
+        try:
+            driver.execute_script("arguments[0].click();", elemento)
+        except Exception as erro_js:
+            raise FalhaPasso(f"{erro} | Erro ao tentar clique JS: {erro_js}")
+    return time.time() - inicio
+
+
+@acao('open')
+def _abrir(execucao, passo, driver, waits, elemento):
+    url = urljoin(execucao.ctx.url, passo.url) if passo.url else execucao.ctx.url
+    inicio = time.time()
+    driver.get(url)
+    return time.time() - inicio, None
+
+
+@acao('click', localizador=True)
+def _clicar(execucao, passo, driver, waits, elemento):
+    return clicar(driver, elemento), elemento
+
+
+@acao('js_click', localizador=True)
+def _clicar_js(execucao, passo, driver, waits, elemento):
+    # Para elementos cobertos por outros (ex.: banner de cookies): sem tempo de resposta
+    driver.execute_script("arguments[0].click();", elemento)
+    return None, elemento
+
+
+@acao('scroll_to', localizador=True)
+def _rolar(execucao, passo, driver, waits, elemento):
+    driver.execute_script("arguments[0].scrollIntoView();", elemento)
+    return None, elemento
+
+
+@acao('wait')
+def _esperar(execucao, passo, driver, waits, elemento):
+    return None, elemento
+
+
+@acao('assert')
+def _verificar(execucao, passo, driver, waits, elemento):
+    return None, elemento
+
+
+@acao('http_get', navegador=False)
+def _http_get(execucao, passo, driver, waits, elemento):
+    resposta = http_pool.request('GET', urljoin(execucao.ctx.url, passo.url or ''))
+    if resposta.status >= 400:
+        raise FalhaPasso(f"HTTP {resposta.status} em {resposta.url}")
+    return resposta.tempo, resposta
+
+
+@acao('add_products', autorregistro=True)
+def _adicionar_produtos(execucao, passo, driver, waits, elemento):
+    adicionados = None
+    if execucao.ctx.paralelo > 1 and execucao.ctx.navegador_extra:
+        adicionados = execucao.adicionar_produtos_em_paralelo(passo.quantidade)
+    if adicionados is None: # Modo sequencial ou poucos produtos para paralelizar
+        adicionados = execucao.adicionar_produtos_sequencial(passo.quantidade)
+    execucao.variaveis['products'] = adicionados
+    if adicionados < passo.exigir:
+        execucao.ctx.registrar(execucao.cenario.nome, "aviso", None, execucao.formatar(passo.msg_vazio, passo))
+        raise PararCenario()
+    return None, None
+
+
+def _texto_pagina(driver, alvo):
+    return alvo.texto if hasattr(alvo, 'texto') else driver.find_element(TAG_NAME, 'body').text
+
+
+# Verificações do campo `assert`: tipo -> (função(ctx, driver, alvo, valor) -> bool, exige navegador)
+VERIFICACOES = {
+    'url_contains': (lambda ctx, driver, alvo, valor: valor in driver.current_url, True),
+    'title_contains': (lambda ctx, driver, alvo, valor: valor in driver.title, True),
+    'text_contains': (lambda ctx, driver, alvo, valor: valor in _texto_pagina(driver, alvo), False),
+    'element': (lambda ctx, driver, alvo, valor: ctx.locators.registro.buscar(ctx.locators.site, driver, valor) is not None, True),
+    'element_absent': (lambda ctx, driver, alvo, valor: ctx.locators.registro.buscar(ctx.locators.site, driver, valor) is None, True),
+    'status_below': (lambda ctx, driver, alvo, valor: alvo.status < valor, False),
+}
+
+
+class Passo:
+    """Passo compilado: campos validados, ação e esperas resolvidas, mensagens com padrão."""
+
+    def __init__(self, dados, acao):
+        self.nome = dados['name']
+        self.acao = acao
+        self.locator = dados.get('locator')
+        self.url = dados.get('url')
+        self.esperar_por = dados.get('wait_for')
+        esperas = dados.get('wait_after') or []
+        self.esperas_depois = [esperas] if isinstance(esperas, str) else list(esperas)
+        self.timeout = dados.get('timeout')
+        self.tentativas = int(dados.get('retries', 0))
+        self.intervalo_tentativas = float(dados.get('retry_delay', 1.0))
+        self.opcional = bool(dados.get('optional', False))
+        self.metricas = bool(dados.get('metrics', False))
+        self.progresso = dados.get('progress')
+        self.msg_progresso = dados.get('progress_message') or f"{self.nome}..."
+        self.mede_tempo = acao.func in (_abrir, _clicar, _http_get) # Ações com tempo de resposta próprio
+        self.msg_sucesso = dados.get('message') or ("{step} em {time:.2f}s." if self.mede_tempo else "{step}: concluído.")
+        self.msg_ausente = dados.get('missing_message') or "Erro: elemento '{locator}' não encontrado em '{step}'."
+        self.msg_falha = dados.get('failure_message') or "Erro em '{step}': {error}"
+        self.verificacoes = [(tipo, valor) for item in dados.get('assert', []) for tipo, valor in item.items()]
+        self.paralelo = bool(dados.get('parallel', False))
+        self.extra = dados.get('browser') == 'extra' # Roda num navegador extra (com o carrinho copiado)
+        self.quantidade = int(dados.get('quantity', 10))
+        self.exigir = int(dados.get('require', 1))
+        self.msg_vazio = dados.get('empty_message') or "Nenhum produto foi adicionado ao carrinho."
+
+
+class Cenario:
+    def __init__(self, modo, nome, descricao, mensagem_inicio, lotes, origem):
+        self.modo = modo
+        self.nome = nome
+        self.descricao = descricao
+        self.mensagem_inicio = mensagem_inicio
+        self.lotes = lotes # Listas de passos; os de um mesmo lote rodam ao mesmo tempo
+        self.origem = origem
+
+    @property
+    def passos(self):
+        return [passo for lote in self.lotes for passo in lote]
+
+
+def _validar_mensagem(texto, onde):
+    try:
+        campos = {campo for _, campo, _, _ in string.Formatter().parse(texto) if campo}
+    except ValueError as e:
+        raise CenarioInvalido(f"{onde}: mensagem inválida ({e}).")
+    desconhecidos = campos - VARIAVEIS_MENSAGEM
+    if desconhecidos:
+        raise CenarioInvalido(f"{onde}: campos desconhecidos na mensagem: {', '.join(sorted(desconhecidos))} "
+                              f"(use {', '.join(sorted(VARIAVEIS_MENSAGEM))}).")
+
+
+def compilar(dados, origem='<cenário>'):
+    """Valida o cenário e devolve a forma compilada; erros viram CenarioInvalido."""
+    if not isinstance(dados, dict) or not dados.get('steps'):
+        raise CenarioInvalido(f"{origem}: o cenário precisa de uma lista `steps`.")
+    desconhecidos = set(dados) - CAMPOS_CENARIO
+    if desconhecidos:
+        raise CenarioInvalido(f"{origem}: campos desconhecidos: {', '.join(sorted(desconhecidos))}.")
+
+    # Locators próprios do cenário entram no registro do processo (e no aprendizado por site)
+    for nome, candidatos in (dados.get('locators') or {}).items():
+        try:
+            locator_registry.adicionar(nome, [(BY_LOCATOR[by], valor) for by, valor in candidatos])
+        except (KeyError, TypeError, ValueError):
+            raise CenarioInvalido(f"{origem}: locator '{nome}' deve ser uma lista de [\"css\"|\"xpath\", seletor].")
+
+    lotes = []
+    for posicao, dados_passo in enumerate(dados['steps'], 1):
+        onde = f"{origem}, passo {posicao}"
+        if not isinstance(dados_passo, dict) or not dados_passo.get('name') or not dados_passo.get('action'):
+            raise CenarioInvalido(f"{onde}: todo passo precisa de `name` e `action`.")
+        desconhecidos = set(dados_passo) - CAMPOS_PASSO
+        if desconhecidos:
+            raise CenarioInvalido(f"{onde}: campos desconhecidos: {', '.join(sorted(desconhecidos))}.")
+        acao_passo = ACOES.get(dados_passo['action'])
+        if acao_passo is None:
+            raise CenarioInvalido(f"{onde}: ação desconhecida '{dados_passo['action']}' (use {', '.join(sorted(ACOES))}).")
+        try:
+            passo = Passo(dados_passo, acao_passo)
+        except (AttributeError, TypeError, ValueError) as e:
+            raise CenarioInvalido(f"{onde}: valor inválido ({e}).")
+
+        if acao_passo.localizador and not passo.locator:
+            raise CenarioInvalido(f"{onde}: a ação '{dados_passo['action']}' precisa de `locator`.")
+        if passo.locator and passo.locator not in locator_registry.locators:
+            raise CenarioInvalido(f"{onde}: locator desconhecido '{passo.locator}'.")
+        if passo.esperar_por is not None and passo.esperar_por not in ESPERAS_ANTES:
+            raise CenarioInvalido(f"{onde}: wait_for deve ser um de {', '.join(ESPERAS_ANTES)}.")
+        for espera in passo.esperas_depois:
+            if espera not in ESPERAS_DEPOIS:
+                raise CenarioInvalido(f"{onde}: wait_after '{espera}' desconhecido (use {', '.join(ESPERAS_DEPOIS)}).")
+        for tipo, valor in passo.verificacoes:
+            if tipo not in VERIFICACOES:
+                raise CenarioInvalido(f"{onde}: verificação desconhecida '{tipo}' (use {', '.join(VERIFICACOES)}).")
+            if VERIFICACOES[tipo][1] and not acao_passo.navegador:
+                raise CenarioInvalido(f"{onde}: a verificação '{tipo}' precisa de navegador.")
+            if tipo in ('element', 'element_absent') and valor not in locator_registry.locators:
+                raise CenarioInvalido(f"{onde}: locator desconhecido '{valor}'.")
+        if not acao_passo.navegador and (passo.esperar_por or passo.esperas_depois or passo.metricas):
+            raise CenarioInvalido(f"{onde}: a ação '{dados_passo['action']}' não usa navegador (sem esperas nem métricas).")
+        # Só rodam ao mesmo tempo passos que não disputam o navegador principal
+        if passo.paralelo and acao_passo.navegador and not passo.extra:
+            raise CenarioInvalido(f"{onde}: passos `parallel` com navegador precisam de \"browser\": \"extra\".")
+        if passo.extra and (acao_passo.autorregistro or not acao_passo.navegador):
+            raise CenarioInvalido(f"{onde}: a ação '{dados_passo['action']}' não roda em navegador extra.")
+        for mensagem in (passo.msg_progresso, passo.msg_sucesso, passo.msg_ausente, passo.msg_falha, passo.msg_vazio):
+            _validar_mensagem(mensagem, onde)
+
+        # Passos `parallel` consecutivos formam um lote executado ao mesmo tempo
+        if passo.paralelo and lotes and lotes[-1][0].paralelo:
+            lotes[-1].append(passo)
+        else:
+            lotes.append([passo])
+
+    nome = dados.get('name') or dados.get('mode') or os.path.splitext(os.path.basename(origem))[0]
+    return Cenario(dados.get('mode') or nome, nome, dados.get('description', ''), dados.get('start_message'), lotes, origem)
+
+
+def _ler(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        if caminho.endswith('.json'):
+            try:
+                return json.load(arquivo)
+            except ValueError as e:
+                raise CenarioInvalido(f"{caminho}: JSON inválido ({e}).")
+        try:
+            import yaml # Dependência opcional, só para cenários .yaml/.yml
+        except ImportError:
+            raise CenarioInvalido(f"{caminho}: instale o PyYAML para usar cenários YAML.")
+        try:
+            return yaml.safe_load(arquivo)
+        except yaml.YAMLError as e:
+            raise CenarioInvalido(f"{caminho}: YAML inválido ({e}).")
+
+
+_cache = {} # caminho -> (mtime, Cenario)
+_cache_lock = threading.Lock()
+
+
+def carregar(caminho):
+    """Cenário compilado do arquivo; recompila só quando o arquivo muda."""
+    caminho = os.path.abspath(caminho)
+    mtime = os.path.getmtime(caminho)
+    with _cache_lock:
+        em_cache = _cache.get(caminho)
+    if em_cache and em_cache[0] == mtime:
+        return em_cache[1]
+    cenario = compilar(_ler(caminho), caminho)
+    with _cache_lock:
+        _cache[caminho] = (mtime, cenario)
+    return cenario
+
+
+def cenarios(diretorio=None):
+    """Cenários válidos do diretório por modo, na ordem dos arquivos; os inválidos são avisados e ignorados."""
+    diretorio = diretorio or DIR_CENARIOS
+    encontrados = {}
+    for arquivo in sorted(os.listdir(diretorio)) if os.path.isdir(diretorio) else []:
+        if not arquivo.endswith(EXTENSOES):
+            continue
+        try:
+            cenario = carregar(os.path.join(diretorio, arquivo))
+        except (CenarioInvalido, OSError) as e:
+            print(f"[scenario_engine] Cenário ignorado: {e}")
+            continue
+        encontrados.setdefault(cenario.modo, cenario)
+    return encontrados
+
+
+def por_modo(modo, diretorio=None):
+    cenario = cenarios(diretorio).get(modo)
+    if cenario is None:
+        raise CenarioInvalido(f"Nenhum cenário para o modo '{modo}' em {diretorio or DIR_CENARIOS}.")
+    return cenario
+
+
+class Contexto:
+    """O que um cenário usa de quem o executa (o SiteQATester de cada interface).
+
+    `registrar(step, status, tempo, mensagem, metricas=None, wait_time=None)` recebe
+    o resultado de cada passo; `navegador_extra(cookies)`, se houver, é um context
+    manager que empresta um navegador com os cookies do principal (carrinho compartilhado).
+    Com `cancelamento` (session_watchdog.Cancelamento) a execução para entre os passos
+    e nas esperas, com SessaoCancelada.
+    """
+
+    def __init__(self, url, driver, waits, locators, registrar, progresso=None, metricas=None, catalogo=None,
+                 navegador_extra=None, max_extras=0, paralelo=1, wait_timeouts=None, cancelamento=None):
+        self.url = url
+        self.driver = driver
+        self.waits = waits
+        self.locators = locators
+        self.registrar = registrar
+        self.progresso = progresso or (lambda mensagem, percentual: None)
+        self.metricas = metricas
+        self.catalogo = catalogo
+        self.navegador_extra = navegador_extra
+        self.max_extras = max_extras
+        self.paralelo = paralelo
+        self.wait_timeouts = wait_timeouts
+        self.cancelamento = cancelamento
+
+
+class ExecucaoCenario:
+    def __init__(self, cenario, contexto):
+        self.cenario = cenario
+        self.ctx = contexto
+        self.variaveis = {'url': contexto.url, 'products': 0}
+
+    def executar(self):
+        cenario, ctx = self.cenario, self.ctx
+        ctx.progresso(f"Iniciando {cenario.nome.lower()}...", 0)
+        if cenario.mensagem_inicio:
+            ctx.registrar(cenario.nome, "iniciado", None, cenario.mensagem_inicio)
+        try:
+            for lote in cenario.lotes:
+                self._executar_lote(lote)
+        except PararCenario:
+            pass
+        except SessaoCancelada:
+            raise
+        except Exception as e:
+            ctx.registrar(cenario.nome, "falha", None, f"Erro no {cenario.nome.lower()}: {e}")
+        finally:
+            ctx.progresso(f"{cenario.nome.capitalize()} concluído.", 100)
+            ctx.registrar(cenario.nome, "concluido", None, f"{cenario.nome.capitalize()} concluído.")
+
+    def formatar(self, modelo, passo, **valores):
+        campos = dict(self.variaveis, step=passo.nome, locator=passo.locator or '', ttfb_detail='')
+        campos.update(valores)
+        try:
+            return modelo.format(**campos)
+        except (KeyError, ValueError, TypeError): # Ex.: {time:.2f} num passo sem tempo medido
+            return modelo
+
+    def _verificar_cancelamento(self):
+        # Entre os passos e nas falhas: o erro de um navegador encerrado pelo vigia é a própria parada
+        if self.ctx.cancelamento is not None:
+            self.ctx.cancelamento.verificar()
+
+    def _executar_lote(self, lote):
+        self._verificar_cancelamento()
+        if len(lote) == 1 and not lote[0].extra:
+            self._executar_passo(lote[0], self.ctx.driver, self.ctx.waits)
+            return
+        ctx = self.ctx
+        cookies = ctx.driver.get_cookies() if ctx.navegador_extra and any(p.extra for p in lote) else None
+        trace = tracing.trace_atual()
+
+        def rodar(passo):
+            with tracing.em_trace(trace): # Os spans das threads auxiliares contam para a mesma sessão
+                if not passo.acao.navegador:
+                    return self._executar_passo(passo, None, None)
+                with ctx.navegador_extra(cookies) as driver:
+                    return self._executar_passo(passo, driver, WaitEngine(driver, ctx.wait_timeouts,
+                                                                          cancelamento=ctx.cancelamento))
+
+        # Sem navegadores extras (ex.: interface desktop) esses passos rodam em sequência no principal
+        simultaneos = [p for p in lote if not p.acao.navegador or ctx.navegador_extra]
+        parar = False
+        if simultaneos:
+            with ThreadPoolExecutor(max_workers=len(simultaneos)) as executor:
+                for futuro in [executor.submit(rodar, passo) for passo in simultaneos]:
+                    try:
+                        futuro.result()
+                    except PararCenario:
+                        parar = True
+        for passo in lote:
+            if passo not in simultaneos:
+                try:
+                    self._executar_passo(passo, ctx.driver, ctx.waits)
+                except PararCenario:
+                    parar = True
+        if parar:
+            raise PararCenario()
+
+    def _executar_passo(self, passo, driver, waits):
+        ctx = self.ctx
+        if passo.progresso is not None:
+            ctx.progresso(self.formatar(passo.msg_progresso, passo), passo.progresso)
+        for tentativa in range(passo.tentativas + 1):
+            try:
+                tempo, metricas = self._tentar(passo, driver, waits)
+                break
+            except (PararCenario, SessaoCancelada):
+                raise
+            except Exception as e:
+                self._verificar_cancelamento()
+                if tentativa < passo.tentativas:
+                    time.sleep(passo.intervalo_tentativas)
+                    continue
+                ausente = isinstance(e, (NoSuchElementException, TimeoutException))
+                mensagem = self.formatar(passo.msg_ausente if ausente else passo.msg_falha, passo, error=e)
+                ctx.registrar(passo.nome, "aviso" if passo.opcional and ausente else "falha", None, mensagem,
+                              wait_time=waits.consumir() if waits else 0.0)
+                if not passo.opcional:
+                    raise PararCenario()
+                return
+        if passo.acao.autorregistro:
+            return
+        detalhe = ''
+        if metricas and metricas.get('ttfb_ms') is not None:
+            detalhe = f" (TTFB {metricas['ttfb_ms']:.0f} ms)"
+        mensagem = self.formatar(passo.msg_sucesso, passo, time=tempo, ttfb_detail=detalhe)
+        # Passos sem navegador não esperam: com None o log consumiria o acumulado do WaitEngine principal,
+        # que pertence a outro passo (e pode estar sendo usado por outra thread)
+        ctx.registrar(passo.nome, "sucesso", tempo, mensagem, metricas=metricas,
+                      wait_time=waits.consumir() if waits else 0.0)
+
+    def _tentar(self, passo, driver, waits):
+        elemento = self._localizar(passo, driver, waits) if passo.locator else None
+        tempo, alvo = passo.acao.func(self, passo, driver, waits, elemento)
+        for espera in passo.esperas_depois:
+            ESPERAS_DEPOIS[espera](waits, alvo)
+        for tipo, valor in passo.verificacoes:
+            if not VERIFICACOES[tipo][0](self.ctx, driver, alvo, valor):
+                raise FalhaPasso(f"verificação {tipo} = {valor!r} não satisfeita")
+        metricas = self.ctx.metricas(driver) if passo.metricas and self.ctx.metricas else None
+        return tempo, metricas
+
+    def _localizar(self, passo, driver, waits):
+        locators = self.ctx.locators
+        if passo.esperar_por is None:
+            return locators.find(driver, passo.locator)
+        condicao = {'present': locators.presente, 'visible': locators.visivel,
+                    'clickable': locators.clicavel}[passo.esperar_por](passo.locator)
+        return waits.until(condicao, timeout=passo.timeout)
+
+    # --- Ação add_products: produtos do catálogo do site, visitados direto pela URL ---
+
+    def _produtos_candidatos(self, quantidade):
+        # URLs disponíveis, dos visitados há mais tempo para os mais recentes. A home (já carregada)
+        # só é lida, num único execute_script, se o catálogo do site expirou ou ficou sem produtos disponíveis;
+        # com menos de `quantidade`, a execução usa os que houver.
+        catalogo, ctx = self.ctx.catalogo, self.ctx
+        urls = catalogo.escolher(ctx.url)
+        if urls is None:
+            catalogo.atualizar(ctx.url, descobrir_produtos(ctx.driver, ctx.locators))
+            urls = catalogo.escolher(ctx.url) or []
+        return urls
+
+    def _sondar_produto(self, driver, waits, indice, produto_url, quantidade):
+        # Abre a página do produto e clica em "Comprar", registrando os dois tempos
+        ctx = self.ctx
+        self._verificar_cancelamento()
+        step_acesso = f"Adicionar Produto {indice} de {quantidade}"
+        step_carrinho = f"Adicionar Produto {indice} ao Carrinho"
+        try:
+            inicio = time.time()
+            driver.get(produto_url)
+            tempo = time.time() - inicio
+            waits.page_loaded()
+            ctx.registrar(step_acesso, "sucesso", tempo, f"Produto {indice} acessado em {tempo:.2f}s.",
+                          metricas=ctx.metricas(driver) if ctx.metricas else None, wait_time=waits.consumir())
+        except Exception as e:
+            self._verificar_cancelamento()
+            ctx.registrar(step_acesso, "falha", None, f"Erro ao acessar produto {indice}: {e}", wait_time=waits.consumir())
+            return None
+        ctx.catalogo.marcar_visitado(ctx.url, produto_url)
+        try:
+            botao_comprar = waits.until(ctx.locators.clicavel('botao_comprar'))
+            tempo_comprar, erro_comprar = clicar(driver, botao_comprar), None
+        except TimeoutException:
+            tempo_comprar, erro_comprar = None, f"Timeout: Botão 'Comprar' não clicável na página do produto {produto_url}."
+        except Exception as e:
+            self._verificar_cancelamento()
+            tempo_comprar, erro_comprar = None, f"{e}"
+        if erro_comprar:
+            ctx.catalogo.marcar_indisponivel(ctx.url, produto_url) # Próximas execuções escolhem outro produto
+            ctx.registrar(step_carrinho, "falha", tempo_comprar,
+                          f"Erro ao clicar em 'Comprar' para adicionar ao carrinho: {erro_comprar}", wait_time=waits.consumir())
+            return None
+        ctx.registrar(step_carrinho, "sucesso", tempo_comprar, f"Produto {indice} adicionado ao carrinho em {tempo_comprar:.2f}s.",
+                      wait_time=waits.consumir())
+        waits.cart_drawer_visible()
+        return tempo + tempo_comprar
+
+    def adicionar_produtos_sequencial(self, quantidade):
+        # Visita os produtos um a um, no mesmo navegador, direto pelas URLs (sem voltar à home)
+        ctx = self.ctx
+        produtos_adicionados = 0
+        candidatos = self._produtos_candidatos(quantidade)
+        if not candidatos:
+            ctx.registrar(f"Adicionar Produto 1 de {quantidade}", "aviso", None, "Nenhum produto encontrado nos sliders da home.")
+            return 0
+
+        for produto_url in candidatos:
+            if produtos_adicionados >= quantidade:
+                break
+            ctx.progresso(f"Adicionando produto {produtos_adicionados + 1} de {quantidade}...", produtos_adicionados * 9)
+            if self._sondar_produto(ctx.driver, ctx.waits, produtos_adicionados + 1, produto_url, quantidade) is not None:
+                produtos_adicionados += 1
+                ctx.progresso(f"Produto {produtos_adicionados} adicionado ao carrinho.", produtos_adicionados * 9)
+
+        if produtos_adicionados < quantidade:
+            ctx.registrar(f"Adicionar Produto {produtos_adicionados + 1} de {quantidade}", "aviso", None,
+                          f"Não há mais produtos novos nos sliders da home ({produtos_adicionados} adicionados).")
+        return produtos_adicionados
+
+    def adicionar_produtos_em_paralelo(self, quantidade):
+        # O primeiro produto é adicionado no navegador principal para criar o carrinho; os do meio
+        # são distribuídos entre navegadores extras que compartilham esse carrinho; o último
+        # volta ao navegador principal, que fica com a gaveta do carrinho consolidado aberta.
+        ctx = self.ctx
+        step_name = "Sondagem Paralela"
+        produtos = self._produtos_candidatos(quantidade)[:quantidade]
+        if len(produtos) < 3:
+            ctx.registrar(step_name, "aviso", None, f"Apenas {len(produtos)} produtos encontrados; usando o modo sequencial.")
+            return None
+
+        inicio = time.time()
+        tempos = {}
+        lock = threading.Lock()
+
+        def registrar(indice, tempo):
+            with lock:
+                tempos[indice] = tempo
+                adicionados = sum(1 for t in tempos.values() if t is not None)
+            ctx.progresso(f"Produto {indice} processado.", adicionados * 9)
+
+        registrar(1, self._sondar_produto(ctx.driver, ctx.waits, 1, produtos[0], quantidade))
+        cookies = ctx.driver.get_cookies()
+
+        pendentes = list(enumerate(produtos[1:-1], start=2))
+        pendentes_lock = threading.Lock()
+        trace = tracing.trace_atual()
+
+        def sondar_pendentes():
+            with tracing.em_trace(trace): # Os spans dos navegadores extras contam para a mesma sessão
+                with ctx.navegador_extra(cookies) as driver:
+                    waits = WaitEngine(driver, ctx.wait_timeouts, cancelamento=ctx.cancelamento)
+                    while True:
+                        with pendentes_lock:
+                            if not pendentes:
+                                return
+                            indice, produto_url = pendentes.pop(0)
+                        registrar(indice, self._sondar_produto(driver, waits, indice, produto_url, quantidade))
+
+        navegadores = max(1, min(ctx.paralelo - 1, len(pendentes), ctx.max_extras))
+        with ThreadPoolExecutor(max_workers=navegadores) as executor:
+            for futuro in [executor.submit(sondar_pendentes) for _ in range(navegadores)]:
+                try:
+                    futuro.result()
+                except Exception as e:
+                    self._verificar_cancelamento()
+                    ctx.registrar(step_name, "aviso", None, f"Navegador da sondagem paralela falhou: {e}")
+
+        # O que sobrou (navegadores extras indisponíveis) roda no navegador principal
+        while pendentes:
+            indice, produto_url = pendentes.pop(0)
+            registrar(indice, self._sondar_produto(ctx.driver, ctx.waits, indice, produto_url, quantidade))
+        registrar(len(produtos), self._sondar_produto(ctx.driver, ctx.waits, len(produtos), produtos[-1], quantidade))
+
+        tempo_total = time.time() - inicio
+        soma = sum(t for t in tempos.values() if t is not None)
+        adicionados = sum(1 for t in tempos.values() if t is not None)
+        ctx.registrar(step_name, "sucesso", tempo_total,
+                      f"{adicionados} de {len(produtos)} produtos adicionados em {tempo_total:.2f}s com "
+                      f"{navegadores + 1} navegadores (soma dos tempos por produto: {soma:.2f}s).", wait_time=0.0)
+        return adicionados
+
+
+def executar(cenario, contexto):
+    ExecucaoCenario(cenario, contexto).executar()
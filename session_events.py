@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+
+
+class SessionEventLog:
+    """Log de eventos de uma sessão, somente de acréscimo, com números de sequência crescentes.
+
+    Cada evento recebe `seq` (1, 2, 3...). Os clientes guardam o último `seq`
+    recebido e pedem apenas o que veio depois, de modo que nem a leitura nem o
+    payload crescem com a duração da execução. Todos os streams de uma mesma
+    sessão esperam na mesma condição e reaproveitam o evento já serializado.
+    """
+
+    def __init__(self):
+        self._eventos = []
+        self._serializados = []
+        self._instantes = [] # time.perf_counter() de cada append, para medir a duração das etapas
+        self._fechado = False
+        self._cond = threading.Condition()
+
+    @property
+    def last_seq(self):
+        with self._cond:
+            return len(self._eventos)
+
+    @property
+    def closed(self):
+        with self._cond:
+            return self._fechado
+
+    def append(self, **campos):
+        with self._cond:
+            evento = dict(campos)
+            evento['seq'] = len(self._eventos) + 1
+            evento.setdefault('timestamp', time.strftime('%Y-%m-%d %H:%M:%S'))
+            self._eventos.append(evento)
+            self._serializados.append(None)
+            self._instantes.append(time.perf_counter())
+            self._cond.notify_all()
+            return evento['seq']
+
+    def close(self):
+        # Marca o fim da sessão e acorda quem estiver esperando por eventos
+        with self._cond:
+            self._fechado = True
+            self._cond.notify_all()
+
+    def instantes(self):
+        # (seq, perf_counter) de cada evento; não vai para os clientes, só para medições (benchmarks/)
+        with self._cond:
+            return list(enumerate(self._instantes, start=1))
+
+    def since(self, seq=0):
+        # Como seq == posição + 1, o recorte é direto, sem varrer a lista
+        with self._cond:
+            return list(self._eventos[max(seq, 0):])
+
+    def wait_for(self, seq=0, timeout=None):
+        """Bloqueia até existir evento com seq maior que `seq`, o log ser fechado ou o tempo acabar.
+
+        Retorna (lista de (seq, json do evento), fechado).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._eventos) > seq or self._fechado, timeout)
+            inicio = max(seq, 0)
+            for i in range(inicio, len(self._eventos)):
+                if self._serializados[i] is None:
+                    self._serializados[i] = json.dumps(self._eventos[i], default=str)
+            novos = [(i + 1, self._serializados[i]) for i in range(inicio, len(self._eventos))]
+            return novos, self._fechado
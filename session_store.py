@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Campos de cada etapa mantidos no resumo de uma sessão encerrada
+CAMPOS_RESUMO = ('seq', 'timestamp', 'step', 'status', 'response_time', 'wait_time', 'message', 'error_message')
+
+
+def resumir_sessao(dados, eventos, metric_columns=()):
+    """Resumo compacto de uma sessão encerrada: status, duração e as etapas finais.
+
+    Os eventos "em_progresso" são descartados e cada etapa guarda só os campos
+    de CAMPOS_RESUMO e as métricas preenchidas; o `seq` original é mantido para
+    que os clientes continuem a partir do último evento que já receberam.
+    """
+    etapas = []
+    for evento in eventos:
+        if evento.get('status') == 'em_progresso':
+            continue
+        etapa = {campo: evento.get(campo) for campo in CAMPOS_RESUMO}
+        etapa.update({coluna: evento[coluna] for coluna in metric_columns if evento.get(coluna) is not None})
+        etapas.append(etapa)
+    inicio, fim = dados.get('start_time'), dados.get('end_time')
+    return {
+        'status': dados.get('status', 'completed'),
+        'progress': dados.get('progress', 100),
+        'queued_at': dados.get('queued_at'),
+        'queue_wait': dados.get('queue_wait'),
+        'start_time': inicio,
+        'end_time': fim,
+        'duration': round(fim - inicio, 2) if inicio and fim else None,
+        'steps': etapas,
+        'finished': True,
+    }
+
+
+class SessionStore:
+    """Sessões de teste em memória, limitadas por quantidade (LRU) e por tempo (TTL).
+
+    Sessões na fila ou rodando nunca são removidas. Ao terminar, `finish`
+    troca o dict da sessão (com o tester e o log de eventos) pelo resumo de
+    `resumir_sessao`; resumos expiram `ttl` segundos depois do fim ou saem
+    pela ordem de uso quando há mais de `max_sessions`. Sessões que não estão
+    mais em memória são buscadas por `loader(session_id)`, se informado.
+    """
+
+    def __init__(self, max_sessions=500, ttl=3600, loader=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.loader = loader
+        self._sessoes = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'evicted_lru': 0, 'evicted_ttl': 0, 'loaded': 0, 'load_misses': 0}
+
+    def add(self, session_id, dados):
+        with self._lock:
+            self._sessoes[session_id] = dados
+            self._sessoes.move_to_end(session_id)
+            self._remover_excedentes()
+
+    def get(self, session_id):
+        with self._lock:
+            dados = self._sessoes.get(session_id)
+            if dados is not None:
+                if self._expirou(dados):
+                    del self._sessoes[session_id]
+                    self._stats['evicted_ttl'] += 1
+                    dados = None
+                else:
+                    self._sessoes.move_to_end(session_id)
+                    return dados
+        if self.loader is None:
+            return None
+        # Fora do lock: a leitura no banco não deve travar as outras sessões
+        dados = self.loader(session_id)
+        with self._lock:
+            if dados is None:
+                self._stats['load_misses'] += 1
+                return None
+            self._stats['loaded'] += 1
+            # Recarregada conta como recém-terminada para que os próximos polls não voltem ao banco
+            dados.setdefault('end_time', time.time())
+            dados['_expira_em'] = time.time() + self.ttl
+            self._sessoes[session_id] = dados
+            self._remover_excedentes()
+        return dados
+
+    def update(self, session_id, **campos):
+        # Atualiza campos de uma sessão em andamento (status, progresso, horários)
+        with self._lock:
+            dados = self._sessoes.get(session_id)
+            if dados is not None:
+                dados.update(campos)
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessoes.pop(session_id, None)
+
+    def finish(self, session_id, resumo):
+        with self._lock:
+            if session_id in self._sessoes:
+                resumo['_expira_em'] = time.time() + self.ttl
+                self._sessoes[session_id] = resumo
+                self._remover_excedentes()
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessoes
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessoes)
+
+    def stats(self):
+        with self._lock:
+            dados = dict(self._stats)
+            dados['sessions'] = len(self._sessoes)
+            dados['active'] = sum(1 for s in self._sessoes.values() if not s.get('finished'))
+            dados['max_sessions'] = self.max_sessions
+            dados['ttl'] = self.ttl
+        return dados
+
+    def _expirou(self, dados):
+        return dados.get('finished') and dados.get('_expira_em', float('inf')) <= time.time()
+
+    def _remover_excedentes(self):
+        # Chamado com o lock: expira os resumos vencidos e, acima do limite, os menos usados
+        for session_id in [sid for sid, dados in self._sessoes.items() if self._expirou(dados)]:
+            del self._sessoes[session_id]
+            self._stats['evicted_ttl'] += 1
+        excesso = len(self._sessoes) - self.max_sessions
+        if excesso <= 0:
+            return
+        for session_id in [sid for sid, dados in self._sessoes.items() if dados.get('finished')][:excesso]:
+            del self._sessoes[session_id]
+            self._stats['evicted_lru'] += 1
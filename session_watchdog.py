@@ -0,0 +1,221 @@
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+# Parada das execuções em andamento. O pedido (/stop ou tempo limite) marca o Cancelamento da
+# execução, que o teste consulta entre as etapas e a cada poll das esperas. Um navegador preso numa
+# chamada WebDriver (page load de 30 s, Chrome travado) não chega a consultar: passada a carência,
+# o vigia mata a árvore de processos do chromedriver e a chamada bloqueada falha na hora.
+
+LIMITE_SESSAO = int(os.environ.get('QA_SESSION_MAX_SECONDS', 900))
+CARENCIA = float(os.environ.get('QA_STOP_GRACE', 10))
+_SINAL_FIM = getattr(signal, 'SIGKILL', signal.SIGTERM) # No Windows só há TerminateProcess
+
+
+class SessaoCancelada(Exception):
+    """A execução foi interrompida (pedido de parada ou tempo limite); o motivo vai na mensagem."""
+
+
+class Cancelamento:
+    """Pedido de parada de uma execução e os navegadores que ela está usando."""
+
+    def __init__(self):
+        self.motivo = None
+        self._evento = threading.Event()
+        self._callbacks = []
+        self._navegadores = {} # id(driver) -> driver
+        self._lock = threading.Lock()
+
+    def cancelar(self, motivo):
+        """Marca a parada; retorna False se a execução já estava cancelada."""
+        with self._lock:
+            if self._evento.is_set():
+                return False
+            self.motivo = motivo
+            self._evento.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+        return True
+
+    def cancelado(self):
+        return self._evento.is_set()
+
+    def verificar(self):
+        if self._evento.is_set():
+            raise SessaoCancelada(self.motivo)
+
+    def ao_cancelar(self, callback):
+        # Para quem espera por conta própria (ex.: TesteCarga.parar)
+        with self._lock:
+            self._callbacks.append(callback)
+            ja_cancelado = self._evento.is_set()
+        if ja_cancelado:
+            callback()
+
+    def adicionar(self, driver):
+        with self._lock:
+            self._navegadores[id(driver)] = driver
+
+    def remover(self, driver):
+        with self._lock:
+            self._navegadores.pop(id(driver), None)
+
+    @contextmanager
+    def navegador(self, driver):
+        self.adicionar(driver)
+        try:
+            yield driver
+        finally:
+            self.remover(driver)
+
+    def navegadores(self):
+        with self._lock:
+            return list(self._navegadores.values())
+
+
+def _arvore(pid):
+    # pid e descendentes, lidos de /proc (Linux); em outros sistemas, só o próprio pid
+    filhos = {}
+    try:
+        entradas = os.listdir('/proc')
+    except OSError:
+        entradas = []
+    for nome in entradas:
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f'/proc/{nome}/stat', 'rb') as arquivo:
+                # "pid (comm) estado ppid ...": o comm pode ter espaços e parênteses
+                ppid = int(arquivo.read().rsplit(b')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        filhos.setdefault(ppid, []).append(int(nome))
+    arvore, pendentes = [], [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        arvore.append(atual)
+        pendentes.extend(filhos.get(atual, ()))
+    return arvore
+
+
+def encerrar_processos(driver):
+    """Mata o chromedriver do `driver` e os navegadores abaixo dele; retorna quantos processos."""
+    processo = getattr(getattr(driver, 'service', None), 'process', None)
+    if processo is None or processo.poll() is not None:
+        return 0
+    arvore = _arvore(processo.pid) # Lida antes de matar: sem o pai, os filhos passam para o init
+    mortos = 0
+    for pid in arvore:
+        try:
+            os.kill(pid, _SINAL_FIM)
+            mortos += 1
+        except OSError:
+            pass
+    try:
+        processo.wait(timeout=5) # O chromedriver é filho deste processo: não fica zumbi
+    except Exception:
+        pass
+    for pid in arvore[1:]:
+        # Os navegadores só passam a ser filhos deste processo quando ele é o init do contêiner
+        try:
+            os.waitpid(pid, os.WNOHANG)
+        except OSError:
+            pass
+    return mortos
+
+
+class Watchdog:
+    """Vigia as execuções deste processo numa thread própria.
+
+    Cancela as que passam do tempo limite e as paradas pedidas em outro processo
+    (`pedido_externo(session_id)` retorna o motivo ou None). Se uma execução cancelada
+    não termina em `carencia` segundos, os navegadores registrados nela são encerrados.
+    """
+
+    def __init__(self, limite=LIMITE_SESSAO, carencia=CARENCIA, intervalo=0.5, pedido_externo=None):
+        self.limite = limite
+        self.carencia = carencia
+        self.intervalo = intervalo
+        self.pedido_externo = pedido_externo
+        self._vigiadas = {} # session_id -> estado da execução vigiada
+        self._lock = threading.Lock()
+        self._stats = {'stopped': 0, 'timed_out': 0, 'browsers_killed': 0, 'processes_killed': 0}
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="SessionWatchdog", daemon=True)
+                self._thread.start()
+
+    @contextmanager
+    def vigiar(self, session_id, cancelamento, limite=None):
+        self.start()
+        with self._lock:
+            self._vigiadas[session_id] = {'cancelamento': cancelamento, 'inicio': time.monotonic(),
+                                          'limite': limite or self.limite, 'cancelada_em': None, 'encerrada': False}
+        try:
+            yield cancelamento
+        finally:
+            with self._lock:
+                self._vigiadas.pop(session_id, None)
+
+    def parar(self, session_id, motivo):
+        """Cancela a execução se ela roda neste processo; retorna False caso contrário."""
+        with self._lock:
+            vigiada = self._vigiadas.get(session_id)
+        if vigiada is None:
+            return False
+        if vigiada['cancelamento'].cancelar(motivo):
+            self._contar('stopped')
+        return True
+
+    def stats(self):
+        with self._lock:
+            dados = dict(self._stats)
+            dados['watched'] = len(self._vigiadas)
+        dados.update({'limit_s': self.limite, 'grace_s': self.carencia})
+        return dados
+
+    def _contar(self, nome, quantidade=1):
+        with self._lock:
+            self._stats[nome] += quantidade
+
+    def _run(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self._verificar()
+            except Exception as e:
+                print(f"[watchdog] Erro ao verificar as execuções: {e}")
+
+    def _verificar(self):
+        agora = time.monotonic()
+        with self._lock:
+            vigiadas = list(self._vigiadas.items())
+        for session_id, vigiada in vigiadas:
+            cancelamento = vigiada['cancelamento']
+            if not cancelamento.cancelado():
+                if agora - vigiada['inicio'] > vigiada['limite']:
+                    if cancelamento.cancelar(f"tempo limite de {vigiada['limite']:.0f}s excedido"):
+                        self._contar('timed_out')
+                elif self.pedido_externo:
+                    motivo = self.pedido_externo(session_id)
+                    if motivo and cancelamento.cancelar(motivo):
+                        self._contar('stopped')
+                if not cancelamento.cancelado():
+                    continue
+            if vigiada['cancelada_em'] is None:
+                vigiada['cancelada_em'] = agora
+            elif not vigiada['encerrada'] and agora - vigiada['cancelada_em'] >= self.carencia:
+                # Não parou sozinha: algum navegador está preso numa chamada WebDriver
+                vigiada['encerrada'] = True
+                navegadores = cancelamento.navegadores()
+                processos = sum(encerrar_processos(driver) for driver in navegadores)
+                self._contar('browsers_killed', len(navegadores))
+                self._contar('processes_killed', processos)
+                print(f"[watchdog] Sessão {session_id} não parou em {self.carencia:.0f}s: "
+                      f"{len(navegadores)} navegador(es) encerrado(s), {processos} processo(s).")
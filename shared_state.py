@@ -0,0 +1,501 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from job_queue import QueueFull, prever_inicios
+from session_store import resumir_sessao
+
+# Estado compartilhado entre processos (workers do gunicorn e qa_worker.py) num arquivo SQLite.
+# SharedSessionStore, SharedEventLog e SharedJobQueue têm a mesma interface de SessionStore,
+# SessionEventLog e JobQueue, então o web_analise_site escolhe um ou outro só na configuração.
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0,
+    events_closed INTEGER NOT NULL DEFAULT 0,
+    used_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_finished ON sessions (finished, used_at);
+CREATE TABLE IF NOT EXISTS events (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, enqueued_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    threads INTEGER NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+'''
+
+
+class SharedState:
+    """Arquivo SQLite (modo WAL) com uma conexão por thread e por processo."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.conexao().executescript(_SCHEMA)
+        self.eventos = SharedEventFanout(self) # Um leitor por sessão para todos os /events deste processo
+
+    def conexao(self):
+        # A conexão é refeita depois de um fork (gunicorn --preload): não pode ser herdada do pai
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transacao(self):
+        conn = self.conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def incrementar(self, conn, nome, valor=1):
+        conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                     (nome, valor))
+
+    def contadores(self, prefixo):
+        linhas = self.conexao().execute("SELECT name, value FROM counters WHERE name LIKE ?", (prefixo + '%',)).fetchall()
+        return {linha['name'][len(prefixo):]: linha['value'] for linha in linhas}
+
+
+class _EspelhoSessao:
+    # Eventos de uma sessão já lidos do SQLite, com o JSON gravado (seq == posição + 1)
+    def __init__(self, lock):
+        self.eventos = []
+        self.fechado = False
+        self.assinantes = 0
+        self.ultimo_uso = time.monotonic()
+        self.cond = threading.Condition(lock)
+
+
+class SharedEventFanout:
+    """Leitura compartilhada dos eventos do SQLite pelos streams de um processo.
+
+    Cada sessão acompanhada ganha uma cópia local dos eventos. Uma única thread
+    consulta o arquivo a cada `poll_interval` segundos para as sessões com
+    streams abertos e acorda todos eles de uma vez, então o custo não cresce com
+    o número de painéis olhando a mesma sessão. Cópias sem streams há mais de
+    `reter` segundos são descartadas.
+    """
+
+    def __init__(self, state, poll_interval=0.25, reter=30):
+        self.state = state
+        self.poll_interval = poll_interval
+        self.reter = reter
+        self._espelhos = {} # session_id -> _EspelhoSessao
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def wait_for(self, session_id, seq=0, timeout=None):
+        """Mesmo contrato de SessionEventLog.wait_for: (lista de (seq, json do evento), fechado)."""
+        with self._lock:
+            espelho = self._espelhos.get(session_id)
+            novo = espelho is None
+            if novo:
+                espelho = self._espelhos[session_id] = _EspelhoSessao(self._lock)
+            espelho.assinantes += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="SharedEventFanout", daemon=True)
+                self._thread.start()
+        try:
+            if novo: # O primeiro stream não espera o próximo ciclo para receber o que já existe
+                self._atualizar(session_id, espelho)
+            with espelho.cond:
+                espelho.cond.wait_for(lambda: len(espelho.eventos) > seq or espelho.fechado, timeout)
+                return espelho.eventos[max(seq, 0):], espelho.fechado
+        finally:
+            with self._lock:
+                espelho.assinantes -= 1
+                espelho.ultimo_uso = time.monotonic()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            agora = time.monotonic()
+            with self._lock:
+                for session_id, espelho in list(self._espelhos.items()):
+                    if not espelho.assinantes and agora - espelho.ultimo_uso > self.reter:
+                        del self._espelhos[session_id]
+                ativos = [(session_id, espelho) for session_id, espelho in self._espelhos.items()
+                          if espelho.assinantes and not espelho.fechado]
+            for session_id, espelho in ativos:
+                try:
+                    self._atualizar(session_id, espelho)
+                except sqlite3.Error as e:
+                    print(f"[shared_state] Erro ao ler os eventos da sessão {session_id}: {e}")
+
+    def _atualizar(self, session_id, espelho):
+        conn = self.state.conexao()
+        # Lê o fechamento antes dos eventos para não perder os últimos gravados antes do close()
+        linha = conn.execute("SELECT events_closed FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        fechado = linha is None or bool(linha['events_closed'])
+        with self._lock:
+            ultimo = len(espelho.eventos)
+        linhas = conn.execute("SELECT seq, data FROM events WHERE session_id = ? AND seq > ? ORDER BY seq",
+                              (session_id, ultimo)).fetchall()
+        with espelho.cond:
+            for linha in linhas:
+                if linha['seq'] == len(espelho.eventos) + 1: # Outra leitura simultânea pode já ter incluído
+                    espelho.eventos.append((linha['seq'], linha['data']))
+            if linhas or (fechado and not espelho.fechado):
+                espelho.fechado = fechado
+                espelho.cond.notify_all()
+
+
+class SharedEventLog:
+    """Log de eventos de uma sessão no SQLite: o processo que executa a sessão grava e qualquer processo lê.
+
+    `wait_for` espera na cópia local mantida por SharedState.eventos, que lê o
+    arquivo uma vez por ciclo para todos os streams da sessão neste processo.
+    """
+
+    def __init__(self, state, session_id):
+        self.state = state
+        self.session_id = session_id
+
+    @property
+    def last_seq(self):
+        linha = self.state.conexao().execute("SELECT COALESCE(MAX(seq), 0) AS seq FROM events WHERE session_id = ?",
+                                             (self.session_id,)).fetchone()
+        return linha['seq']
+
+    @property
+    def closed(self):
+        linha = self.state.conexao().execute("SELECT events_closed FROM sessions WHERE session_id = ?",
+                                             (self.session_id,)).fetchone()
+        return linha is None or bool(linha['events_closed'])
+
+    def append(self, **campos):
+        evento = dict(campos)
+        evento.setdefault('timestamp', time.strftime('%Y-%m-%d %H:%M:%S'))
+        with self.state.transacao() as conn:
+            evento['seq'] = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 AS seq FROM events WHERE session_id = ?",
+                                         (self.session_id,)).fetchone()['seq']
+            conn.execute("INSERT INTO events (session_id, seq, data) VALUES (?, ?, ?)",
+                         (self.session_id, evento['seq'], json.dumps(evento, default=str)))
+        return evento['seq']
+
+    def close(self):
+        with self.state.transacao() as conn:
+            conn.execute("UPDATE sessions SET events_closed = 1 WHERE session_id = ?", (self.session_id,))
+
+    def _ler(self, seq):
+        return self.state.conexao().execute("SELECT seq, data FROM events WHERE session_id = ? AND seq > ? ORDER BY seq",
+                                            (self.session_id, max(seq, 0))).fetchall()
+
+    def since(self, seq=0):
+        return [json.loads(linha['data']) for linha in self._ler(seq)]
+
+    def wait_for(self, seq=0, timeout=None):
+        """Mesmo contrato de SessionEventLog.wait_for: (lista de (seq, json do evento), fechado)."""
+        return self.state.eventos.wait_for(self.session_id, seq, timeout)
+
+
+class SharedSessionStore:
+    """Mesma interface do SessionStore, com as sessões no SQLite compartilhado.
+
+    O dict de cada sessão é gravado como JSON (sem o log de eventos, que fica
+    na tabela `events` e é reanexado por `get` enquanto a sessão não termina).
+    Alterações numa sessão em andamento passam por `update`, já que o dict
+    devolvido por `get` é uma cópia. Limites por TTL e LRU como no SessionStore.
+    """
+
+    def __init__(self, state, max_sessions=500, ttl=3600, loader=None):
+        self.state = state
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.loader = loader
+
+    def add(self, session_id, dados):
+        with self.state.transacao() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (session_id, data, finished, events_closed, used_at) VALUES (?, ?, 0, 0, ?)",
+                         (session_id, self._serializar(dados), time.time()))
+            conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+
+    def get(self, session_id):
+        conn = self.state.conexao()
+        linha = conn.execute("SELECT data, finished, expires_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if linha is not None and linha['finished'] and linha['expires_at'] <= time.time():
+            with self.state.transacao() as conn:
+                self._remover(conn, [session_id])
+                self.state.incrementar(conn, 'sessions.evicted_ttl')
+            linha = None
+        if linha is not None:
+            dados = json.loads(linha['data'])
+            if linha['finished']:
+                conn.execute("UPDATE sessions SET used_at = ? WHERE session_id = ?", (time.time(), session_id))
+            else:
+                dados['events'] = SharedEventLog(self.state, session_id)
+            return dados
+        if self.loader is None:
+            return None
+        dados = self.loader(session_id)
+        with self.state.transacao() as conn:
+            if dados is None:
+                self.state.incrementar(conn, 'sessions.load_misses')
+                return None
+            self.state.incrementar(conn, 'sessions.loaded')
+            dados.setdefault('end_time', time.time())
+            self._gravar_resumo(conn, session_id, dados)
+        return dados
+
+    def update(self, session_id, **campos):
+        with self.state.transacao() as conn:
+            linha = conn.execute("SELECT data FROM sessions WHERE session_id = ? AND finished = 0", (session_id,)).fetchone()
+            if linha is not None:
+                dados = json.loads(linha['data'])
+                dados.update(campos)
+                conn.execute("UPDATE sessions SET data = ?, used_at = ? WHERE session_id = ?",
+                             (self._serializar(dados), time.time(), session_id))
+
+    def pop(self, session_id):
+        with self.state.transacao() as conn:
+            linha = conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            self._remover(conn, [session_id])
+        return json.loads(linha['data']) if linha else None
+
+    def finish(self, session_id, resumo):
+        with self.state.transacao() as conn:
+            if conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone():
+                self._gravar_resumo(conn, session_id, resumo)
+
+    def __contains__(self, session_id):
+        return self.state.conexao().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def __len__(self):
+        return self.state.conexao().execute("SELECT COUNT(*) AS n FROM sessions").fetchone()['n']
+
+    def stats(self):
+        dados = {'evicted_lru': 0, 'evicted_ttl': 0, 'loaded': 0, 'load_misses': 0}
+        dados.update({nome: int(valor) for nome, valor in self.state.contadores('sessions.').items()})
+        linha = self.state.conexao().execute("SELECT COUNT(*) AS n, COALESCE(SUM(finished = 0), 0) AS ativas FROM sessions").fetchone()
+        dados['sessions'] = linha['n']
+        dados['active'] = linha['ativas']
+        dados['max_sessions'] = self.max_sessions
+        dados['ttl'] = self.ttl
+        dados['backend'] = 'sqlite'
+        return dados
+
+    def _serializar(self, dados):
+        return json.dumps({k: v for k, v in dados.items() if k != 'events'}, default=str)
+
+    def _gravar_resumo(self, conn, session_id, resumo):
+        agora = time.time()
+        conn.execute("INSERT OR REPLACE INTO sessions (session_id, data, finished, events_closed, used_at, expires_at) VALUES (?, ?, 1, 1, ?, ?)",
+                     (session_id, self._serializar(resumo), agora, agora + self.ttl))
+        self._remover_excedentes(conn, agora)
+
+    def _encerrar_interrompida(self, conn, session_id, motivo):
+        # Sessão cujo processo morreu no meio: registra a falha e grava o resumo, encerrando os streams
+        linha = conn.execute("SELECT data FROM sessions WHERE session_id = ? AND finished = 0", (session_id,)).fetchone()
+        if linha is None:
+            return
+        dados = json.loads(linha['data'])
+        eventos = [json.loads(l['data']) for l in conn.execute("SELECT data FROM events WHERE session_id = ? ORDER BY seq", (session_id,))]
+        mensagem = f"Execução interrompida: {motivo}."
+        evento = {'seq': len(eventos) + 1, 'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'step': "Execução Interrompida",
+                  'status': "falha", 'response_time': None, 'message': mensagem, 'error_message': mensagem}
+        conn.execute("INSERT INTO events (session_id, seq, data) VALUES (?, ?, ?)", (session_id, evento['seq'], json.dumps(evento)))
+        dados.update(status='completed', end_time=time.time())
+        resumo = resumir_sessao(dados, eventos + [evento])
+        resumo.update({campo: dados.get(campo) for campo in ('mode', 'url', 'lean', 'load')})
+        resumo['result'] = 'falha'
+        self._gravar_resumo(conn, session_id, resumo)
+
+    def _remover(self, conn, session_ids):
+        for session_id in session_ids:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+
+    def _remover_excedentes(self, conn, agora):
+        # Mesmo critério do SessionStore: resumos vencidos e, acima do limite, os usados há mais tempo
+        vencidas = [l['session_id'] for l in conn.execute("SELECT session_id FROM sessions WHERE finished = 1 AND expires_at <= ?", (agora,))]
+        self._remover(conn, vencidas)
+        if vencidas:
+            self.state.incrementar(conn, 'sessions.evicted_ttl', len(vencidas))
+        excesso = conn.execute("SELECT COUNT(*) AS n FROM sessions").fetchone()['n'] - self.max_sessions
+        if excesso > 0:
+            antigas = [l['session_id'] for l in conn.execute(
+                "SELECT session_id FROM sessions WHERE finished = 1 ORDER BY used_at LIMIT ?", (excesso,))]
+            self._remover(conn, antigas)
+            if antigas:
+                self.state.incrementar(conn, 'sessions.evicted_lru', len(antigas))
+
+
+class SharedJobQueue:
+    """Fila de testes no SQLite: qualquer processo web enfileira e processos qa_worker.py executam.
+
+    `submit` tem a mesma assinatura do JobQueue, mas a função recebida não
+    atravessa processos e é ignorada: cada worker chama `handler(job_id,
+    espera_fila)` (ver `run_worker`). A capacidade usada nas previsões é a soma
+    das threads dos workers com heartbeat recente, ou `max_workers` se nenhum
+    estiver no ar. Com `sessions` (o SharedSessionStore dos jobs), as sessões
+    de um worker que morreu são encerradas como falha.
+    """
+
+    def __init__(self, state, max_workers=2, max_queue=20, estimated_run_time=60.0, poll_interval=0.5, heartbeat_timeout=60,
+                 sessions=None):
+        self.state = state
+        self.sessions = sessions
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.estimated_run_time = estimated_run_time
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+
+    def submit(self, job_id, func=None):
+        """Enfileira o job e retorna a posição na fila (0 = começa já)."""
+        with self.state.transacao() as conn:
+            self._limpar_orfaos(conn)
+            na_fila = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE state = 'queued'").fetchone()['n']
+            retry_after = None
+            if na_fila >= self.max_queue:
+                # QueueFull sobe depois do commit, para não desfazer o contador de recusas
+                self.state.incrementar(conn, 'jobs.rejected')
+                retry_after = max(1, int(self._previsoes(conn, na_fila + 1)[-1] - time.time()))
+            else:
+                conn.execute("INSERT INTO jobs (job_id, state, enqueued_at) VALUES (?, 'queued', ?)", (job_id, time.time()))
+                self.state.incrementar(conn, 'jobs.submitted')
+                rodando = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE state = 'running'").fetchone()['n']
+                posicao = max(0, rodando + na_fila + 1 - self._capacidade(conn))
+        if retry_after is not None:
+            raise QueueFull(retry_after=retry_after)
+        return posicao
+
+    def position(self, job_id):
+        """Posição (1 = próximo) de um job que ainda aguarda, ou None."""
+        conn = self.state.conexao()
+        linha = conn.execute("SELECT enqueued_at FROM jobs WHERE job_id = ? AND state = 'queued'", (job_id,)).fetchone()
+        if linha is None:
+            return None
+        return conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE state = 'queued' AND enqueued_at <= ?",
+                            (linha['enqueued_at'],)).fetchone()['n']
+
+    def estimated_start(self, job_id):
+        posicao = self.position(job_id)
+        if posicao is None:
+            return None
+        return self._previsoes(self.state.conexao(), posicao)[posicao - 1]
+
+    def stats(self):
+        conn = self.state.conexao()
+        dados = {'submitted': 0, 'rejected': 0, 'completed': 0, 'orphaned': 0, 'queue_wait_total': 0.0}
+        dados.update(self.state.contadores('jobs.'))
+        for nome in ('submitted', 'rejected', 'completed', 'orphaned'):
+            dados[nome] = int(dados[nome])
+        for estado, chave in (('queued', 'queued'), ('running', 'running')):
+            dados[chave] = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE state = ?", (estado,)).fetchone()['n']
+        dados['max_workers'] = self._capacidade(conn)
+        dados['max_queue'] = self.max_queue
+        dados['avg_run_time'] = round(self._duracao_media(conn), 2)
+        dados['worker_processes'] = conn.execute("SELECT COUNT(*) AS n FROM workers WHERE heartbeat_at > ?",
+                                                 (time.time() - self.heartbeat_timeout,)).fetchone()['n']
+        dados['backend'] = 'sqlite'
+        return dados
+
+    def run_worker(self, handler, threads=None):
+        """Executa jobs da fila neste processo com `threads` threads (navegadores). Não retorna."""
+        threads = threads or self.max_workers
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._heartbeat(worker_id, threads)
+        for i in range(threads):
+            threading.Thread(target=self._executar, args=(worker_id, handler), name=f"SharedJobWorker-{i + 1}", daemon=True).start()
+        while True:
+            time.sleep(self.heartbeat_timeout / 3)
+            self._heartbeat(worker_id, threads)
+
+    def _heartbeat(self, worker_id, threads):
+        # Também recolhe os jobs de workers mortos, para não depender de um novo submit
+        with self.state.transacao() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (worker_id, threads, heartbeat_at) VALUES (?, ?, ?)",
+                         (worker_id, threads, time.time()))
+            self._limpar_orfaos(conn)
+
+    def _capacidade(self, conn):
+        linha = conn.execute("SELECT COALESCE(SUM(threads), 0) AS n FROM workers WHERE heartbeat_at > ?",
+                             (time.time() - self.heartbeat_timeout,)).fetchone()
+        return linha['n'] or self.max_workers
+
+    def _duracao_media(self, conn):
+        return self.state.contadores('jobs.').get('avg_run_time') or self.estimated_run_time
+
+    def _previsoes(self, conn, quantidade):
+        inicios = [linha['started_at'] for linha in conn.execute("SELECT started_at FROM jobs WHERE state = 'running'")]
+        return prever_inicios(time.time(), inicios, self._capacidade(conn), self._duracao_media(conn), quantidade)
+
+    def _limpar_orfaos(self, conn):
+        # Jobs de um worker que parou de mandar heartbeat (processo morto) não ocupam mais vaga, e as
+        # sessões deles terminam como falha (senão ficariam "running" para sempre, travando o monitor)
+        orfaos = [linha['job_id'] for linha in conn.execute(
+            "SELECT job_id FROM jobs WHERE state = 'running' AND worker NOT IN "
+            "(SELECT worker_id FROM workers WHERE heartbeat_at > ?)", (time.time() - self.heartbeat_timeout,))]
+        for job_id in orfaos:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            if self.sessions is not None:
+                self.sessions._encerrar_interrompida(conn, job_id, "worker encerrado")
+        if orfaos:
+            self.state.incrementar(conn, 'jobs.orphaned', len(orfaos))
+            print(f"[job_queue] {len(orfaos)} job(s) de workers encerrados removido(s): {', '.join(orfaos)}")
+
+    def _reservar(self, worker_id):
+        with self.state.transacao() as conn:
+            linha = conn.execute("SELECT job_id, enqueued_at FROM jobs WHERE state = 'queued' ORDER BY enqueued_at LIMIT 1").fetchone()
+            if linha is None:
+                return None
+            inicio = time.time()
+            conn.execute("UPDATE jobs SET state = 'running', started_at = ?, worker = ? WHERE job_id = ?",
+                         (inicio, worker_id, linha['job_id']))
+            espera = inicio - linha['enqueued_at']
+            self.state.incrementar(conn, 'jobs.queue_wait_total', espera)
+            return linha['job_id'], inicio, espera
+
+    def _executar(self, worker_id, handler):
+        while True:
+            reservado = self._reservar(worker_id)
+            if reservado is None:
+                time.sleep(self.poll_interval)
+                continue
+            job_id, inicio, espera = reservado
+            try:
+                handler(job_id, espera)
+            except Exception as e:
+                print(f"[job_queue] Erro no job {job_id}: {e}")
+            finally:
+                with self.state.transacao() as conn:
+                    conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+                    self.state.incrementar(conn, 'jobs.completed')
+                    media = self._duracao_media(conn)
+                    conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES ('jobs.avg_run_time', ?)",
+                                 (0.8 * media + 0.2 * (time.time() - inicio),))
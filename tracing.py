@@ -0,0 +1,185 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Spans de tempo nos pontos quentes (início do navegador, comandos WebDriver, buscas de
+# elementos, esperas, gravações no banco). Cada span alimenta o histograma global
+# `qa_span_seconds` (exposto no /metrics) e, se a thread tiver um Trace ativo, o resumo da sessão.
+
+# Limites (s) dos histogramas: os padrões do cliente Prometheus estendidos para esperas longas
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Comandos WebDriver agrupados por operação (rótulo `detail` dos spans "webdriver")
+OPERACOES_WEBDRIVER = {
+    'get': 'navigate',
+    'clickElement': 'click',
+    'findElement': 'find_element',
+    'findElements': 'find_element',
+    'findChildElement': 'find_element',
+    'findChildElements': 'find_element',
+    'w3cExecuteScript': 'script',
+    'w3cExecuteScriptAsync': 'script',
+    'executeScript': 'script',
+    'executeAsyncScript': 'script',
+}
+
+
+def _rotulos(labels):
+    if not labels:
+        return ''
+    escapar = lambda valor: str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in labels) + '}'
+
+
+class MetricsRegistry:
+    """Histogramas, contadores e gauges do processo, renderizados no formato texto do Prometheus."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histogramas = {} # (nome, rótulos) -> [contagens por bucket, soma, total]
+        self._contadores = {} # (nome, rótulos) -> valor
+        self._gauges = {} # nome -> (tipo, função)
+        self._ajuda = {}
+        self._lock = threading.Lock()
+
+    def observar(self, nome, valor, ajuda=None, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            if ajuda:
+                self._ajuda.setdefault(nome, ajuda)
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    histograma[0][i] += 1
+                    break
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def incrementar(self, nome, valor=1, ajuda=None, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            if ajuda:
+                self._ajuda.setdefault(nome, ajuda)
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def gauge(self, nome, func, ajuda=None, tipo='gauge'):
+        """Valor lido na hora do /metrics: `func()` retorna um número ou {(('rótulo', 'valor'), ...): número}."""
+        with self._lock:
+            self._gauges[nome] = (tipo, func)
+            if ajuda:
+                self._ajuda[nome] = ajuda
+
+    def render(self):
+        with self._lock:
+            histogramas = {chave: (list(h[0]), h[1], h[2]) for chave, h in self._histogramas.items()}
+            contadores = dict(self._contadores)
+            gauges = dict(self._gauges)
+            ajuda = dict(self._ajuda)
+        linhas = []
+
+        def cabecalho(nome, tipo):
+            if nome in ajuda:
+                linhas.append(f"# HELP {nome} {ajuda[nome]}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        for nome in sorted({n for n, _ in histogramas}):
+            cabecalho(nome, 'histogram')
+            for (n, labels), (contagens, soma, total) in sorted(histogramas.items()):
+                if n != nome:
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(self.buckets, contagens):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_rotulos(labels + (('le', limite),))} {acumulado}")
+                linhas.append(f"{nome}_bucket{_rotulos(labels + (('le', '+Inf'),))} {total}")
+                linhas.append(f"{nome}_sum{_rotulos(labels)} {soma:.6f}")
+                linhas.append(f"{nome}_count{_rotulos(labels)} {total}")
+        for nome in sorted({n for n, _ in contadores}):
+            cabecalho(nome, 'counter')
+            for (n, labels), valor in sorted(contadores.items()):
+                if n == nome:
+                    linhas.append(f"{nome}{_rotulos(labels)} {valor}")
+        for nome, (tipo, func) in sorted(gauges.items()):
+            try:
+                valor = func()
+            except Exception as e:
+                print(f"[metrics] Falha ao ler {nome}: {e}")
+                continue
+            cabecalho(nome, tipo)
+            for labels, v in (valor.items() if isinstance(valor, dict) else [((), valor)]):
+                linhas.append(f"{nome}{_rotulos(labels)} {v}")
+        return '\n'.join(linhas) + '\n'
+
+
+class Trace:
+    """Spans de uma sessão: contagem, tempo total e máximo por span.
+
+    Spans se aninham (uma espera inclui os comandos WebDriver que ela faz),
+    então os totais não somam o tempo da execução.
+    """
+
+    def __init__(self):
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, duracao):
+        with self._lock:
+            span = self._spans.setdefault(nome, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += duracao
+            span[2] = max(span[2], duracao)
+
+    def resumo(self):
+        # Do maior tempo total para o menor
+        with self._lock:
+            itens = sorted(self._spans.items(), key=lambda item: -item[1][1])
+        return {nome: {'count': c, 'total_s': round(t, 4), 'max_s': round(m, 4)} for nome, (c, t, m) in itens}
+
+
+registry = MetricsRegistry()
+_local = threading.local()
+
+
+def trace_atual():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def em_trace(trace):
+    # Ativa o Trace da sessão na thread atual (inclusive em threads auxiliares da mesma sessão)
+    anterior = trace_atual()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = anterior
+
+
+def registrar(nome, duracao, detalhe=''):
+    # Para quem já mediu o tempo por conta própria (ex.: requisições do http_probe)
+    registry.observar('qa_span_seconds', duracao, "Duração das operações instrumentadas", span=nome, detail=detalhe)
+    trace = trace_atual()
+    if trace is not None:
+        trace.registrar(f"{nome}:{detalhe}" if detalhe else nome, duracao)
+
+
+@contextmanager
+def span(nome, detalhe=''):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nome, time.perf_counter() - inicio, detalhe)
+
+
+def instrumentar_driver(driver):
+    """Mede cada comando enviado ao Chrome (navegação, clique, busca de elemento, script)."""
+    original = driver.execute
+
+    def execute(comando, params=None):
+        with span('webdriver', OPERACOES_WEBDRIVER.get(comando, 'other')):
+            return original(comando, params)
+    driver.execute = execute
+    return driver
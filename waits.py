@@ -0,0 +1,141 @@
+import time
+import tracing
+from selenium.common.exceptions import TimeoutException
+from locators import LOCATORS
+
+# WebDriverWait e expected_conditions vêm de selenium.webdriver, cujo __init__ carrega todos os
+# drivers; são importados na primeira espera, não quando a aplicação sobe
+
+# Tetos (em segundos) de cada tipo de espera; podem ser sobrescritos por tester
+DEFAULT_TIMEOUTS = {
+    'document_ready': 15,
+    'network_idle': 5,
+    'element': 20,
+    'element_gone': 5,
+    'cart_drawer': 10,
+}
+
+# Minicart VTEX aberto ou o botão de checkout já visível na gaveta do carrinho (seletor CSS do registro)
+CART_DRAWER_LOCATOR = LOCATORS['gaveta_carrinho'][0]
+
+# Conta requisições fetch/XHR em andamento a partir do momento em que é injetado
+_NETWORK_TRACKER_JS = """
+if (!window.__qaRede) {
+    window.__qaRede = {pendentes: 0};
+    try { performance.setResourceTimingBufferSize(2000); } catch (e) {}
+    const rede = window.__qaRede;
+    const fetchOriginal = window.fetch;
+    if (fetchOriginal) {
+        window.fetch = function() {
+            rede.pendentes++;
+            return fetchOriginal.apply(this, arguments).finally(() => { rede.pendentes--; });
+        };
+    }
+    const sendOriginal = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        rede.pendentes++;
+        this.addEventListener('loadend', () => { rede.pendentes--; }, {once: true});
+        return sendOriginal.apply(this, arguments);
+    };
+}
+const recursos = performance.getEntriesByType('resource');
+let ultimaResposta = 0;
+for (const r of recursos) { if (r.responseEnd > ultimaResposta) ultimaResposta = r.responseEnd; }
+return {pendentes: window.__qaRede.pendentes, ociosoMs: performance.now() - ultimaResposta};
+"""
+
+
+class WaitEngine:
+    """Esperas orientadas a condição sobre WebDriverWait, no lugar de pausas fixas.
+
+    Cada espera termina assim que a condição é satisfeita (ou no teto
+    configurado) e o tempo gasto é acumulado para ser registrado como métrica
+    da etapa via `consumir()`. Com um `cancelamento` (session_watchdog.Cancelamento),
+    cada poll também verifica se a execução foi parada.
+    """
+
+    def __init__(self, driver, timeouts=None, poll_frequency=0.1, cancelamento=None):
+        self.driver = driver
+        self.cancelamento = cancelamento
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.poll_frequency = poll_frequency
+        self.total = 0.0 # Tempo total esperado na execução
+        self._acumulado = 0.0 # Tempo esperado desde o último consumir()
+
+    def consumir(self):
+        """Retorna o tempo esperado desde a última chamada e zera o acumulador."""
+        tempo, self._acumulado = self._acumulado, 0.0
+        return tempo
+
+    def _esperar(self, tipo, condicao, timeout=None):
+        from selenium.webdriver.support.ui import WebDriverWait
+        if self.cancelamento is not None:
+            self.cancelamento.verificar()
+            original = condicao
+
+            def condicao(driver):
+                self.cancelamento.verificar() # SessaoCancelada não é ignorada pelo WebDriverWait
+                return original(driver)
+        inicio = time.time()
+        try:
+            with tracing.span('wait', tipo):
+                espera = WebDriverWait(self.driver, timeout or self.timeouts[tipo], poll_frequency=self.poll_frequency)
+                return espera.until(condicao)
+        finally:
+            tempo = time.time() - inicio
+            self._acumulado += tempo
+            self.total += tempo
+
+    def document_ready(self, timeout=None):
+        return self._esperar('document_ready',
+                             lambda d: d.execute_script("return document.readyState") == "complete", timeout)
+
+    def network_idle(self, idle_ms=500, timeout=None):
+        """Espera não haver fetch/XHR pendente nem recurso concluído nos últimos `idle_ms`.
+
+        Um site que nunca fica ocioso (polling, analytics) não é erro: ao
+        atingir o teto retorna False e o fluxo segue.
+        """
+        def ociosa(driver):
+            estado = driver.execute_script(_NETWORK_TRACKER_JS)
+            return estado['pendentes'] <= 0 and estado['ociosoMs'] >= idle_ms
+        try:
+            return self._esperar('network_idle', ociosa, timeout)
+        except TimeoutException:
+            return False
+
+    def page_loaded(self, timeout=None):
+        # Usada depois de navegações: se o teto estourar, a próxima etapa é quem reporta a falha
+        try:
+            self.document_ready(timeout)
+        except TimeoutException:
+            return False
+        return self.network_idle()
+
+    def element_present(self, locator, timeout=None):
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._esperar('element', EC.presence_of_element_located(locator), timeout)
+
+    def element_clickable(self, locator, timeout=None):
+        from selenium.webdriver.support import expected_conditions as EC
+        return self._esperar('element', EC.element_to_be_clickable(locator), timeout)
+
+    def until(self, condicao, tipo='element', timeout=None):
+        # Condição arbitrária, ex.: as de locators.LocatorsDoSite que tentam vários seletores
+        return self._esperar(tipo, condicao, timeout)
+
+    def element_gone(self, elemento, timeout=None):
+        # Elemento removido ou escondido (ex.: banner de cookies depois do clique)
+        from selenium.webdriver.support import expected_conditions as EC
+        try:
+            return self._esperar('element_gone', EC.invisibility_of_element(elemento), timeout)
+        except TimeoutException:
+            return False
+
+    def cart_drawer_visible(self, timeout=None):
+        # Sem gaveta visível no teto, quem reporta a falha é a etapa de checkout
+        from selenium.webdriver.support import expected_conditions as EC
+        try:
+            return self._esperar('cart_drawer', EC.visibility_of_element_located(CART_DRAWER_LOCATOR), timeout)
+        except TimeoutException:
+            return False
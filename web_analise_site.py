@@ -1,19 +1,36 @@
 import time
+_INICIO_IMPORT = time.perf_counter() # Medido no /healthz (import_s) e pelo benchmark de partida a frio
 import threading
-from flask import Flask, render_template, request, jsonify
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.common.exceptions import WebDriverException, NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import pymysql.cursors
+import json
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file
+from selenium.common.exceptions import WebDriverException # selenium.webdriver e pymysql só são importados no primeiro uso
 import os
 import uuid # Para gerar IDs de sessão únicos
-
-session_counter = 0 # Inicializado globalmente, será atualizado por init_db()
+from log_writer import BufferedLogWriter
+from session_events import SessionEventLog
+from driver_pool import DriverPool
+from waits import WaitEngine
+from job_queue import JobQueue, QueueFull
+from page_metrics import METRIC_COLUMNS, coletar_metricas
+from http_probe import SondaHTTP, pool_compartilhado as http_pool
+from locators import registry as locator_registry
+from product_catalog import ProductCatalog
+from session_store import SessionStore, resumir_sessao
+from db_schema import aplicar_migracoes
+from monitor_scheduler import MonitorScheduler, MonitorStore, LeaderLock, MISSED_POLICIES, CAMPOS_EDITAVEIS
+from shared_state import SharedState, SharedSessionStore, SharedEventLog, SharedJobQueue
+import analytics
+import tracing
+import resource_blocking
+import scenario_engine
+import load_test
+import failure_artifacts
+import session_watchdog
 
 def get_db_connection():
+    import pymysql.cursors
     # Configurações do banco de dados (Exemplo)
     conn = pymysql.connect(host='localhost',
                            user='seu_usuario',
@@ -23,382 +40,322 @@ def get_db_connection():
     return conn
 
 def init_db():
-    global session_counter
+    # Só aplica as migrações pendentes (ver db_schema.py); a numeração das sessões vem do
+    # auto-incremento da tabela `sessions`, sem varrer os logs na inicialização
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS logs_testeSite (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                session_id VARCHAR(255) NOT NULL, # Ajustado para suportar TestandoSite_X
-                timestamp DATETIME NOT NULL,
-                step VARCHAR(255) NOT NULL,
-                status VARCHAR(255) NOT NULL,
-                response_time REAL,
-                message TEXT,
-                error_message TEXT
-            )
-        ''')
-        conn.commit()
-
-        # Tenta recuperar o último session_counter do banco de dados
-        try:
-            cursor.execute("SELECT MAX(CAST(SUBSTRING_INDEX(session_id, '_', -1) AS UNSIGNED)) AS max_id FROM logs_testeSite WHERE session_id LIKE 'TestandoSite_%%'")
-            result = cursor.fetchone()
-            if result and result['max_id'] is not None:
-                session_counter = int(result['max_id']) + 1
-            else:
-                session_counter = 0
-        except Exception as e:
-            print(f"Aviso: Não foi possível recuperar o último session_id do banco de dados: {e}. Iniciando session_counter em 0.")
-            session_counter = 0
-        print(f"[init_db] Database initialized. Initial session_counter set to: {session_counter}")
+        versao = aplicar_migracoes(conn, METRIC_COLUMNS)
+    print(f"[init_db] Database initialized. Schema version: {versao}")
+    return versao
+
+# Colunas gravadas por SiteQATester._log_to_db, na ordem das tuplas enfileiradas
+LOG_COLUMNS = ('session_id', 'session_ref', 'timestamp', 'step', 'status', 'response_time', 'wait_time', 'message', 'error_message') + METRIC_COLUMNS + ('artifacts',)
+
+# Campos das etapas mantidos no resumo da sessão só quando preenchidos
+CAMPOS_OPCIONAIS = METRIC_COLUMNS + ('artifacts',)
+
+# Escritor compartilhado: junta os logs de todas as sessões em INSERTs de várias linhas,
+# fora da thread que controla o navegador
+log_writer = BufferedLogWriter(get_db_connection, 'logs_testeSite', LOG_COLUMNS,
+                               batch_size=int(os.environ.get('QA_LOG_BATCH_SIZE', 50)),
+                               flush_interval=float(os.environ.get('QA_LOG_FLUSH_INTERVAL', 1.0)),
+                               on_batch=analytics.RollupUpdater(LOG_COLUMNS)) # Percentis por etapa atualizados junto com cada lote
+
+def criar_driver_chrome():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    chrome_options.add_argument("--incognito") 
+    # No ambiente web/servidor, o navegador deve ser sempre headless
+    chrome_options.add_argument("--headless") 
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--no-sandbox") # Necessário em alguns ambientes de servidor
+    chrome_options.add_argument("--disable-dev-shm-usage") # Para evitar problemas de memória em Docker/servidores
+    chrome_options.set_capability(*resource_blocking.CAPABILITY_LOG) # Tráfego de rede (modo enxuto) e console (artefatos de falha)
+
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(30)
+    return tracing.instrumentar_driver(driver) # Spans de navegação, cliques, buscas e scripts (ver /metrics)
+
+# Quantidade de testes (e navegadores) rodando ao mesmo tempo; o excedente espera na fila
+MAX_WORKERS = int(os.environ.get('QA_MAX_WORKERS', 2))
+MAX_QUEUE = int(os.environ.get('QA_MAX_QUEUE', 20))
+
+# Navegadores headless pré-iniciados e reaproveitados entre as execuções
+driver_pool = DriverPool(criar_driver_chrome,
+                         max_size=int(os.environ.get('QA_DRIVER_POOL_SIZE', MAX_WORKERS)),
+                         max_uses=int(os.environ.get('QA_DRIVER_MAX_USES', 20)))
+
+# Navegadores extras usados apenas pela sondagem paralela de produtos do modo avançado
+probe_pool = DriverPool(criar_driver_chrome,
+                        max_size=int(os.environ.get('QA_PROBE_POOL_SIZE', 4)),
+                        max_uses=int(os.environ.get('QA_DRIVER_MAX_USES', 20)))
+
+# Produtos descobertos na home de cada site, reaproveitados pelas execuções seguintes até expirar
+product_catalog = ProductCatalog(ttl=int(os.environ.get('QA_PRODUCT_CACHE_TTL', 1800)))
+
+# Screenshot, HTML e console das etapas que falham (QA_ARTIFACTS_DIR, limitado a QA_ARTIFACTS_MAX_BYTES)
+artifact_store = failure_artifacts.ArtifactStore()
 
 # --- Classe SiteQATester adaptada para ambiente web ---
 class SiteQATester:
-    def __init__(self, url, modo, session_id=None):
+    def __init__(self, url, modo, session_id=None, wait_timeouts=None, paralelo=1, session_ref=None, events=None, enxuto=False,
+                 carga=None):
         self.url = url
         self.modo = modo
+        self.carga = carga # Configuração do modo Carga (ver load_test.validar_config)
+        self.paralelo = paralelo # Navegadores usados ao mesmo tempo para visitar produtos no modo avançado
+        self.enxuto = enxuto # Bloqueia imagens, fontes, vídeos e rastreadores (checagem funcional, sem tempos fiéis)
         self.driver = None
+        self.driver_quebrado = False # Marca o driver para ser reciclado em vez de devolvido ao pool
+        self._thread_driver = None # Thread que controla self.driver; só ela captura os artefatos de falha
         self.resultados = []
-        self.parar = False
+        self.cancelamento = session_watchdog.Cancelamento() # Parada pedida pelo /stop ou pelo tempo limite
         self.session_id = session_id # Para rastrear sessões de teste no servidor
+        self.session_ref = session_ref # id da linha em `sessions` (chave estrangeira dos logs)
         self.progress = 0
         self.max_progress_steps = 10 # Para modo avançado, ou um valor fixo para rápido
+        self.events = events if events is not None else SessionEventLog() # Eventos da sessão, lidos incrementalmente pelo /status
+        self.wait_timeouts = wait_timeouts # Tetos das esperas (ver waits.DEFAULT_TIMEOUTS)
+        self.waits = None
+        self._origens_medidas = {} # id(driver) -> timeOrigin do último documento medido
+        self.locators = locator_registry.para_site(url) # Seletores CSS/XPath com a preferência aprendida para o site
+        self.trace = tracing.Trace() # Tempo por operação (spans) desta execução
+        self.economia = resource_blocking.EconomiaRede() # Requisições e bytes bloqueados pelo modo enxuto
 
     def _log_progress(self, message, percentage):
         self.progress = percentage
         # Não imprimimos mais aqui, pois web_progress_callback já imprime
         # e faz o log no DB.
 
-    def _log_to_db(self, step, status, response_time=None, message=None, error_message=None):
+    def _log_to_db(self, step, status, response_time=None, message=None, error_message=None, wait_time=None, metricas=None,
+                   evento=True):
+        # O tempo de espera de uma etapa é o acumulado pelo WaitEngine desde o último log final
+        if wait_time is None and self.waits and status != "em_progresso":
+            wait_time = self.waits.consumir()
+        metricas = metricas or {}
+        valores_metricas = tuple(metricas.get(coluna) for coluna in METRIC_COLUMNS)
+        # Capturados depois de medidos os tempos da etapa; a gravação fica com a thread do artifact_store
+        artefatos = self._capturar_artefatos() if status == "falha" and evento else None
+        extras = {'artifacts': artefatos} if artefatos else {}
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        if evento: # As etapas dos clientes do modo Carga só vão para o banco; a página recebe o resumo
+            self.events.append(timestamp=timestamp, step=step, status=status, response_time=response_time,
+                               wait_time=wait_time, message=message, error_message=error_message,
+                               **dict(zip(METRIC_COLUMNS, valores_metricas)), **extras)
+        # Apenas enfileira; a gravação acontece em lote na thread do log_writer
+        log_writer.write((self.session_id, self.session_ref, timestamp, step, status, response_time, wait_time, message, error_message)
+                         + valores_metricas + (json.dumps(artefatos) if artefatos else None,))
+
+    def _capturar_artefatos(self):
+        # Só do navegador principal e na thread que o controla: passos paralelos não disputam o driver,
+        # e um driver que já deu erro de WebDriver não é consultado de novo
+        if self.driver is None or self.driver_quebrado or threading.get_ident() != self._thread_driver:
+            return None
+        nomes = artifact_store.salvar(failure_artifacts.capturar(self.driver))
+        return {tipo: f"/artifacts/{nome}" for tipo, nome in nomes.items()} or None
+
+    def _metricas_navegacao(self, driver=None):
+        # Navigation Timing/Paint/LCP/CLS do documento atual. Se o documento é o mesmo da
+        # última medição (clique tratado pelo roteador SPA, sem carregar página), não há o que registrar.
+        driver = driver or self.driver
         try:
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO logs_testeSite (session_id, timestamp, step, status, response_time, message, error_message)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ''',
-                (self.session_id, time.strftime('%Y-%m-%d %H:%M:%S'), step, status, response_time, message, error_message))
-                conn.commit()
+            metricas = coletar_metricas(driver)
         except Exception as e:
-            print(f"Erro ao logar no banco de dados: {e}")
+            print(f"Aviso: não foi possível coletar métricas do navegador: {e}")
+            return None
+        origem = metricas.pop('time_origin')
+        if origem is not None and self._origens_medidas.get(id(driver)) == origem:
+            return None
+        self._origens_medidas[id(driver)] = origem
+        return metricas
 
     def iniciar_driver(self):
         step_name = "Iniciar Driver"
         # O log de "Iniciar Driver" já é feito pelo _log_to_db chamado no rodar_teste
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--incognito") 
-            # No ambiente web/servidor, o navegador deve ser sempre headless
-            chrome_options.add_argument("--headless") 
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--no-sandbox") # Necessário em alguns ambientes de servidor
-            chrome_options.add_argument("--disable-dev-shm-usage") # Para evitar problemas de memória em Docker/servidores
-
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.driver.set_page_load_timeout(30)
+            # Empresta um navegador já iniciado do pool (ou inicia um novo se não houver ocioso)
+            inicio = time.time()
+            with tracing.span('driver_start'):
+                self.driver = driver_pool.acquire()
+                self.cancelamento.adicionar(self.driver) # Encerrado pelo vigia se travar depois de um /stop
+                self._preparar_rede(self.driver)
+            tempo = time.time() - inicio
+            self.driver_quebrado = False
+            self._thread_driver = threading.get_ident()
+            self.waits = WaitEngine(self.driver, self.wait_timeouts, cancelamento=self.cancelamento)
             # Loga o sucesso após iniciar o driver
-            self._log_to_db(step_name, "sucesso", None, "Driver iniciado com sucesso.")
+            self._log_to_db(step_name, "sucesso", tempo, f"Driver iniciado com sucesso em {tempo:.2f}s.")
             return True
         except Exception as e:
             self.resultados.append(f"Erro ao iniciar o navegador: {e}")
             self._log_to_db(step_name, "falha", None, f"Erro ao iniciar o navegador: {e}")
             return False
 
+    def _preparar_rede(self, driver):
+        resource_blocking.preparar(driver, resource_blocking.padroes_bloqueio() if self.enxuto else ())
+
+    def _registrar_economia(self):
+        if not self.enxuto:
+            return
+        mensagem = self.economia.descrever()
+        self.resultados.append(f"Modo enxuto: {mensagem}")
+        self._log_to_db("Modo Enxuto", "sucesso", None, mensagem)
+
     def fechar_driver(self):
         step_name = "Fechar Driver"
         if self.driver:
-            self.driver.quit()
+            self.economia.coletar(self.driver)
+            self.cancelamento.remover(self.driver)
+            # Devolve ao pool, que limpa cookies/storage/cache ou recicla o navegador
+            driver_pool.release(self.driver, broken=self.driver_quebrado)
             self.driver = None
             # O log de fechamento do driver será feito no rodar_teste
         else:
             self.resultados.append(f"{step_name}: Driver já estava fechado ou não iniciado.")
             self._log_to_db(step_name, "aviso", None, f"{step_name}: Driver já estava fechado ou não iniciado.")
 
-    def testar_botao(self, elemento):
-        try:
-            inicio = time.time()
-            elemento.click()
-            fim = time.time()
-            tempo = fim - inicio
-            return tempo, None
-        except Exception as e:
+    def _compartilhar_carrinho(self, driver, cookies):
+        # Copia os cookies do navegador principal (incluindo o do carrinho/orderForm) para que
+        # todos os navegadores adicionem itens ao mesmo carrinho. Um arquivo leve da mesma
+        # origem basta para o navegador aceitar os cookies do domínio.
+        partes = urlsplit(self.url)
+        driver.get(f"{partes.scheme}://{partes.netloc}/robots.txt")
+        for cookie in cookies:
             try:
-                inicio = time.time()
-                self.driver.execute_script("arguments[0].click();", elemento)
-                fim = time.time()
-                tempo = fim - inicio
-                self.resultados.append("Tentativa de clique via JavaScript bem-sucedida.")
-                return tempo, None
-            except Exception as js_e:
-                return None, str(e) + " | Erro ao tentar clique JS: " + str(js_e)
-
-    def modo_rapido(self):
-        self._log_progress("Iniciando modo rápido...", 0)
+                driver.add_cookie(cookie)
+            except Exception:
+                pass
+
+    @contextmanager
+    def _navegador_extra(self, cookies):
+        # Navegador do probe_pool com o carrinho do principal, para os passos que o cenário paraleliza
+        with tracing.span('driver_start', 'probe'):
+            driver = probe_pool.acquire()
+        quebrado = False
         try:
-            self.driver.get(self.url)
-            time.sleep(2) 
-
-            step_name = "Aceitar Cookies"
-            try:
-                self.resultados.append(f"{step_name}: Tentando aceitar cookies...")
-                aceitar_cookies_btn = self.driver.find_element(By.XPATH, "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'aceitar')] | //button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept')]")
-                self.driver.execute_script("arguments[0].click();", aceitar_cookies_btn)
-                self.resultados.append("Cookies aceitos com sucesso.")
-                self._log_to_db(step_name, "sucesso", None, "Cookies aceitos com sucesso.")
-                time.sleep(2)
-            except NoSuchElementException:
-                self.resultados.append("Banner de cookies não encontrado ou já processado.")
-                self._log_to_db(step_name, "aviso", None, "Banner de cookies não encontrado ou já processado.")
-            except Exception as e:
-                self.resultados.append(f"Erro ao tentar aceitar cookies: {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro ao tentar aceitar cookies: {e}")
-
-            # Encontra e rola até a seção "Categoria Exemplo"
-            self._log_progress("Rolando para a seção 'Categoria Exemplo'...", 25)
-            step_name = "Rolar para Seção 'Categoria Exemplo'"
-            try:
-                self.resultados.append(f"{step_name}: Tentando rolar...")
-                napas_section_heading = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')] | //h2[contains(text(), 'Categoria Exemplo')]") # Adicionado <p> para maior compatibilidade
-                self.driver.execute_script("arguments[0].scrollIntoView();", napas_section_heading)
-                self.resultados.append("Rolado para a seção 'Categoria Exemplo'.")
-                self._log_to_db(step_name, "sucesso", None, "Rolado para a seção 'Categoria Exemplo'.")
-                time.sleep(2) # Dar tempo para o scroll e elementos carregarem
-            except NoSuchElementException:
-                self.resultados.append("Erro: Seção 'Categoria Exemplo' não encontrada na página inicial.")
-                self._log_to_db(step_name, "falha", None, "Erro: Seção 'Categoria Exemplo' não encontrada na página inicial.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro ao rolar para seção 'Categoria Exemplo': {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro ao rolar para seção 'Categoria Exemplo': {e}")
-                return
-
-            # Clica em um item (produto) dentro da seção "Categoria Exemplo"
-            self._log_progress("Clicando no produto da seção 'Categoria Exemplo'...", 40)
-            step_name = "Clicar Produto Categoria Exemplo"
-            try:
-                self.resultados.append(f"{step_name}: Tentando clicar no produto...")
-                # XPath corrigido para encontrar links de produtos baseados nas classes VTEX e no padrão de URL.
-                produto_napas_link = self.driver.find_element(By.XPATH, "//p[contains(text(), 'Categoria Exemplo')]/ancestor::section[1]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')] | //a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')] ")
-                tempo, erro = self.testar_botao(produto_napas_link)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar no produto da seção Categoria Exemplo: {erro}")
-                    self._log_to_db(step_name, "falha", tempo, f"Erro ao clicar no produto da seção Categoria Exemplo: {erro}")
-                    return
-                self.resultados.append(f"Tempo para acessar produto da seção Categoria Exemplo: {tempo:.2f}s")
-                self._log_to_db(step_name, "sucesso", tempo, f"Produto da seção Categoria Exemplo acessado em {tempo:.2f}s.")
-                time.sleep(2) # Espera a página do produto carregar
-            except NoSuchElementException:
-                self.resultados.append("Erro: Nenhum link de produto encontrado na seção 'Categoria Exemplo'.")
-                self._log_to_db(step_name, "falha", None, "Erro: Nenhum link de produto encontrado na seção 'Categoria Exemplo'.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar no produto da seção Categoria Exemplo: {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro inesperado ao clicar no produto da seção Categoria Exemplo: {e}")
-                return
-
-            self._log_progress("Adicionando produto ao carrinho...", 60)
-            step_name = "Adicionar ao Carrinho"
-            try:
-                self.resultados.append(f"{step_name}: Tentando adicionar produto ao carrinho...")
-                print(f"[DEBUG] URL atual antes de buscar o botão Comprar: {self.driver.current_url}") # DEBUG
-                wait = WebDriverWait(self.driver, 20) # Aumenta o tempo de espera
-                
-                # Primeiro, espera que o elemento esteja presente no DOM, depois que esteja clicável
-                botao_comprar_locator = (By.XPATH, "//button[.//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'comprar')] or .//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to cart')]]")
-                wait.until(EC.presence_of_element_located(botao_comprar_locator))
-                botao_comprar = wait.until(EC.element_to_be_clickable(botao_comprar_locator))
-                tempo, erro = self.testar_botao(botao_comprar)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Comprar' (adicionar ao carrinho): {erro}")
-                    self._log_to_db(step_name, "falha", tempo, f"Erro ao clicar em 'Comprar' (adicionar ao carrinho): {erro}")
-                    return
-                self.resultados.append(f"Tempo para adicionar produto ao carrinho (clicar em Comprar): {tempo:.2f}s")
-                self._log_to_db(step_name, "sucesso", tempo, f"Produto adicionado ao carrinho em {tempo:.2f}s.")
-                time.sleep(3)
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Comprar' não clicável na página do produto.")
-                self._log_to_db(step_name, "falha", None, "Erro de Timeout: Botão 'Comprar' não clicável na página do produto.")
-                return
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Comprar' (adicionar ao carrinho) não encontrado na página do produto.")
-                self._log_to_db(step_name, "falha", None, "Erro: Botão 'Comprar' (adicionar ao carrinho) não encontrado na página do produto.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Comprar': {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro inesperado ao clicar em 'Comprar': {e}")
-                return
-
-            self._log_progress("Finalizando compra...", 90)
-            step_name = "Finalizar Compra"
-            try:
-                self.resultados.append(f"{step_name}: Tentando finalizar compra...")
-                wait = WebDriverWait(self.driver, 10)
-                botao_finalizar_compra = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@id='proceed-to-checkout'] | //button[.//div[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'ir para o checkout')]]")))
-                tempo, erro = self.testar_botao(botao_finalizar_compra)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Finalizar compra' no carrinho: {erro}")
-                    self._log_to_db(step_name, "falha", tempo, f"Erro ao clicar em 'Finalizar compra' no carrinho: {erro}")
-                    return
-                self.resultados.append(f"Tempo para finalizar compra e ir para o checkout: {tempo:.2f}s")
-                self._log_to_db(step_name, "sucesso", tempo, f"Compra finalizada em {tempo:.2f}s.")
-                time.sleep(2)
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho.")
-                self._log_to_db(step_name, "falha", None, "Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho.")
-                return
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Finalizar compra' não encontrado no carrinho.")
-                self._log_to_db(step_name, "falha", None, "Erro: Botão 'Finalizar compra' não encontrado no carrinho.")
-                return
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Finalizar compra': {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro inesperado ao clicar em 'Finalizar compra': {e}")
-                return
-
+            with self.cancelamento.navegador(driver):
+                self._preparar_rede(driver)
+                self._compartilhar_carrinho(driver, cookies)
+                yield driver
+        except WebDriverException:
+            quebrado = True
+            raise
+        finally:
+            self.economia.coletar(driver)
+            probe_pool.release(driver, broken=quebrado)
+
+    def _registrar_passo(self, step, status, response_time, message, metricas=None, wait_time=None):
+        self.resultados.append(message)
+        self._log_to_db(step, status, response_time, message, wait_time=wait_time, metricas=metricas)
+
+    def executar_cenario(self):
+        # Fluxo do modo lido de scenarios/ (o mesmo usado pela interface desktop)
+        contexto = scenario_engine.Contexto(
+            self.url, self.driver, self.waits, self.locators, self._registrar_passo,
+            progresso=lambda message, percentage: self._log_progress(message, percentage),
+            metricas=self._metricas_navegacao, catalogo=product_catalog, navegador_extra=self._navegador_extra,
+            max_extras=probe_pool.max_size, paralelo=self.paralelo, wait_timeouts=self.wait_timeouts,
+            cancelamento=self.cancelamento)
+        scenario_engine.executar(scenario_engine.por_modo(self.modo), contexto)
+
+    def modo_http(self):
+        # Mesmo fluxo do modo rápido por requisições HTTP diretas (sem Chrome), com os mesmos nomes de etapa
+        progresso = {"Acessar Home": 20, "Rolar para Seção 'Categoria Exemplo'": 25, "Clicar Produto Categoria Exemplo": 40,
+                     "Adicionar ao Carrinho": 60, "Finalizar Compra": 90}
+
+        def registrar(step, status, response_time, message, metricas):
+            self._log_progress(message, progresso.get(step, self.progress))
+            self.resultados.append(message)
+            self._log_to_db(step, status, response_time, message, metricas=metricas)
+            self.cancelamento.verificar() # Sem esperas no modo HTTP: para entre as etapas
+
+        self._log_progress("Iniciando modo HTTP...", 0)
+        try:
+            SondaHTTP(self.url, registrar).executar()
+        except session_watchdog.SessaoCancelada:
+            pass # Registrada no fim do rodar_teste
         except Exception as e:
-            self.resultados.append(f"Erro no modo rápido: {e}")
-            self._log_to_db("Modo Rápido", "falha", None, f"Erro no modo rápido: {e}")
+            self.resultados.append(f"Erro no modo HTTP: {e}")
+            self._log_to_db("Modo HTTP", "falha", None, f"Erro no modo HTTP: {e}")
         finally:
-            self._log_progress("Modo rápido concluído.", 100)
-            self._log_to_db("Modo Rápido", "concluido", None, "Modo rápido concluído.")
-
-    def modo_avancado(self):
-        self._log_progress("Iniciando modo avançado...", 0)
-        self._log_to_db("Modo Avançado", "iniciado", None, "Iniciando modo avançado...")
+            self._log_progress("Modo HTTP concluído.", 100)
+            self._log_to_db("Modo HTTP", "concluido", None, "Modo HTTP concluído.")
+
+    def _compra_no_navegador(self, registrar):
+        # Um cliente do modo Carga com navegador: o cenário inteiro num navegador do probe_pool,
+        # que volta limpo ao pool (carrinho novo a cada compra)
+        with tracing.span('driver_start', 'probe'):
+            driver = probe_pool.acquire()
+        quebrado = False
         try:
-            self.driver.get(self.url)
-            time.sleep(2) 
-
-            step_name = "Aceitar Cookies"
-            try:
-                self.resultados.append(f"{step_name}: Tentando aceitar cookies...")
-                aceitar_cookies_btn = self.driver.find_element(By.XPATH, "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'aceitar')] | //button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept')]")
-                self.driver.execute_script("arguments[0].click();", aceitar_cookies_btn)
-                self.resultados.append("Cookies aceitos com sucesso.")
-                self._log_to_db(step_name, "sucesso", None, "Cookies aceitos com sucesso.")
-                time.sleep(2)
-            except NoSuchElementException:
-                self.resultados.append("Banner de cookies não encontrado ou já processado.")
-                self._log_to_db(step_name, "aviso", None, "Banner de cookies não encontrado ou já processado.")
-            except Exception as e:
-                self.resultados.append(f"Erro ao tentar aceitar cookies: {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro ao tentar aceitar cookies: {e}")
-
-            produtos_adicionados = 0
-            urls_produtos_visitados = set()
-
-            while produtos_adicionados < 10:
-                self._log_progress(f"Adicionando produto {produtos_adicionados + 1} de 10...", produtos_adicionados * 9)
-                current_product_step_name = f"Adicionar Produto {produtos_adicionados + 1} de 10"
-                try:
-                    elementos_slider_links = self.driver.find_elements(By.XPATH, "//section[.//p[contains(@class, 'vtex-rich-text')] or .//h2]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]")
-                    elementos_nao_visitados = [el for el in elementos_slider_links if el.get_attribute('href') not in urls_produtos_visitados]
-
-                    if not elementos_nao_visitados:
-                        self.resultados.append("Aviso: Não há mais produtos novos em sliders na home. Tentando recarregar a página...")
-                        self._log_to_db(current_product_step_name, "aviso", None, "Não há mais produtos novos em sliders na home. Tentando recarregar a página...")
-                        self.driver.get(self.url) # Recarrega a homepage
-                        time.sleep(3) # Espera a página carregar
-                        # Tenta encontrar produtos novamente após recarregar
-                        elementos_slider_links = self.driver.find_elements(By.XPATH, "//section[.//p[contains(@class, 'vtex-rich-text')] or .//h2]//a[contains(@class, 'vtex-product-summary-2-x-clearLink') and contains(@href, '/p')]")
-                        elementos_nao_visitados = [el for el in elementos_slider_links if el.get_attribute('href') not in urls_produtos_visitados]
-                        if not elementos_nao_visitados: # Se ainda não encontrar, então não há mais produtos
-                            self.resultados.append("Não há mais produtos novos mesmo após recarregar a página.")
-                            self._log_to_db(current_product_step_name, "aviso", None, "Não há mais produtos novos mesmo após recarregar a página.")
-                            break # Sai do loop se não encontrar novos produtos após recarregar
-                        else:
-                            continue # Continua o loop para processar os novos produtos encontrados
-                    
-                    produto_link = elementos_nao_visitados[0]
-                    produto_url = produto_link.get_attribute('href')
-                    urls_produtos_visitados.add(produto_url)
-
-                    self.driver.execute_script("arguments[0].scrollIntoView();", produto_link)
-                    tempo, erro = self.testar_botao(produto_link)
-                    if erro:
-                        self.resultados.append(f"Erro ao clicar no produto: {erro}")
-                        self._log_to_db(current_product_step_name, "falha", tempo, f"Erro ao clicar no produto: {erro}")
-                        continue
-                    self.resultados.append(f"Tempo para acessar produto {produtos_adicionados+1}: {tempo:.2f}s")
-                    self._log_to_db(current_product_step_name, "sucesso", tempo, f"Produto {produtos_adicionados+1} acessado em {tempo:.2f}s.")
-                    time.sleep(2)
-
-                    try:
-                        add_to_cart_step_name = f"Adicionar Produto {produtos_adicionados+1} ao Carrinho"
-                        wait = WebDriverWait(self.driver, 20) # Aumenta o tempo de espera
-                        print(f"[DEBUG - Modo Avançado] URL atual antes de buscar o botão Comprar: {self.driver.current_url}") # DEBUG
-                        
-                        # Primeiro, espera que o elemento esteja presente no DOM, depois que esteja clicável
-                        botao_comprar_locator = (By.XPATH, "//button[.//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'comprar')] or .//span[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to cart')]]")
-                        wait.until(EC.presence_of_element_located(botao_comprar_locator))
-                        botao_comprar = wait.until(EC.element_to_be_clickable(botao_comprar_locator))
-                        
-                        tempo_comprar, erro_comprar = self.testar_botao(botao_comprar)
-                        if erro_comprar:
-                            self.resultados.append(f"Erro ao clicar em 'Comprar' para adicionar ao carrinho: {erro_comprar}")
-                            self._log_to_db(add_to_cart_step_name, "falha", tempo_comprar, f"Erro ao clicar em 'Comprar' para adicionar ao carrinho: {erro_comprar}")
-                        else:
-                            self.resultados.append(f"Tempo para adicionar produto {produtos_adicionados+1} ao carrinho: {tempo_comprar:.2f}s")
-                            self._log_to_db(add_to_cart_step_name, "sucesso", tempo_comprar, f"Produto {produtos_adicionados+1} adicionado ao carrinho em {tempo_comprar:.2f}s.")
-                            produtos_adicionados += 1
-                            self._log_progress(f"Produto {produtos_adicionados} adicionado ao carrinho.", produtos_adicionados * 9)
-
-                        time.sleep(3)
-
-                    except TimeoutException:
-                        self.resultados.append(f"Erro de Timeout: Botão 'Comprar' não clicável na página do produto {produto_url}.")
-                        self._log_to_db(add_to_cart_step_name, "falha", None, f"Erro de Timeout: Botão 'Comprar' não clicável na página do produto {produto_url}.")
-                    except NoSuchElementException:
-                        self.resultados.append(f"Erro: Botão 'Comprar' não encontrado na página do produto {produto_url}.")
-                        self._log_to_db(add_to_cart_step_name, "falha", None, f"Erro: Botão 'Comprar' não encontrado na página do produto {produto_url}.")
-                    except Exception as e:
-                        self.resultados.append(f"Erro inesperado ao adicionar ao carrinho para {produto_url}: {e}")
-                        self._log_to_db(add_to_cart_step_name, "falha", None, f"Erro inesperado ao adicionar ao carrinho para {produto_url}: {e}")
-
-                except Exception as e:
-                    self.resultados.append(f"Erro ao processar produto no modo avançado: {e}")
-                    self._log_to_db(current_product_step_name, "falha", None, f"Erro ao processar produto no modo avançado: {e}")
-                    self.driver.get(self.url)
-                    time.sleep(3)
-                    
-            if produtos_adicionados == 0:
-                self.resultados.append("Nenhum produto foi adicionado ao carrinho no modo avançado.")
-                self._log_to_db("Modo Avançado", "aviso", None, "Nenhum produto foi adicionado ao carrinho no modo avançado.")
-                self._log_progress("Modo avançado concluído (sem produtos adicionados).", 100)
-                return
-
-            self._log_progress("Finalizando compra...", 95)
-            step_name = "Finalizar Compra (Modo Avançado)"
-            try:
-                self.resultados.append(f"{step_name}: Tentando finalizar compra...")
-                wait = WebDriverWait(self.driver, 10)
-                botao_finalizar_compra = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@id='proceed-to-checkout'] | //button[.//div[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'ir para o checkout')]]")))
-                tempo, erro = self.testar_botao(botao_finalizar_compra)
-                if erro:
-                    self.resultados.append(f"Erro ao clicar em 'Finalizar compra' no carrinho (modo avançado): {erro}")
-                    self._log_to_db(step_name, "falha", tempo, f"Erro ao clicar em 'Finalizar compra' no carrinho (modo avançado): {erro}")
-                    return
-                self.resultados.append(f"Tempo para finalizar compra e ir para o checkout com {produtos_adicionados} itens: {tempo:.2f}s")
-                self._log_to_db(step_name, "sucesso", tempo, f"Compra finalizada em {tempo:.2f}s com {produtos_adicionados} itens.")
-                time.sleep(2)
-            except TimeoutException:
-                self.resultados.append("Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho (modo avançado).")
-                self._log_to_db(step_name, "falha", None, "Erro de Timeout: Botão 'Finalizar compra' não clicável no carrinho (modo avançado).")
-            except NoSuchElementException:
-                self.resultados.append("Erro: Botão 'Finalizar compra' não encontrado no carrinho (modo avançado).")
-                self._log_to_db(step_name, "falha", None, "Erro: Botão 'Finalizar compra' não encontrado no carrinho (modo avançado).")
-            except Exception as e:
-                self.resultados.append(f"Erro inesperado ao clicar em 'Finalizar compra' (modo avançado): {e}")
-                self._log_to_db(step_name, "falha", None, f"Erro inesperado ao clicar em 'Finalizar compra' (modo avançado): {e}")
+            with self.cancelamento.navegador(driver):
+                self._preparar_rede(driver)
+                waits = WaitEngine(driver, self.wait_timeouts, cancelamento=self.cancelamento)
+                contexto = scenario_engine.Contexto(self.url, driver, waits, self.locators, registrar,
+                                                    metricas=self._metricas_navegacao, catalogo=product_catalog,
+                                                    wait_timeouts=self.wait_timeouts, cancelamento=self.cancelamento)
+                scenario_engine.executar(scenario_engine.por_modo(load_test.CENARIO_NAVEGADOR), contexto)
+        except WebDriverException:
+            quebrado = True
+            raise
         finally:
-            self._log_progress("Modo avançado concluído.", 100)
-            self._log_to_db("Modo Avançado", "concluido", None, "Modo avançado concluído.")
+            self.economia.coletar(driver)
+            probe_pool.release(driver, broken=quebrado)
+
+    def _publicar_carga(self, resumo):
+        # Sobrescrito pela interface web para guardar o resumo parcial na sessão
+        pass
+
+    def modo_carga(self):
+        def registrar(step, status, response_time, message, metricas):
+            self._log_to_db(step, status, response_time, message, metricas=metricas, evento=False)
+
+        teste = load_test.TesteCarga(self.url, self.carga, registrar, publicar=self._publicar_carga,
+                                     progresso=lambda message, percentage: self._log_progress(message, percentage),
+                                     fluxo_navegador=self._compra_no_navegador)
+        self.cancelamento.ao_cancelar(teste.parar) # Os clientes saem e o resumo parcial vira o resultado
+        self._log_progress("Iniciando teste de carga...", 0)
+        try:
+            resumo = teste.executar()
+            status, mensagem = teste.resultado(resumo)
+        except Exception as e:
+            status, mensagem = "falha", f"Erro no teste de carga: {e}"
+        self.resultados.append(mensagem)
+        self._log_to_db("Teste de Carga", status, None, mensagem)
+        self._log_progress("Teste de carga concluído.", 100)
+
+    def _registrar_cancelamento(self):
+        if not self.cancelamento.cancelado():
+            return
+        mensagem = f"Execução interrompida: {self.cancelamento.motivo}."
+        self.resultados.append(mensagem)
+        self._log_to_db("Execução Cancelada", "cancelado", None, mensagem)
 
     def rodar_teste(self):
         self.resultados.clear()
         self.progress = 0
+        if self.cancelamento.cancelado(): # Parada pedida enquanto a sessão estava na fila
+            self._registrar_cancelamento()
+            log_writer.flush()
+            return
+        if self.modo == "Carga":
+            # Os navegadores dos clientes vêm do probe_pool; o pool principal não é usado
+            try:
+                self.modo_carga()
+            finally:
+                self._registrar_economia()
+                self._registrar_cancelamento()
+                log_writer.flush()
+            return
+        if self.modo == "HTTP":
+            # Sem navegador: não há driver para emprestar nem devolver ao pool
+            try:
+                self.modo_http()
+            finally:
+                self._registrar_cancelamento()
+                log_writer.flush()
+            return
         self._log_progress("Iniciando driver...", 5)
         # O log de "Iniciar Driver" já é feito dentro de iniciar_driver()
         if not self.iniciar_driver():
@@ -407,11 +364,11 @@ class SiteQATester:
             return
         try:
             # Removido o log duplicado, o progresso inicial será gerado pelo web_progress_callback
-            if self.modo == "Rápida":
-                self.modo_rapido()
-            else:
-                self.modo_avancado()
+            self.executar_cenario()
+        except session_watchdog.SessaoCancelada:
+            pass # Registrada abaixo, depois de devolvido o navegador
         except WebDriverException as e:
+            self.driver_quebrado = True
             self.resultados.append(f"Erro de WebDriver: {e}")
             self._log_to_db("Execução do Teste", "falha", None, f"Erro de WebDriver: {e}")
         except Exception as e:
@@ -419,91 +376,537 @@ class SiteQATester:
             self._log_to_db("Execução do Teste", "falha", None, f"Erro inesperado: {e}")
         finally:
             self.fechar_driver()
+            self._registrar_economia()
+            self._registrar_cancelamento()
             self._log_progress("Driver fechado.", 100)
             self._log_to_db("Fechar Driver", "concluido", None, "Driver fechado.")
+            log_writer.flush() # Garante que o histórico da execução esteja no banco ao terminar
 
 # --- Configuração do Flask ---
 app = Flask(__name__)
-# Armazenamento temporário para resultados de testes em andamento
-# Em produção, usaria um banco de dados ou sistema de cache (Redis)
-test_sessions = {}
-session_lock = threading.Lock()
-init_db() # Inicializa o banco de dados na inicialização da aplicação
+def carregar_sessao_do_banco(session_id):
+    # Sessões que já saíram da memória: o resumo é reconstruído a partir das linhas gravadas.
+    # Cada _log_to_db com evento gera um evento e uma linha, então a posição da linha é o seq do evento.
+    # As etapas dos clientes do modo Carga (prefixo "Carga: ") só vão para o banco e ficam de fora;
+    # no lugar delas volta o resumo do teste de carga guardado em `sessions`.
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT mode, url, started_at, ended_at, status, load_summary FROM sessions WHERE session_key = %s",
+                           (session_id,))
+            sessao = cursor.fetchone()
+            cursor.execute(f"SELECT {', '.join(LOG_COLUMNS[2:])} FROM logs_testeSite WHERE session_id = %s AND step NOT LIKE %s "
+                           "ORDER BY id", (session_id, load_test.PREFIXO_ETAPA + '%'))
+            linhas = cursor.fetchall()
+    except Exception as e:
+        print(f"Aviso: não foi possível ler a sessão {session_id} do banco: {e}")
+        return None
+    if not linhas:
+        return None
+    eventos = []
+    for seq, linha in enumerate(linhas, 1):
+        evento = dict(linha, seq=seq)
+        evento['timestamp'] = linha['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        evento['artifacts'] = json.loads(linha['artifacts']) if linha.get('artifacts') else None
+        eventos.append(evento)
+    sessao = sessao or {}
+    inicio = time.mktime((sessao.get('started_at') or linhas[0]['timestamp']).timetuple())
+    fim = time.mktime((sessao.get('ended_at') or linhas[-1]['timestamp']).timetuple())
+    resumo = resumir_sessao({'status': 'completed', 'progress': 100, 'start_time': inicio, 'end_time': fim}, eventos, CAMPOS_OPCIONAIS)
+    resumo.update({'mode': sessao.get('mode'), 'url': sessao.get('url'), 'result': sessao.get('status'),
+                   'load': json.loads(sessao['load_summary']) if sessao.get('load_summary') else None})
+    return resumo
+
+def registrar_sessao_db(url, modo):
+    # Cria a linha da sessão; o id auto-incremento numera a sessão (TestandoSite_<id>).
+    # Sem banco, o teste ainda roda com um id aleatório e sem a referência nos logs.
+    if not db_pronto.is_set(): # Nem tenta conectar enquanto a inicialização não termina
+        print("Aviso: banco ainda não inicializado; sessão sem registro no banco.")
+        return f"TestandoSite_{uuid.uuid4().hex[:12]}", None
+    try:
+        with tracing.span('db_write', 'sessions'), get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO sessions (session_key, mode, url, status) VALUES (%s, %s, %s, 'queued')",
+                           (f"pendente_{uuid.uuid4().hex}", modo, url))
+            session_ref = cursor.lastrowid
+            session_id = f"TestandoSite_{session_ref}"
+            cursor.execute("UPDATE sessions SET session_key = %s WHERE id = %s", (session_id, session_ref))
+            conn.commit()
+        return session_id, session_ref
+    except Exception as e:
+        print(f"Aviso: não foi possível registrar a sessão no banco: {e}")
+        return f"TestandoSite_{uuid.uuid4().hex[:12]}", None
+
+def atualizar_sessao_db(session_ref, status, inicio=None, fim=None, carga=None):
+    if session_ref is None:
+        return
+    campos, valores = ["status = %s"], [status]
+    for coluna, instante in (('started_at', inicio), ('ended_at', fim)):
+        if instante is not None:
+            campos.append(f"{coluna} = %s")
+            valores.append(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(instante)))
+    if carga is not None:
+        campos.append("load_summary = %s")
+        valores.append(json.dumps(carga))
+    try:
+        with tracing.span('db_write', 'sessions'), get_db_connection() as conn:
+            conn.cursor().execute(f"UPDATE sessions SET {', '.join(campos)} WHERE id = %s", valores + [session_ref])
+            conn.commit()
+    except Exception as e:
+        print(f"Aviso: não foi possível atualizar a sessão {session_ref} no banco: {e}")
+
+def resultado_final(etapas):
+    # Status gravado em `sessions`: falha se alguma etapa falhou, aviso se houve avisos
+    status = {etapa['status'] for etapa in etapas}
+    if 'cancelado' in status:
+        return 'cancelado'
+    if 'falha' in status:
+        return 'falha'
+    return 'aviso' if 'aviso' in status else 'sucesso'
+
+# Com QA_SHARED_STATE (caminho de um arquivo SQLite), sessões, eventos e fila ficam no arquivo e
+# valem para todos os processos: qualquer worker do gunicorn atende /start_test e /status, e os
+# testes rodam nos processos `qa_worker.py`. Sem ela, tudo fica em memória neste processo.
+shared_state = SharedState(os.environ['QA_SHARED_STATE']) if os.environ.get('QA_SHARED_STATE') else None
+
+# Sessões: as em andamento ficam inteiras; as encerradas viram um resumo que expira
+# (QA_SESSION_TTL) ou sai pelo limite de QA_MAX_SESSIONS, e depois disso o /status lê do banco
+limites_sessoes = dict(max_sessions=int(os.environ.get('QA_MAX_SESSIONS', 500)),
+                       ttl=int(os.environ.get('QA_SESSION_TTL', 3600)),
+                       loader=carregar_sessao_do_banco)
+if shared_state:
+    test_sessions = SharedSessionStore(shared_state, **limites_sessoes)
+    job_queue = SharedJobQueue(shared_state, max_workers=MAX_WORKERS, max_queue=MAX_QUEUE, sessions=test_sessions)
+else:
+    test_sessions = SessionStore(**limites_sessoes)
+    job_queue = JobQueue(max_workers=MAX_WORKERS, max_queue=MAX_QUEUE)
+
+# Tempo limite das execuções (QA_SESSION_MAX_SECONDS) e navegadores que não param depois do /stop.
+# O pedido de parada fica na sessão: no modo compartilhado é assim que chega ao qa_worker.py que executa
+watchdog = session_watchdog.Watchdog(pedido_externo=lambda session_id: (test_sessions.get(session_id) or {}).get('stop_requested'))
+
+# Migrações e agendador de monitores sobem numa thread, depois do import: o Flask já atende (e o
+# /healthz responde) enquanto o MySQL conecta, e um banco lento ou fora do ar não trava cada worker
+# do gunicorn. Os testes esperam o banco por até QA_DB_INIT_WAIT segundos antes de rodar sem ele.
+ESPERA_DB = float(os.environ.get('QA_DB_INIT_WAIT', 30))
+db_pronto = threading.Event()
+inicializacao = {'db': 'pending', 'db_error': None, 'db_attempts': 0, 'db_ready_s': None,
+                 'schema_version': None, 'import_s': None}
+
+def _inicializar_em_segundo_plano():
+    espera = 1
+    while True:
+        inicializacao['db_attempts'] += 1
+        try:
+            versao = init_db() # Só um processo migra por vez
+        except Exception as e:
+            inicializacao.update(db='error', db_error=str(e))
+            print(f"[init_db] Banco indisponível ({e}); nova tentativa em {espera}s.")
+            time.sleep(espera)
+            espera = min(espera * 2, 60)
+            continue
+        inicializacao.update(db='ready', db_error=None, schema_version=versao,
+                             db_ready_s=round(time.perf_counter() - _INICIO_IMPORT, 3))
+        db_pronto.set()
+        break
+    # Retoma os monitores salvos, inclusive os horários perdidos enquanto o servidor estava parado. Com vários
+    # processos, só o que obtiver o lock do MySQL dispara; os outros assumem se ele cair
+    monitor_scheduler.start_when_leader(LeaderLock(get_db_connection))
+
+if not shared_state: # No modo compartilhado os navegadores ficam nos processos qa_worker.py
+    driver_pool.prewarm(int(os.environ.get('QA_DRIVER_POOL_WARM', 1))) # Deixa navegadores prontos para a primeira execução
+
+def novo_event_log(session_id):
+    return SharedEventLog(shared_state, session_id) if shared_state else SessionEventLog()
+
+def modos_disponiveis():
+    # Um modo por cenário de scenarios/ (Rápida, Avançada e os adicionados depois) mais o modo HTTP.
+    # O modo Carga só é aceito pelo /start_test: não faz sentido agendá-lo num monitor.
+    return tuple(scenario_engine.cenarios()) + ("HTTP",)
+
+MONITOR_MIN_INTERVAL = int(os.environ.get('QA_MONITOR_MIN_INTERVAL', 60))
+MONITOR_JITTER = int(os.environ.get('QA_MONITOR_JITTER', 30))
+
+def sessao_ativa(session_id):
+    # Na fila ou rodando; sessões que já saíram da memória (ou de antes de um reinício) terminaram
+    if session_id not in test_sessions:
+        return False
+    dados = test_sessions.get(session_id)
+    return bool(dados) and not dados.get('finished')
+
+def disparar_monitor(monitor):
+    # Mesmo caminho do /start_test; QueueFull sobe para o scheduler, que trata o horário como perdido
+    session_id = criar_sessao(monitor['url'], monitor['mode'], monitor['parallel'])
+    enfileirar_sessao(session_id)
+    print(f"[monitor] Monitor {monitor['id']} disparou a sessão {session_id} ({monitor['url']})")
+    return session_id
+
+# Uma thread para todos os sites monitorados (ver monitor_scheduler.py); os agendamentos ficam na tabela `monitors`
+monitor_scheduler = MonitorScheduler(MonitorStore(get_db_connection), disparar_monitor, sessao_ativa,
+                                     max_catch_up=int(os.environ.get('QA_MONITOR_MAX_CATCH_UP', 3)))
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # Cenários além dos modos fixos da página, com as etapas esperadas de cada um
+    extras = {modo: [{'name': passo.nome, 'display': passo.nome, 'showResponseTime': passo.mede_tempo}
+                     for passo in cenario.passos if not passo.acao.autorregistro]
+              for modo, cenario in scenario_engine.cenarios().items() if modo not in ("Rápida", "Avançada")}
+    return render_template('index.html', cenarios_extras=extras)
+
+def criar_sessao(url, modo, paralelo=1, enxuto=False, carga=None):
+    session_id, session_ref = registrar_sessao_db(url, modo)
+    print(f"[start_test] Gerado session_id: {session_id}")
+
+    # Só dados simples (e o log de eventos): o SiteQATester é criado por quem executar a sessão,
+    # que no modo compartilhado é outro processo
+    test_sessions.add(session_id, {
+        'url': url,
+        'mode': modo,
+        'parallel': paralelo,
+        'lean': enxuto,
+        'load_config': carga,
+        'load': None, # Resumo do modo Carga, atualizado a cada janela
+        'session_ref': session_ref,
+        'status': 'queued',
+        'events': novo_event_log(session_id),
+        'progress': 0,
+        'queued_at': time.time(),
+        'queue_wait': None,
+        'start_time': None,
+        'end_time': None
+    })
+    return session_id
+
+def executar_sessao(session_id, espera_fila):
+    current_session = test_sessions.get(session_id)
+    if current_session is None or current_session.get('finished'):
+        print(f"[job_queue] Sessão {session_id} não está mais na fila; ignorando.")
+        return
+    if not db_pronto.wait(ESPERA_DB):
+        print(f"[init_db] Banco ainda indisponível após {ESPERA_DB:.0f}s; a sessão {session_id} roda sem garantia de gravar os logs.")
+    local_tester = SiteQATester(current_session['url'], current_session['mode'], session_id=session_id,
+                                paralelo=current_session['parallel'], session_ref=current_session['session_ref'],
+                                events=current_session['events'], enxuto=current_session.get('lean', False),
+                                carga=current_session.get('load_config'))
+
+    def atualizar(**campos):
+        # current_session pode ser uma cópia (modo compartilhado); o store recebe a mesma alteração
+        current_session.update(campos)
+        test_sessions.update(session_id, **campos)
+
+    atualizar(status='running', queue_wait=espera_fila, start_time=time.time())
+    atualizar_sessao_db(local_tester.session_ref, 'running', inicio=current_session['start_time'])
+    if current_session.get('stop_requested'): # Parada pedida enquanto a sessão estava na fila
+        local_tester.cancelamento.cancelar(current_session['stop_requested'])
+    limite = watchdog.limite
+    if local_tester.carga: # O teste de carga dura o que foi configurado, além do limite normal
+        limite += local_tester.carga['ramp_up'] + local_tester.carga['hold'] + local_tester.carga['ramp_down']
+
+    def web_progress_callback(message, percentage):
+        atualizar(progress=percentage)
+        # Não imprima aqui, pois o log já é feito no _log_to_db que é chamado logo em seguida
+
+        # Logar a mensagem de progresso no banco de dados como um passo intermediário.
+        # O evento também vai para o log em memória da sessão, então não é preciso reler o banco.
+        local_tester._log_to_db(step=message, status="em_progresso", message=message, response_time=None, error_message=None)
+
+    local_tester._log_progress = web_progress_callback # Sobrescreve o método de log para usar o callback da web
+    local_tester._publicar_carga = lambda resumo: atualizar(load=resumo) # Lido pelo /status e pelo /events
+
+    # A espera na fila vai em uma etapa própria (coluna wait_time), separada dos tempos da execução
+    local_tester._log_to_db("Fila de Espera", "sucesso", None, f"Aguardou {espera_fila:.2f}s na fila.", wait_time=espera_fila)
+    try:
+        with tracing.em_trace(local_tester.trace), watchdog.vigiar(session_id, local_tester.cancelamento, limite):
+            local_tester.rodar_teste()
+    finally:
+        atualizar(status='completed', end_time=time.time())
+        local_tester.events.close() # Encerra os streams SSE abertos para a sessão
+        # Libera o tester (resultados, driver, log de eventos) e guarda só o resumo da execução
+        resumo = resumir_sessao(current_session, local_tester.events.since(0), CAMPOS_OPCIONAIS)
+        resumo.update({'mode': local_tester.modo, 'url': local_tester.url, 'result': resultado_final(resumo['steps']),
+                       'spans': local_tester.trace.resumo(), 'lean': local_tester.enxuto,
+                       'network': local_tester.economia.resumo(), 'load': current_session.get('load')})
+        test_sessions.finish(session_id, resumo)
+        atualizar_sessao_db(local_tester.session_ref, resumo['result'], fim=current_session['end_time'], carga=resumo.get('load'))
+
+def enfileirar_sessao(session_id):
+    # Executa em um dos workers do job_queue; sem vaga na fila, a sessão é descartada
+    try:
+        return job_queue.submit(session_id, lambda espera_fila: executar_sessao(session_id, espera_fila))
+    except QueueFull:
+        sessao = test_sessions.pop(session_id)
+        if sessao:
+            atualizar_sessao_db(sessao['session_ref'], 'rejected')
+        raise
+
+def _resumo_progresso(session_id, session_data):
+    resumo = {'status': session_data['status'], 'progress': session_data['progress']}
+    if session_data['status'] == 'queued':
+        resumo['queue_position'] = job_queue.position(session_id)
+        inicio_previsto = job_queue.estimated_start(session_id)
+        if inicio_previsto is not None:
+            resumo['estimated_start'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(inicio_previsto))
+            resumo['estimated_start_in'] = round(max(0, inicio_previsto - time.time()), 1)
+    if session_data.get('load'):
+        resumo['load'] = session_data['load'] # Modo Carga: estatísticas por etapa e por janela
+    if session_data.get('stop_requested') and not session_data.get('finished'):
+        resumo['stopping'] = True
+    return resumo
 
 @app.route('/start_test', methods=['POST'])
 def start_test():
-    with session_lock:
-        global session_counter
-        session_counter += 1
-        session_id = f"TestandoSite_{session_counter}"
-    print(f"[start_test] Gerado session_id: {session_id}")
-
     data = request.get_json() # Pega os dados JSON da requisição
 
     url = data['url']
     modo = data['modo']
-    
-    # Criar uma nova instância do SiteQATester para esta sessão
-    tester = SiteQATester(url, modo, session_id=session_id)
-    
-    # Armazenar o objeto tester (e, portanto, os resultados e progresso) por session_id
-    test_sessions[session_id] = {
-        'tester': tester,
-        'status': 'running',
-        'results': [],
-        'progress': 0,
-        'start_time': time.time(),
-        'end_time': None
-    }
-
-    def run_test_in_background():
-        local_tester = test_sessions[session_id]['tester']
-        def web_progress_callback(message, percentage):
-            current_session = test_sessions[session_id]
-            current_session['progress'] = percentage
-            # Não imprima aqui, pois o log já é feito no _log_to_db que é chamado logo em seguida
-            
-            # Logar a mensagem de progresso no banco de dados como um passo intermediário
-            local_tester._log_to_db(step=message, status="em_progresso", message=message, response_time=None, error_message=None)
-            
-            # Buscar os logs mais recentes do banco de dados para a sessão
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT step, status, response_time, error_message, message FROM logs_testeSite WHERE session_id = %s ORDER BY timestamp ASC", (session_id,))
-                current_session['results'] = [dict(row) for row in cursor.fetchall()]
-            print(f"[web_progress_callback] Logs recebidos para {session_id}: {current_session['results']}") # DEBUG
-        
-        local_tester._log_progress = web_progress_callback # Sobrescreve o método de log para usar o callback da web
-        
-        local_tester.rodar_teste()
-        
-        test_sessions[session_id]['status'] = 'completed'
-        test_sessions[session_id]['end_time'] = time.time()
-
-    # Iniciar o teste em uma thread separada para não bloquear a requisição web
-    thread = threading.Thread(target=run_test_in_background)
-    thread.daemon = True # Permite que a thread termine com a aplicação principal
-    thread.start()
-
-    return jsonify({'status': 'Test initiated', 'session_id': session_id})
+    paralelo = max(1, int(data.get('paralelo', 1)))
+    enxuto = bool(data.get('enxuto', False))
+    if modo not in modos_disponiveis() + ("Carga",):
+        return jsonify({'error': f"modo deve ser um de: {', '.join(modos_disponiveis() + ('Carga',))}"}), 400
+    carga = None
+    if modo == "Carga":
+        try:
+            carga = load_test.validar_config(data.get('carga'), probe_pool.max_size)
+        except ValueError as e:
+            return jsonify({'error': f"carga: {e}"}), 400
+
+    session_id = criar_sessao(url, modo, paralelo, enxuto, carga)
+    try:
+        posicao = enfileirar_sessao(session_id)
+    except QueueFull as e:
+        # Backpressure: o cliente deve tentar de novo depois, em vez de abrir mais um navegador
+        resposta = jsonify({'error': 'Fila de testes cheia. Tente novamente mais tarde.', 'retry_after': e.retry_after})
+        resposta.headers['Retry-After'] = str(e.retry_after)
+        return resposta, 429
+
+    return jsonify({'status': 'Test initiated', 'session_id': session_id, 'queue_position': posicao})
 
 @app.route('/status/<session_id>')
 def test_status(session_id):
     session_data = test_sessions.get(session_id)
     if not session_data:
         return jsonify({'error': 'Session not found'}), 404
-    
-    print(f"[test_status] Retornando status para {session_id}, Progress: {session_data['progress']}%, Results count: {len(session_data['results'])}")
-    # Retornar uma cópia dos resultados para evitar modificações enquanto a thread está rodando
-    return jsonify({
-        'status': session_data['status'],
-        'progress': session_data['progress'],
-        'results': session_data['results']
-    })
+
+    # ?since=<seq> devolve apenas os eventos posteriores ao último seq que o cliente já tem
+    since = request.args.get('since', default=0, type=int)
+    if session_data.get('finished'):
+        results = [etapa for etapa in session_data['steps'] if etapa['seq'] > since]
+    else:
+        results = session_data['events'].since(since)
+    resposta = _resumo_progresso(session_id, session_data)
+    resposta['results'] = results
+    resposta['last_seq'] = results[-1]['seq'] if results else max(since, 0)
+    if session_data.get('finished'):
+        resposta['duration'] = session_data['duration']
+        resposta['result'] = session_data.get('result')
+        resposta['spans'] = session_data.get('spans') # Tempo por operação (driver, esperas, buscas, banco)
+        resposta['network'] = session_data.get('network') # Requisições carregadas e bloqueadas (modo enxuto)
+    return jsonify(resposta)
+
+@app.route('/stop/<session_id>', methods=['POST'])
+def stop_test(session_id):
+    session_data = test_sessions.get(session_id)
+    if not session_data:
+        return jsonify({'error': 'Session not found'}), 404
+    if session_data.get('finished'):
+        return jsonify({'error': 'Sessão já encerrada.', 'result': session_data.get('result')}), 409
+    motivo = "parada solicitada pelo usuário"
+    test_sessions.update(session_id, stop_requested=motivo)
+    # Rodando neste processo, para já; senão o vigia de quem executa lê o pedido na sessão (ou ao sair da fila)
+    watchdog.parar(session_id, motivo)
+    return jsonify({'status': 'stopping', 'session_id': session_id}), 202
+
+@app.route('/healthz')
+def healthz():
+    # Não toca no banco nem nos navegadores: só o estado da inicialização em segundo plano
+    pronto = db_pronto.is_set()
+    return jsonify(dict(inicializacao, status='ready' if pronto else 'starting',
+                        uptime_s=round(time.perf_counter() - _INICIO_IMPORT, 3))), 200 if pronto else 503
+
+@app.route('/stats')
+def stats():
+    return jsonify({'log_writer': log_writer.stats(), 'driver_pool': driver_pool.stats(), 'job_queue': job_queue.stats(),
+                    'http_pool': http_pool.stats(), 'locators': locator_registry.stats(),
+                    'product_catalog': product_catalog.stats(), 'sessions': test_sessions.stats(),
+                    'monitors': monitor_scheduler.stats(), 'artifacts': artifact_store.stats(), 'watchdog': watchdog.stats()})
+
+def _por_rotulo(nome, valores):
+    return {((nome, chave),): valor for chave, valor in valores.items()}
+
+# Estado lido na hora de cada /metrics (os histogramas de spans são alimentados durante as execuções)
+tracing.registry.gauge('qa_browsers', lambda: {
+    (('pool', 'main'), ('state', 'idle')): driver_pool.stats()['idle'],
+    (('pool', 'main'), ('state', 'in_use')): driver_pool.stats()['in_use'],
+    (('pool', 'probe'), ('state', 'idle')): probe_pool.stats()['idle'],
+    (('pool', 'probe'), ('state', 'in_use')): probe_pool.stats()['in_use'],
+}, "Navegadores abertos neste processo, por pool e estado")
+tracing.registry.gauge('qa_jobs', lambda: _por_rotulo('state', {estado: job_queue.stats()[estado] for estado in ('queued', 'running')}),
+                       "Testes aguardando na fila e em execução")
+tracing.registry.gauge('qa_jobs_rejected_total', lambda: job_queue.stats()['rejected'], "Testes recusados com a fila cheia", tipo='counter')
+tracing.registry.gauge('qa_sessions_active', lambda: test_sessions.stats()['active'], "Sessões na fila ou rodando")
+tracing.registry.gauge('qa_db_rows_written_total', lambda: log_writer.stats()['rows_written'], "Linhas gravadas em logs_testeSite", tipo='counter')
+tracing.registry.gauge('qa_db_rows_dropped_total', lambda: log_writer.stats()['rows_dropped'], "Linhas de log descartadas", tipo='counter')
+tracing.registry.gauge('qa_db_write_queue', lambda: log_writer.stats()['queue_depth'], "Linhas de log aguardando gravação")
+tracing.registry.gauge('qa_artifacts_bytes', lambda: artifact_store.stats()['bytes'], "Bytes em disco dos artefatos de falha")
+tracing.registry.gauge('qa_sessions_cancelled_total', lambda: _por_rotulo('reason', {'stop': watchdog.stats()['stopped'],
+                                                                                   'timeout': watchdog.stats()['timed_out']}),
+                       "Execuções interrompidas pelo /stop ou pelo tempo limite", tipo='counter')
+tracing.registry.gauge('qa_browsers_killed_total', lambda: watchdog.stats()['browsers_killed'],
+                       "Navegadores encerrados pelo vigia por não pararem a tempo", tipo='counter')
+tracing.registry.gauge('qa_driver_launches_total', lambda: driver_pool.stats()['launches'] + probe_pool.stats()['launches'],
+                       "Navegadores iniciados", tipo='counter')
+
+@app.route('/metrics')
+def metrics():
+    # Formato texto do Prometheus; a latência das gravações no banco está em qa_span_seconds{span="db_write"}
+    return Response(tracing.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/artifacts/<nome>')
+def artefato(nome):
+    # Links das etapas com falha no /status; o nome é o hash do conteúdo, então o arquivo nunca muda
+    encontrado = artifact_store.caminho(nome)
+    if encontrado is None:
+        return jsonify({'error': 'Artifact not found (removed by the retention budget?)'}), 404
+    arquivo, mimetype, comprimido = encontrado
+    resposta = send_file(arquivo, mimetype=mimetype, max_age=7 * 24 * 3600)
+    if comprimido:
+        resposta.headers['Content-Encoding'] = 'gzip' # Gravado em gzip; o navegador descomprime
+    return resposta
+
+def _validar_monitor(data, parcial=False):
+    # Retorna (campos, erro); em `parcial` (PUT) só os campos enviados são validados
+    if not isinstance(data, dict):
+        return None, "Corpo da requisição deve ser um objeto JSON."
+    campos = {}
+    for campo, tipo in CAMPOS_EDITAVEIS.items():
+        if campo not in data:
+            continue
+        try:
+            campos[campo] = tipo(data[campo])
+        except (TypeError, ValueError):
+            return None, f"Valor inválido para {campo}."
+    if not parcial:
+        for obrigatorio in ('url', 'mode', 'interval_seconds'):
+            if obrigatorio not in campos:
+                return None, f"Campo obrigatório ausente: {obrigatorio}."
+        campos.setdefault('jitter_seconds', MONITOR_JITTER)
+    if 'mode' in campos and campos['mode'] not in modos_disponiveis():
+        return None, f"mode deve ser um de: {', '.join(modos_disponiveis())}"
+    if 'interval_seconds' in campos and campos['interval_seconds'] < MONITOR_MIN_INTERVAL:
+        return None, f"interval_seconds deve ser de pelo menos {MONITOR_MIN_INTERVAL}."
+    if 'missed_policy' in campos and campos['missed_policy'] not in MISSED_POLICIES:
+        return None, f"missed_policy deve ser um de: {', '.join(MISSED_POLICIES)}"
+    if campos.get('jitter_seconds', 0) < 0 or campos.get('parallel', 1) < 1:
+        return None, "jitter_seconds não pode ser negativo e parallel deve ser pelo menos 1."
+    return campos, None
+
+@app.route('/monitors', methods=['GET'])
+def listar_monitores():
+    return jsonify({'monitors': monitor_scheduler.list()})
+
+@app.route('/monitors', methods=['POST'])
+def criar_monitor():
+    campos, erro = _validar_monitor(request.get_json(silent=True))
+    if erro:
+        return jsonify({'error': erro}), 400
+    return jsonify(monitor_scheduler.add(campos)), 201
+
+@app.route('/monitors/<int:monitor_id>', methods=['GET'])
+def ver_monitor(monitor_id):
+    monitor = monitor_scheduler.get(monitor_id)
+    if monitor is None:
+        return jsonify({'error': 'Monitor not found'}), 404
+    return jsonify(monitor)
+
+@app.route('/monitors/<int:monitor_id>', methods=['PUT'])
+def atualizar_monitor(monitor_id):
+    campos, erro = _validar_monitor(request.get_json(silent=True), parcial=True)
+    if erro:
+        return jsonify({'error': erro}), 400
+    monitor = monitor_scheduler.update(monitor_id, campos)
+    if monitor is None:
+        return jsonify({'error': 'Monitor not found'}), 404
+    return jsonify(monitor)
+
+@app.route('/monitors/<int:monitor_id>', methods=['DELETE'])
+def remover_monitor(monitor_id):
+    if not monitor_scheduler.remove(monitor_id):
+        return jsonify({'error': 'Monitor not found'}), 404
+    return jsonify({'status': 'Monitor removed', 'id': monitor_id})
+
+@app.route('/analytics')
+def analytics_view():
+    # Percentis, taxa de erro e execuções por etapa e período, lidos dos rollups (não dos logs)
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in analytics.BUCKETS:
+        return jsonify({'error': f"bucket deve ser um de: {', '.join(analytics.BUCKETS)}"}), 400
+    inicio_padrao, fim_padrao = analytics.periodo_padrao(request.args.get('days', default=7, type=int))
+    inicio = analytics.parse_data(request.args.get('since')) if request.args.get('since') else inicio_padrao
+    fim = analytics.parse_data(request.args.get('until')) if request.args.get('until') else fim_padrao
+    if inicio is None or fim is None:
+        return jsonify({'error': "Datas devem estar no formato YYYY-MM-DD ou YYYY-MM-DD HH:MM."}), 400
+    step = request.args.get('step')
+    if not db_pronto.is_set():
+        return jsonify({'error': "Banco de dados ainda não está disponível; consulte /healthz."}), 503
+    try:
+        with get_db_connection() as conn:
+            series = analytics.consultar(conn.cursor(), inicio, fim, bucket, step)
+    except Exception as e:
+        print(f"Aviso: não foi possível consultar os rollups: {e}")
+        return jsonify({'error': f"Erro ao consultar o banco de dados: {e}"}), 503
+    return jsonify({'bucket': bucket, 'since': inicio.strftime('%Y-%m-%d %H:%M:%S'), 'until': fim.strftime('%Y-%m-%d %H:%M:%S'),
+                    'steps': sorted({item['step'] for item in series}), 'series': series})
+
+@app.route('/events/<session_id>')
+def test_events(session_id):
+    session_data = test_sessions.get(session_id)
+    if not session_data:
+        return jsonify({'error': 'Session not found'}), 404
+
+    # O EventSource envia Last-Event-ID ao reconectar; ?since= serve para a primeira conexão
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    since = int(last_event_id) if last_event_id.isdigit() else request.args.get('since', default=0, type=int)
+
+    if session_data.get('finished'):
+        # Sessão encerrada: envia as etapas que faltam do resumo e fecha o stream
+        def gerar_resumo():
+            for etapa in session_data['steps']:
+                if etapa['seq'] > since:
+                    yield f"id: {etapa['seq']}\nevent: step\ndata: {json.dumps(etapa, default=str)}\n\n"
+            yield f"event: end\ndata: {json.dumps(_resumo_progresso(session_id, session_data))}\n\n"
+        return Response(gerar_resumo(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    event_log = session_data['events']
+
+    def gerar_eventos():
+        ultimo_seq = since
+        ultimo_progresso = None
+        sessao = session_data
+        yield "retry: 3000\n\n"
+        while True:
+            # Todos os clientes da sessão esperam no mesmo log; nenhum dispara consultas próprias.
+            # Enquanto a sessão está na fila, acorda mais vezes para atualizar a posição.
+            timeout = 5 if sessao['status'] == 'queued' else 15
+            novos, fechado = event_log.wait_for(ultimo_seq, timeout=timeout)
+            for seq, dados in novos:
+                yield f"id: {seq}\nevent: step\ndata: {dados}\n\n"
+                ultimo_seq = seq
+            sessao = test_sessions.get(session_id) or sessao # Status e progresso podem vir de outro processo
+            progresso = _resumo_progresso(session_id, sessao)
+            if progresso != ultimo_progresso:
+                ultimo_progresso = progresso
+                yield f"event: progress\ndata: {json.dumps(progresso)}\n\n"
+            if fechado:
+                yield f"event: end\ndata: {json.dumps(progresso)}\n\n"
+                return
+            if not novos:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(gerar_eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+threading.Thread(target=_inicializar_em_segundo_plano, name="InitDB", daemon=True).start()
+inicializacao['import_s'] = round(time.perf_counter() - _INICIO_IMPORT, 3)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)